@@ -318,6 +318,7 @@ class CompoundType(type):
         compute_a0: bool = True,
         compute_a1: bool = True,
         compute_a2: bool = True,
+        entrance_kinetic_energy: Optional[_ureg.Quantity] = None,
     ) -> Mapping[str, float]:
         """
         Compute the Fermi-Eyges parameters A0, A1, A2 and B (emittance).
@@ -329,6 +330,8 @@ class CompoundType(type):
             compute_a0:
             compute_a1:
             compute_a2:
+            entrance_kinetic_energy: the kinetic energy at the entrance of the material, used by the scattering models
+                depending on the initial pv (if the layer starts inside the material); `kinetic_energy` if None
 
         Returns:
 
@@ -344,6 +347,9 @@ class CompoundType(type):
                 "TWISS_GAMMA": _np.nan,
             }
         thickness = thickness.m_as("cm")
+        if entrance_kinetic_energy is None:
+            entrance_kinetic_energy = kinetic_energy
+        p1v1 = _ekin_to_pv(entrance_kinetic_energy).m_as("MeV")
 
         def integrand(
             u: float,
@@ -355,7 +361,7 @@ class CompoundType(type):
         ):
             return (thickness - u) ** n * scattering_model.t(
                 _ekin_to_pv(cls.stopping(u * _ureg.cm, initial_energy).ekin).m_as("MeV"),
-                _ekin_to_pv(initial_energy).m_as("MeV"),
+                p1v1,
                 material=material,
             )
 
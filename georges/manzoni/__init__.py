@@ -1,5 +1,6 @@
 from .beam import Beam
-from .core import match, track, twiss
+from .compiled import CompiledBeamline
+from .core import MatchResult, jacobian, match, track, twiss, twiss_from_maps
 from .elements import (
     BeamStop,
     Bend,
@@ -25,4 +26,19 @@ from .elements import (
 )
 from .input import Input
 from .integrators import *
-from .observers import BeamObserver, IbaBpmObserver, LossesObserver, MeanObserver, Observer, SigmaObserver
+from .losses import LossRecord
+from .observers import (
+    BeamObserver,
+    HistogramObserver,
+    IbaBpmObserver,
+    LossesObserver,
+    MeanObserver,
+    MomentsObserver,
+    Observer,
+    PersistentBeamObserver,
+    PersistentObserver,
+    QuantileObserver,
+    SampleObserver,
+    SigmaObserver,
+)
+from .table import ElementView, SequenceTable
@@ -5,6 +5,12 @@ selection of the particle according to the type of collimator (circular, ellipti
 import numpy as _np
 from numba import njit
 
+APERTURE_NONE = 0
+APERTURE_CIRCULAR = 1
+APERTURE_RECTANGULAR = 2
+APERTURE_ELLIPTICAL = 3
+APERTURE_PHASE_SPACE = 4
+
 
 @njit
 def circular_aperture_check(b1, kargs: _np.ndarray):
@@ -35,7 +41,7 @@ def elliptical_aperture_check(b1, kargs: _np.ndarray):
         The collimated beam
 
     """
-    return (b1[:, 0] / kargs[0]) ** 2 + (b1[:, 2] / kargs[1] ** 2) < 1
+    return (b1[:, 0] / kargs[0]) ** 2 + (b1[:, 2] / kargs[1]) ** 2 < 1
 
 
 @njit
@@ -67,6 +73,35 @@ def phase_space_aperture_check(b1, kargs: _np.ndarray):
         The collimated beam
 
     """
-    return ((b1[:, 0] / kargs[0]) ** 2 + (b1[:, 1] / kargs[1]) ** 2) < 1 and (
-        (b1[:, 2] / kargs[2]) ** 2 + (b1[:, 3] / kargs[3]) ** 2
-    ) < 1
+    return (((b1[:, 0] / kargs[0]) ** 2 + (b1[:, 1] / kargs[1]) ** 2) < 1) & (
+        ((b1[:, 2] / kargs[2]) ** 2 + (b1[:, 3] / kargs[3]) ** 2) < 1
+    )
+
+
+@njit
+def aperture_check_row(b1, i: int, aperture_type: int, kargs: _np.ndarray) -> bool:
+    """
+    Check if a single particle is inside the aperture. The aperture type is given by its numerical identifier
+    (`APERTURE_CIRCULAR`, `APERTURE_RECTANGULAR`, etc.) so that the check can be dispatched from compiled code.
+
+    Args:
+        b1: The beam
+        i: Index of the particle (row) to check
+        aperture_type: Numerical identifier of the aperture type
+        kargs: Parameters of the aperture
+
+    Returns:
+        True if the particle is inside the aperture
+
+    """
+    if aperture_type == APERTURE_CIRCULAR:
+        return (b1[i, 0] ** 2 + b1[i, 2] ** 2) < kargs[0] ** 2
+    elif aperture_type == APERTURE_RECTANGULAR:
+        return abs(b1[i, 0]) < kargs[0] and abs(b1[i, 2]) < kargs[1]
+    elif aperture_type == APERTURE_ELLIPTICAL:
+        return (b1[i, 0] / kargs[0]) ** 2 + (b1[i, 2] / kargs[1]) ** 2 < 1
+    elif aperture_type == APERTURE_PHASE_SPACE:
+        return ((b1[i, 0] / kargs[0]) ** 2 + (b1[i, 1] / kargs[1]) ** 2) < 1 and (
+            (b1[i, 2] / kargs[2]) ** 2 + (b1[i, 3] / kargs[3]) ** 2
+        ) < 1
+    return True
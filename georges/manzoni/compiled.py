@@ -0,0 +1,765 @@
+"""
+The file `compiled.py` contains a "compiled" representation of a Manzoni beamline. Instead of looping over
+the elements in Python and dispatching each of them through its integrator, the sequence is lowered once
+into flat tables: one kernel identifier per element, a packed array of numerical parameters, the transfer
+matrices (and tensors) for the matrix-based integrators and the apertures. The whole line is then tracked
+with a single call to a numba-jitted routine, without returning to the interpreter between elements.
+
+The compiled beamline is a snapshot of the `Input`: it must be compiled again after changing the elements'
+parameters. Elements that are not supported by the compiled engine (scatterers, degraders, exact integrators, etc.)
+raise an exception at compilation time.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numba as _nb
+import numpy as _np
+import pandas as _pd
+from georges_core import ureg as _ureg
+from numba import njit
+from numba.typed import List as nList
+
+from .apertures import (
+    APERTURE_CIRCULAR,
+    APERTURE_ELLIPTICAL,
+    APERTURE_NONE,
+    APERTURE_PHASE_SPACE,
+    APERTURE_RECTANGULAR,
+    aperture_check_row,
+)
+from .elements import Gap, Marker, Matrix
+from .elements.elements import ManzoniException
+from .integrators import (
+    Mad8FirstOrderTaylorIntegrator,
+    Mad8SecondOrderTaylorIntegrator,
+    MadXIntegrator,
+    MadXParaxialDriftIntegrator,
+    TransportFirstOrderTaylorIntegrator,
+    TransportSecondOrderTaylorIntegrator,
+)
+from .kernels import matrix_matrix, vector_matrix_row, vector_matrix_tensor_row
+from .maps import (
+    track_madx_bend,
+    track_madx_dipedge,
+    track_madx_drift,
+    track_madx_drift_paraxial,
+    track_madx_kicker,
+    track_madx_quadrupole,
+    track_madx_srotation,
+)
+from .maps.madx_thick import (
+    madx_bend_row,
+    madx_dipedge_row,
+    madx_drift_paraxial_row,
+    madx_drift_row,
+    madx_kicker_row,
+    madx_quadrupole_row,
+    madx_srotation_row,
+)
+
+if TYPE_CHECKING:
+    from .beam import Beam as _Beam
+    from .input import Input as _Input
+    from .losses import LossRecord as _LossRecord
+
+KERNEL_IDENTITY = 0
+KERNEL_DRIFT = 1
+KERNEL_DRIFT_PARAXIAL = 2
+KERNEL_QUADRUPOLE = 3
+KERNEL_BEND = 4
+KERNEL_DIPEDGE = 5
+KERNEL_SROTATION = 6
+KERNEL_KICKER = 7
+KERNEL_MATRIX = 8
+KERNEL_MATRIX_TENSOR = 9
+
+MAX_PARAMETERS = 16
+"""Size of the packed parameters array of each element."""
+
+MADX_KERNELS = {
+    track_madx_drift: KERNEL_DRIFT,
+    track_madx_drift_paraxial: KERNEL_DRIFT_PARAXIAL,
+    track_madx_quadrupole: KERNEL_QUADRUPOLE,
+    track_madx_bend: KERNEL_BEND,
+    track_madx_dipedge: KERNEL_DIPEDGE,
+    track_madx_srotation: KERNEL_SROTATION,
+    track_madx_kicker: KERNEL_KICKER,
+}
+
+APERTURES = {
+    "CIRCULAR": APERTURE_CIRCULAR,
+    "RECTANGULAR": APERTURE_RECTANGULAR,
+    "ELLIPTICAL": APERTURE_ELLIPTICAL,
+    "PHASE_SPACE": APERTURE_PHASE_SPACE,
+}
+
+DRIFT_LIKE = ["DRIFT", "GAP", "RECTANGULARCOLLIMATOR", "ELLIPTICALCOLLIMATOR", "CIRCULARCOLLIMATOR", "DUMP"]
+
+
+@njit(fastmath=True, inline="always")
+def propagate_row(
+    kernel: int,
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    i: int,
+    p: _np.ndarray,
+    matrix: _np.ndarray,
+    tensor: _np.ndarray,
+    beta: float,
+):
+    """
+    Propagate a single particle through an element identified by its kernel identifier.
+
+    Args:
+        kernel: the kernel identifier of the element
+        b1: the input beam
+        b2: the output beam
+        i: index of the particle (row) to propagate
+        p: the packed parameters of the element
+        matrix: the transfer matrix of the element (only used by the matrix kernels)
+        tensor: the second-order tensor of the element (only used by the matrix-tensor kernel)
+        beta: the relativistic beta of the reference particle
+    """
+    if kernel == KERNEL_DRIFT:
+        madx_drift_row(b1, b2, i, p[0], beta)
+    elif kernel == KERNEL_DRIFT_PARAXIAL:
+        madx_drift_paraxial_row(b1, b2, i, p[0], beta)
+    elif kernel == KERNEL_QUADRUPOLE:
+        madx_quadrupole_row(b1, b2, i, p[0], p[1], p[2], p[3], p[4], beta)
+    elif kernel == KERNEL_BEND:
+        madx_bend_row(b1, b2, i, p[0], p[1], p[2], p[4], p[5], p[6], p[7], p[8], p[9], p[10], p[11], p[12], beta)
+    elif kernel == KERNEL_DIPEDGE:
+        madx_dipedge_row(b1, b2, i, p[0], p[1])
+    elif kernel == KERNEL_SROTATION:
+        madx_srotation_row(b1, b2, i, p[0], p[1])
+    elif kernel == KERNEL_KICKER:
+        madx_kicker_row(b1, b2, i, p[0], p[1], p[2], beta)
+    elif kernel == KERNEL_MATRIX:
+        vector_matrix_row(b1, b2, i, matrix)
+    elif kernel == KERNEL_MATRIX_TENSOR:
+        vector_matrix_tensor_row(b1, b2, i, matrix, tensor)
+    else:
+        for j in range(b1.shape[1]):
+            b2[i, j] = b1[i, j]
+
+
+@njit(parallel=True, fastmath=True)
+def track_compiled(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    kernels: _np.ndarray,
+    parameters: _np.ndarray,
+    matrices: _np.ndarray,
+    tensors: _np.ndarray,
+    aperture_types: _np.ndarray,
+    aperture_parameters: _np.ndarray,
+    beta: float,
+    check_apertures: bool,
+    lost_at: _np.ndarray,
+    lost_coordinates: _np.ndarray,
+):
+    """
+    Track a beam through a compiled beamline, element by element. The particles lost on the apertures are removed
+    by compacting the beam in place (no allocation) and the index of the element where they are lost is recorded.
+
+    Args:
+        b1: the input beam (overwritten)
+        b2: a work buffer of the same shape as the input beam
+        kernels: the kernel identifiers of the elements
+        parameters: the packed parameters of the elements
+        matrices: the transfer matrices of the elements
+        tensors: the second-order tensors of the elements
+        aperture_types: the aperture identifiers of the elements
+        aperture_parameters: the aperture parameters of the elements
+        beta: the relativistic beta of the reference particle
+        check_apertures: check the apertures at the exit of each element
+        lost_at: for each particle, filled with the index of the element where it is lost (-1 if not lost)
+        lost_coordinates: filled with the coordinates of the lost particles where they are lost (empty to disable)
+
+    Returns:
+        the tracked beam (a view on one of the buffers) and the indices of the surviving particles
+    """
+    n = b1.shape[0]
+    ids = _np.arange(n)
+    for e in range(kernels.shape[0]):
+        kernel = kernels[e]
+        p = parameters[e]
+        matrix = matrices[e]
+        tensor = tensors[e]
+        for i in _nb.prange(n):
+            propagate_row(kernel, b1, b2, i, p, matrix, tensor, beta)
+        if check_apertures and aperture_types[e] != APERTURE_NONE:
+            aperture_type = aperture_types[e]
+            kargs = aperture_parameters[e]
+            m = 0
+            for i in range(n):
+                if aperture_check_row(b2, i, aperture_type, kargs):
+                    if m != i:
+                        for j in range(b2.shape[1]):
+                            b2[m, j] = b2[i, j]
+                        ids[m] = ids[i]
+                    m += 1
+                else:
+                    lost_at[ids[i]] = e
+                    if lost_coordinates.shape[0] > 0:
+                        for j in range(b2.shape[1]):
+                            lost_coordinates[ids[i], j] = b2[i, j]
+            n = m
+        b1, b2 = b2, b1
+    return b1[:n], ids[:n]
+
+
+@njit(parallel=True, fastmath=True)
+def track_compiled_particle_major(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    kernels: _np.ndarray,
+    parameters: _np.ndarray,
+    matrices: _np.ndarray,
+    tensors: _np.ndarray,
+    aperture_types: _np.ndarray,
+    aperture_parameters: _np.ndarray,
+    beta: float,
+    check_apertures: bool,
+    lost_at: _np.ndarray,
+    chunk_size: int,
+):
+    """
+    Track a beam through a compiled beamline, chunk of particles by chunk of particles: each thread pushes a chunk
+    through all the elements while it stays in cache. The apertures do not remove the particles from the buffers,
+    they are flagged as lost and skipped by the following elements.
+
+    The coordinates of a particle lost at element `e` are left in `b2` if `e` is even and in `b1` otherwise.
+
+    Args:
+        b1: the input beam (overwritten)
+        b2: a work buffer of the same shape as the input beam
+        kernels: the kernel identifiers of the elements
+        parameters: the packed parameters of the elements
+        matrices: the transfer matrices of the elements
+        tensors: the second-order tensors of the elements
+        aperture_types: the aperture identifiers of the elements
+        aperture_parameters: the aperture parameters of the elements
+        beta: the relativistic beta of the reference particle
+        check_apertures: check the apertures at the exit of each element
+        lost_at: for each particle, the index of the element where it is lost (-1 if not lost, updated in place)
+        chunk_size: the number of particles tracked together by a thread
+
+    Returns:
+        the buffer holding the tracked beam (lost particles included)
+    """
+    n = b1.shape[0]
+    n_chunks = (n + chunk_size - 1) // chunk_size
+    for c in _nb.prange(n_chunks):
+        start = c * chunk_size
+        stop = min(start + chunk_size, n)
+        src = b1
+        dst = b2
+        for e in range(kernels.shape[0]):
+            kernel = kernels[e]
+            p = parameters[e]
+            matrix = matrices[e]
+            tensor = tensors[e]
+            aperture_type = aperture_types[e] if check_apertures else APERTURE_NONE
+            kargs = aperture_parameters[e]
+            for i in range(start, stop):
+                if lost_at[i] != -1:
+                    continue
+                propagate_row(kernel, src, dst, i, p, matrix, tensor, beta)
+                if aperture_type != APERTURE_NONE and not aperture_check_row(dst, i, aperture_type, kargs):
+                    lost_at[i] = e
+            src, dst = dst, src
+    if kernels.shape[0] % 2 == 0:
+        return b1
+    return b2
+
+
+@njit(parallel=True, fastmath=True)
+def track_compiled_configurations(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    rows: _np.ndarray,
+    kernels: _np.ndarray,
+    parameters: _np.ndarray,
+    matrices: _np.ndarray,
+    tensors: _np.ndarray,
+    aperture_types: _np.ndarray,
+    aperture_parameters: _np.ndarray,
+    beta: float,
+    check_apertures: bool,
+    lost_at: _np.ndarray,
+    chunk_size: int,
+):
+    """
+    Track a beam through several configurations of a compiled beamline, in parallel over the configurations and the
+    chunks of particles (see `track_compiled_particle_major`). The lowered elements are pooled: `rows[c, e]` is the
+    row of the tables holding the element `e` in the configuration `c`.
+
+    Args:
+        b1: the input beam of each configuration (overwritten)
+        b2: a work buffer of the same shape as the input beams
+        rows: the rows of the pooled tables for each configuration and each element
+        kernels: the pooled kernel identifiers
+        parameters: the pooled packed parameters
+        matrices: the pooled transfer matrices
+        tensors: the pooled second-order tensors
+        aperture_types: the aperture identifiers of the elements
+        aperture_parameters: the aperture parameters of the elements
+        beta: the relativistic beta of the reference particle
+        check_apertures: check the apertures at the exit of each element
+        lost_at: for each configuration and each particle, the index of the element where it is lost (-1 if not lost,
+                 updated in place)
+        chunk_size: the number of particles tracked together by a thread
+
+    Returns:
+        the buffer holding the tracked beams (lost particles included)
+    """
+    n = b1.shape[1]
+    n_chunks = (n + chunk_size - 1) // chunk_size
+    for task in _nb.prange(rows.shape[0] * n_chunks):
+        c = task // n_chunks
+        start = (task % n_chunks) * chunk_size
+        stop = min(start + chunk_size, n)
+        src = b1[c]
+        dst = b2[c]
+        lost = lost_at[c]
+        for e in range(rows.shape[1]):
+            r = rows[c, e]
+            kernel = kernels[r]
+            p = parameters[r]
+            matrix = matrices[r]
+            tensor = tensors[r]
+            aperture_type = aperture_types[e] if check_apertures else APERTURE_NONE
+            kargs = aperture_parameters[e]
+            for i in range(start, stop):
+                if lost[i] != -1:
+                    continue
+                propagate_row(kernel, src, dst, i, p, matrix, tensor, beta)
+                if aperture_type != APERTURE_NONE and not aperture_check_row(dst, i, aperture_type, kargs):
+                    lost[i] = e
+            src, dst = dst, src
+    if rows.shape[1] % 2 == 0:
+        return b1
+    return b2
+
+
+@njit(parallel=True, fastmath=True)
+def matrices_compiled_configurations(
+    rows: _np.ndarray,
+    kernels: _np.ndarray,
+    parameters: _np.ndarray,
+    matrices: _np.ndarray,
+    tensors: _np.ndarray,
+    beta: float,
+    step: float,
+) -> _np.ndarray:
+    """
+    Transfer matrices from the entrance of the beamline to the exit of each element, for several configurations of a
+    compiled beamline (in parallel over the configurations). The matrix of each element is obtained by central finite
+    differences around the reference orbit, as `core.element_matrix`.
+
+    Args:
+        rows: the rows of the pooled tables for each configuration and each element
+        kernels: the pooled kernel identifiers
+        parameters: the pooled packed parameters
+        matrices: the pooled transfer matrices
+        tensors: the pooled second-order tensors
+        beta: the relativistic beta of the reference particle
+        step: the step of the finite differences
+
+    Returns:
+        the cumulated transfer matrices (shape (configurations, elements, 6, 6))
+    """
+    cumulated = _np.zeros((rows.shape[0], rows.shape[1], 6, 6))
+    for c in _nb.prange(rows.shape[0]):
+        b1 = _np.zeros((13, 6))
+        b2 = _np.zeros((13, 6))
+        matrix = _np.empty((6, 6))
+        current = _np.eye(6)
+        for e in range(rows.shape[1]):
+            r = rows[c, e]
+            b1[:, :] = 0.0
+            for j in range(6):
+                b1[1 + 2 * j, j] = step
+                b1[2 + 2 * j, j] = -step
+            for i in range(13):
+                propagate_row(kernels[r], b1, b2, i, parameters[r], matrices[r], tensors[r], beta)
+            for i in range(6):
+                for j in range(6):
+                    matrix[i, j] = (b2[1 + 2 * j, i] - b2[2 + 2 * j, i]) / (2 * step)
+            current = matrix_matrix(matrix, current)
+            cumulated[c, e] = current
+    return cumulated
+
+
+class CompiledBeamline:
+    """
+    A beamline lowered into flat tables of kernel identifiers and packed parameters, tracked in a single jitted call.
+
+    Examples:
+        >>> compiled = manzoni_input.compile()  # doctest: +SKIP
+        >>> beam_out = compiled.track(beam)  # doctest: +SKIP
+    """
+
+    def __init__(self, beamline: _Input):
+        """
+
+        Args:
+            beamline: the Manzoni input to compile
+        """
+        self._beamline = beamline
+        self._names = [e.NAME for e in beamline.sequence]
+        self._elements = list(beamline.sequence)
+        self._depends_on_beta = any(
+            e.integrator in [Mad8FirstOrderTaylorIntegrator, Mad8SecondOrderTaylorIntegrator] for e in self._elements
+        )
+        self._tables: Dict[Optional[float], Tuple[_np.ndarray, ...]] = {}
+        self._apertures = self._lower_apertures()
+        self._exits = _np.array([e.AT_EXIT.m_as("m") for e in self._elements], dtype=float)
+        if not self._depends_on_beta:
+            self._tables[None] = self.lower()  # Fails early for unsupported elements
+
+    @property
+    def names(self) -> List[str]:
+        """The names of the compiled elements."""
+        return self._names
+
+    @property
+    def kernels(self) -> Optional[_np.ndarray]:
+        """The kernel identifier of each element (available once the beamline has been lowered)."""
+        for tables in self._tables.values():
+            return tables[0]
+        return None
+
+    def _lower_apertures(self) -> Tuple[_np.ndarray, _np.ndarray]:
+        aperture_types = _np.zeros(len(self._elements), dtype=_np.int64)
+        aperture_parameters = _np.zeros((len(self._elements), 4))
+        for i, e in enumerate(self._elements):
+            if e.APERTYPE is None:
+                continue
+            aperture_types[i] = APERTURES.get(e.APERTYPE.upper(), APERTURE_NONE)
+            if aperture_types[i] != APERTURE_NONE:
+                kargs = e.aperture[1]
+                aperture_parameters[i, : len(kargs)] = kargs
+        return aperture_types, aperture_parameters
+
+    def lower(self, beta: float = 1.0) -> Tuple[_np.ndarray, ...]:
+        """
+        Lower all the elements into the flat tables used by the compiled kernels.
+
+        Args:
+            beta: the relativistic beta of the reference particle (only used by the MAD8 maps)
+
+        Returns:
+            the kernel identifiers, the packed parameters, the transfer matrices and the tensors of the elements
+        """
+        n = len(self._elements)
+        kernels = _np.zeros(n, dtype=_np.int64)
+        parameters = _np.zeros((n, MAX_PARAMETERS))
+        matrices = _np.zeros((n, 6, 6))
+        tensors = _np.zeros((n, 6, 6, 6))
+        global_parameters = nList()
+        global_parameters.append(beta)
+        for i, e in enumerate(self._elements):
+            kernels[i], p, matrix, tensor = self.lower_element(e, global_parameters)
+            parameters[i, : len(p)] = p
+            if matrix is not None:
+                matrices[i] = matrix
+            if tensor is not None:
+                tensors[i] = tensor
+        return kernels, parameters, matrices, tensors
+
+    @staticmethod
+    def lower_element(element, global_parameters: nList):
+        """
+        Resolve the kernel and the packed parameters of a single element, following the dispatch of its integrator.
+
+        Args:
+            element: the Manzoni element
+            global_parameters: the global parameters (relativistic beta)
+
+        Returns:
+            a tuple with the kernel identifier, the packed parameters, the transfer matrix and the tensor
+        """
+        name = element.__class__.__name__.upper()
+        integrator = element.integrator
+        if isinstance(element, Marker):
+            return KERNEL_IDENTITY, [], None, None
+        if isinstance(element, Gap) and element.L.magnitude == 0:
+            return KERNEL_IDENTITY, [], None, None
+        if isinstance(element, Matrix):
+            matrix = _np.array(element.MATRIX, dtype=float)
+            if integrator not in [MadXIntegrator, MadXParaxialDriftIntegrator]:
+                permutation = [0, 1, 2, 3, 5, 4]
+                matrix = matrix[permutation, :][:, permutation]
+            return KERNEL_MATRIX, [], matrix, None
+
+        if integrator in [MadXIntegrator, MadXParaxialDriftIntegrator]:
+            method = integrator.METHODS.get(name)
+            if method is None:
+                raise ManzoniException(f"Element {element.NAME} ({name}) is not supported by {integrator.__name__}.")
+            kernel = MADX_KERNELS[method]
+        elif integrator in [
+            TransportFirstOrderTaylorIntegrator,
+            TransportSecondOrderTaylorIntegrator,
+            Mad8FirstOrderTaylorIntegrator,
+            Mad8SecondOrderTaylorIntegrator,
+        ]:
+            kernel = None
+            if name in ["HKICKER", "VKICKER"]:
+                kernel = KERNEL_KICKER
+            elif name == "SROTATION":
+                kernel = KERNEL_SROTATION
+            elif name in DRIFT_LIKE and issubclass(integrator, TransportFirstOrderTaylorIntegrator):
+                kernel = KERNEL_DRIFT
+        else:
+            raise ManzoniException(f"Integrator {integrator} of element {element.NAME} cannot be compiled.")
+
+        if kernel is None:
+            if not integrator.uses_maps(element):
+                raise ManzoniException(f"Element {element.NAME} ({name}) is not supported by {integrator.__name__}.")
+            matrix, tensor = integrator.maps(element, global_parameters)
+            return (KERNEL_MATRIX if tensor is None else KERNEL_MATRIX_TENSOR), [], matrix, tensor
+
+        p = list(element.cache)
+        if kernel == KERNEL_QUADRUPOLE:
+            p = p[:3] + [_np.sin(p[2]), _np.cos(p[2])]
+        elif kernel == KERNEL_BEND:
+            p = p[:11] + [_np.sin(p[4]), _np.cos(p[4])]
+        elif kernel == KERNEL_SROTATION:
+            if abs(p[0]) < 1e-8:
+                return KERNEL_IDENTITY, [], None, None
+            p = [_np.sin(p[0]), _np.cos(p[0])]
+        return kernel, p, None, None
+
+    def tables(self, beta: float) -> Tuple[_np.ndarray, ...]:
+        """
+        The lowered tables for a given relativistic beta; only the MAD8 maps depend on the reference energy.
+
+        Args:
+            beta: the relativistic beta of the reference particle
+
+        Returns:
+            the kernel identifiers, the packed parameters, the transfer matrices and the tensors of the elements
+        """
+        key = beta if self._depends_on_beta else None
+        if key not in self._tables:
+            self._tables[key] = self.lower(beta)
+        return self._tables[key]
+
+    def lower_configurations(
+        self,
+        configurations: _pd.DataFrame,
+        beta: float,
+    ) -> Tuple[_np.ndarray, ...]:
+        """
+        Lower several configurations (sets of parameters) of the beamline. Only the elements whose parameters are
+        changed are lowered again for each configuration; the lowered elements are pooled with the ones of the
+        compiled snapshot. The elements of the beamline are restored once the configurations are lowered.
+
+        Args:
+            configurations: one row per configuration and one column per (element, parameter) pair; the values
+                            follow the conventions of `Input.set_parameters_batch`
+            beta: the relativistic beta of the reference particle
+
+        Returns:
+            the rows of the pooled tables for each configuration and each element, and the pooled kernel identifiers,
+            packed parameters, transfer matrices and tensors
+        """
+        kernels, parameters, matrices, tensors = self.tables(beta)
+        sequence, mapper = self._beamline.sequence, self._beamline.mapper
+        columns = []
+        for (element, p), values in configurations.items():
+            if element not in mapper:
+                raise ManzoniException(f"Unknown element: {element}.")
+            columns.append((mapper[element], p, *self._beamline._parameter_magnitudes(mapper[element], p, values)))
+        indices = sorted({i for i, *_ in columns})
+        original = [(i, p, sequence[i].attributes[p]) for i, p, *_ in columns]
+        rows = _np.tile(_np.arange(len(self._elements)), (len(configurations), 1))
+        pool = []
+        global_parameters = nList()
+        global_parameters.append(beta)
+        try:
+            for c in range(len(configurations)):
+                updates = {i: {} for i in indices}
+                for i, p, units, magnitudes in columns:
+                    updates[i][p] = magnitudes[c] if units is None else _ureg.Quantity(magnitudes[c], units)
+                for i in indices:
+                    sequence[i].set_parameters(updates[i])
+                    rows[c, i] = len(self._elements) + len(pool)
+                    pool.append(self.lower_element(sequence[i], global_parameters))
+        finally:
+            restored = {i: {} for i in indices}
+            for i, p, value in original:
+                restored[i][p] = value
+            for i in indices:
+                sequence[i].set_parameters(restored[i])
+        if len(pool) == 0:
+            return rows, kernels, parameters, matrices, tensors
+        pooled_kernels = _np.zeros(len(pool), dtype=_np.int64)
+        pooled_parameters = _np.zeros((len(pool), MAX_PARAMETERS))
+        pooled_matrices = _np.zeros((len(pool), 6, 6))
+        pooled_tensors = _np.zeros((len(pool), 6, 6, 6))
+        for k, (kernel, p, matrix, tensor) in enumerate(pool):
+            pooled_kernels[k] = kernel
+            pooled_parameters[k, : len(p)] = p
+            if matrix is not None:
+                pooled_matrices[k] = matrix
+            if tensor is not None:
+                pooled_tensors[k] = tensor
+        return (
+            rows,
+            _np.concatenate([kernels, pooled_kernels]),
+            _np.concatenate([parameters, pooled_parameters]),
+            _np.concatenate([matrices, pooled_matrices]),
+            _np.concatenate([tensors, pooled_tensors]),
+        )
+
+    def track_configurations(
+        self,
+        beam: _Beam,
+        configurations: _pd.DataFrame,
+        check_apertures: bool = True,
+        chunk_size: int = 1024,
+    ) -> Dict:
+        """
+        Track a beam through several configurations of the beamline in a single jitted call, in parallel over the
+        configurations (see `lower_configurations`). The apertures are the ones of the compiled snapshot.
+
+        Args:
+            beam: the beam to track (the same for all the configurations)
+            configurations: one row per configuration and one column per (element, parameter) pair
+            check_apertures: check the apertures at the exit of each element
+            chunk_size: the number of particles tracked together by a thread
+
+        Returns:
+            the distribution of the surviving particles at the end of the beamline, for each configuration (indexed
+            like the configurations)
+        """
+        beta = beam.kinematics.beta
+        rows, kernels, parameters, matrices, tensors = self.lower_configurations(configurations, beta)
+        b1 = _np.repeat(beam.distribution[None, :, :], len(configurations), axis=0)
+        b2 = _np.zeros(b1.shape)
+        lost_at = -_np.ones(b1.shape[:2], dtype=_np.int64)
+        beams_out = track_compiled_configurations(
+            b1,
+            b2,
+            rows,
+            kernels,
+            parameters,
+            matrices,
+            tensors,
+            self._apertures[0],
+            self._apertures[1],
+            beta,
+            check_apertures,
+            lost_at,
+            chunk_size,
+        )
+        return {
+            label: _np.compress(lost_at[c] == -1, beams_out[c], axis=0)
+            for c, label in enumerate(configurations.index)
+        }
+
+    def matrices_configurations(
+        self,
+        configurations: _pd.DataFrame,
+        beta: float,
+        step: float = 1e-5,
+    ) -> _np.ndarray:
+        """
+        Transfer matrices from the entrance of the beamline to the exit of each element, for several configurations
+        of the beamline, in a single jitted call (see `matrices_compiled_configurations`).
+
+        Args:
+            configurations: one row per configuration and one column per (element, parameter) pair
+            beta: the relativistic beta of the reference particle
+            step: the step of the finite differences
+
+        Returns:
+            the cumulated transfer matrices (shape (configurations, elements, 6, 6))
+        """
+        rows, kernels, parameters, matrices, tensors = self.lower_configurations(configurations, beta)
+        return matrices_compiled_configurations(rows, kernels, parameters, matrices, tensors, beta, step)
+
+    def track(
+        self,
+        beam: _Beam,
+        check_apertures: bool = True,
+        particle_major: bool = False,
+        chunk_size: int = 1024,
+        losses: Optional[_LossRecord] = None,
+    ) -> _np.ndarray:
+        """
+        Track a beam through the whole compiled beamline.
+
+        Args:
+            beam: the beam to track
+            check_apertures: check the apertures at the exit of each element
+            particle_major: track chunks of particles through the whole line (instead of the whole beam element
+                            by element); the lost particles are flagged and compacted only once at the end
+            chunk_size: the number of particles in a chunk for the particle-major tracking
+            losses: if provided, record the element, the position and the coordinates of the lost particles
+
+        Returns:
+            the distribution of the surviving particles at the end of the beamline
+        """
+        beta = beam.kinematics.beta
+        kernels, parameters, matrices, tensors = self.tables(beta)
+        b1 = _np.copy(beam.distribution)
+        b2 = _np.zeros(b1.shape)
+        lost_at = -_np.ones(b1.shape[0], dtype=_np.int64)
+        if particle_major:
+            beam_out = track_compiled_particle_major(
+                b1,
+                b2,
+                kernels,
+                parameters,
+                matrices,
+                tensors,
+                self._apertures[0],
+                self._apertures[1],
+                beta,
+                check_apertures,
+                lost_at,
+                chunk_size,
+            )
+            if losses is not None:
+                ids = _np.flatnonzero(lost_at >= 0)
+                coordinates = None
+                if losses.with_coordinates:
+                    # The coordinates of a particle lost at an even element are left in b2, in b1 otherwise
+                    coordinates = _np.where((lost_at[ids] % 2 == 0)[:, None], b2[ids], b1[ids])
+                self._record_losses(losses, lost_at, ids, coordinates)
+            return _np.compress(lost_at == -1, beam_out, axis=0)
+        with_coordinates = losses is not None and losses.with_coordinates
+        lost_coordinates = _np.zeros(b1.shape if with_coordinates else (0, b1.shape[1]))
+        beam_out, _ = track_compiled(
+            b1,
+            b2,
+            kernels,
+            parameters,
+            matrices,
+            tensors,
+            self._apertures[0],
+            self._apertures[1],
+            beta,
+            check_apertures,
+            lost_at,
+            lost_coordinates,
+        )
+        if losses is not None:
+            ids = _np.flatnonzero(lost_at >= 0)
+            self._record_losses(losses, lost_at, ids, lost_coordinates[ids] if with_coordinates else None)
+        return _np.copy(beam_out)
+
+    def _record_losses(
+        self,
+        losses: _LossRecord,
+        lost_at: _np.ndarray,
+        ids: _np.ndarray,
+        coordinates: Optional[_np.ndarray],
+    ):
+        losses.reset(lost_at.shape[0], self._names)
+        losses.record(lost_at[ids], ids, self._exits[lost_at[ids]], coordinates)
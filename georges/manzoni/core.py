@@ -7,48 +7,95 @@ The file `core.py` also contains a Twiss function, which allows the calculation
 of all the elements along a given beamline for the Twiss functions calculation based on the 11 particles
 method. The user must be aware that this function also needs the georges_core module to work properly,
 as the Twiss computation is done in the end in the georges_core library, using the matrix elements
-calculated in georges.
+calculated in georges. `twiss_from_maps` computes the same linear optics directly from the products of the
+transfer matrices of the elements, without tracking.
     """
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, Optional
+import time as _time
+from contextlib import ExitStack as _ExitStack
+from contextlib import contextmanager as _contextmanager
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
 
 import numpy as _np
 import pandas as _pd
+from georges_core import ureg as _ureg
 from georges_core.sequences import BetaBlock as _BetaBlock
 from georges_core.twiss import Twiss as _Twiss
 from numba.typed import List as nList
+from scipy.optimize import least_squares as _least_squares
 
 from .beam import Beam as _Beam
+from .elements.elements import ManzoniException as _ManzoniException
+from .elements.scatterers import MaterialElement as _MaterialElement
+from .kernels import batched_vector_matrix_sparse_tensor as _batched_vector_matrix_sparse_tensor
+from .kernels import beam_moments as _beam_moments
+from .kernels import compose_maps as _compose_maps
+from .kernels import cumulative_matrices as _cumulative_matrices
+from .kernels import cumulative_matrices_derivatives as _cumulative_matrices_derivatives
+from .kernels import phase_unrolling as _phase_unrolling
+from .kernels import sparse_tensor as _sparse_tensor
 from .observers import BeamObserver as _BeamObserver
+from .observers import finalize as _finalize
+from .observers import notify as _notify
+from .table import _magnitude, _numeric_parameters
 
 if TYPE_CHECKING:
     from .. import Kinematics as _Kinematics
     from .input import Input as _Input
+    from .losses import LossRecord as _LossRecord
     from .observers import Observer as _Observer
 
 
+def _global_parameters(beam: _Beam, seed: Optional[int] = None, turn: int = 0) -> nList:
+    """
+    The global parameters of the tracking: the relativistic beta and, if given, the seed (below 2**53) and the turn.
+    """
+    global_parameters = nList()
+    global_parameters.append(beam.kinematics.beta)
+    if seed is not None:
+        global_parameters.append(float(seed))
+        global_parameters.append(float(turn))
+    return global_parameters
+
+
 def track(
     beamline: _Input,
     beam: _Beam,
     observers: List[Optional[_Observer]] = None,
     check_apertures_exit: bool = False,
     check_apertures_entry: bool = False,
+    losses: Optional[_LossRecord] = None,
+    seed: Optional[int] = None,
+    turn: int = 0,
 ):
     """
     Args:
         beamline:
         beam:
-        observers:
+        observers: the observers, finalized at the end of the tracking (see `Observer.finalize`)
         check_apertures_exit:
         check_apertures_entry:
+        losses: if provided, the lost particles are flagged (and recorded) instead of being removed at each aperture
+        seed: the seed of the random numbers of the material elements (see `MaterialElement.random_key`)
+        turn: the turn (or any call counter) mixed with the seed, see `Input.track`
     Returns:
     """
     if observers is None:
         observers = []
-    global_parameters = nList()
-    global_parameters.append(beam.kinematics.beta)
+    if losses is not None:
+        return track_with_losses(
+            beamline,
+            beam,
+            losses,
+            observers,
+            check_apertures_exit,
+            check_apertures_entry,
+            seed,
+            turn,
+        )
+    global_parameters = _global_parameters(beam, seed, turn)
     b1 = _np.copy(beam.distribution)
     b2 = _np.zeros(b1.shape)
     for e in beamline.sequence:
@@ -61,14 +108,352 @@ def track(
         b1, b2 = e.propagate(b1, b2, global_parameters)
         if check_apertures_exit:
             b1, b2 = e.check_aperture(b1, b2)
-        for o in observers:
-            if o is not None:
-                o(e, b1, b2)
+        _notify(observers, e, b1, b2)
         if b1.shape != b2.shape:
             b1 = _np.zeros(b2.shape)
         if b2.shape[0] == 0:
             break
         b2, b1 = b1, b2
+    _finalize(observers)
+
+
+def track_with_losses(
+    beamline: _Input,
+    beam: _Beam,
+    losses: _LossRecord,
+    observers: List[Optional[_Observer]] = None,
+    check_apertures_exit: bool = False,
+    check_apertures_entry: bool = False,
+    seed: Optional[int] = None,
+    turn: int = 0,
+):
+    """
+    Tracking with a fixed-size beam buffer: the particles outside of the apertures are flagged as lost (and the
+    element, the position and the coordinates where they are lost are recorded in `losses`) instead of being
+    removed from the beam at each element. The buffers are compacted when the fraction of alive particles drops
+    below `losses.compaction_threshold`, and before the material elements (which need a compact beam). The
+    particles stopped by the material elements keep their identifiers when the elements provide them (see
+    `MaterialElement.survival_mask` and `MaterialElement.propagate_indices`).
+
+    The observers receive the alive particles only.
+
+    Args:
+        beamline:
+        beam:
+        losses: the record of the lost particles
+        observers: the observers, finalized at the end of the tracking (see `Observer.finalize`)
+        check_apertures_exit:
+        check_apertures_entry:
+        seed: the seed of the random numbers of the material elements
+        turn: the turn (or any call counter) mixed with the seed, see `Input.track`
+    Returns:
+    """
+    if observers is None:
+        observers = []
+    observers = [o for o in observers if o is not None]
+    global_parameters = _global_parameters(beam, seed, turn)
+    b1 = _np.copy(beam.distribution)
+    b2 = _np.zeros(b1.shape)
+    losses.reset(b1.shape[0], [e.NAME for e in beamline.sequence])
+    ids = _np.arange(b1.shape[0])
+    alive = _np.ones(b1.shape[0], dtype=bool)
+    n_alive = b1.shape[0]
+
+    def flag(index: int, element, b: _np.ndarray, s: float, mask: Optional[_np.ndarray] = None) -> int:
+        if mask is None:
+            mask = element.aperture_mask(b)
+        if mask is None:
+            return n_alive
+        lost = alive & ~mask
+        losses.record(index, ids[lost], s, b[lost] if losses.with_coordinates else None)
+        alive[lost] = False
+        return n_alive - int(_np.count_nonzero(lost))
+
+    for index, e in enumerate(beamline.sequence):
+        if n_alive < b1.shape[0] and (
+            isinstance(e, _MaterialElement) or n_alive < losses.compaction_threshold * b1.shape[0]
+        ):
+            b1 = _np.compress(alive, b1, axis=0)
+            b2 = _np.zeros(b1.shape)
+            ids = ids[alive]
+            alive = _np.ones(b1.shape[0], dtype=bool)
+        if check_apertures_entry:
+            n_alive = flag(index, e, b1, e.AT_ENTRY.m_as("m"))
+            if n_alive == 0:
+                break
+        kept = None
+        if isinstance(e, _MaterialElement):
+            # The particles stopped according to their coordinates (beam stops) are identified
+            mask = e.survival_mask(b1)
+            if mask is not None:
+                n_alive = flag(index, e, b1, e.AT_ENTRY.m_as("m"), mask)
+            alive_in = _np.copy(alive) if observers and n_alive < b1.shape[0] else None
+            b1, b2, kept = e.propagate_indices(b1, b2, global_parameters)
+        else:
+            alive_in = _np.copy(alive) if observers and n_alive < b1.shape[0] else None
+            b1, b2 = e.propagate(b1, b2, global_parameters)
+        if b2.shape[0] != b1.shape[0]:
+            # The element removed (or resampled) particles by itself: the ones not already flagged cannot be
+            # identified, the identifiers of the others follow the rows kept by the element (if it provides them)
+            if kept is None:
+                ids = -_np.ones(b2.shape[0], dtype=int)
+                alive = _np.ones(b2.shape[0], dtype=bool)
+            else:
+                ids = ids[kept]
+                alive = alive[kept]
+            losses.record_unidentified(index, n_alive - int(_np.count_nonzero(alive)))
+            n_alive = int(_np.count_nonzero(alive))
+        if check_apertures_exit:
+            n_alive = flag(index, e, b2, e.AT_EXIT.m_as("m"))
+        if observers:
+            b1_alive = b1 if alive_in is None else _np.compress(alive_in, b1, axis=0)
+            b2_alive = b2 if n_alive == b2.shape[0] else _np.compress(alive, b2, axis=0)
+            _notify(observers, e, b1_alive, b2_alive)
+        if b1.shape != b2.shape:
+            b1 = _np.zeros(b2.shape)
+        if n_alive == 0:
+            break
+        b2, b1 = b1, b2
+    _finalize(observers)
+
+
+def element_maps(
+    element,
+    global_parameters: nList,
+    step: float = 1e-5,
+) -> Tuple[_np.ndarray, _np.ndarray, _np.ndarray]:
+    """
+    The second-order map x -> K + R x + T x x of an element (T is upper triangular, Tijk with j <= k).
+
+    The maps of the Taylor integrators are used directly; for the other elements (MAD-X integrators, kickers,
+    matrices, etc.) the map is obtained by finite differences of the tracking of a few particles around the
+    reference orbit.
+
+    Args:
+        element: the element
+        global_parameters: the global parameters (relativistic beta)
+        step: the step of the finite differences
+
+    Returns:
+        the offset K, the transfer matrix R and the tensor T of the element
+    """
+    integrator = element.integrator
+    if integrator is not None and integrator.uses_maps(element):
+        matrix, tensor = integrator.maps(element, global_parameters)
+        if matrix.shape == (6, 6):  # The interpolated integrators return tables of maps
+            return _np.zeros(6), matrix, _np.zeros((6, 6, 6)) if tensor is None else tensor
+
+    n = 6
+    pairs = [(j, k) for j in range(n) for k in range(j + 1, n)]
+    coordinates = _np.zeros((1 + 2 * n + 4 * len(pairs), n))
+    for j in range(n):
+        coordinates[1 + 2 * j, j] = step
+        coordinates[2 + 2 * j, j] = -step
+    for p, (j, k) in enumerate(pairs):
+        for q, (sj, sk) in enumerate([(1, 1), (1, -1), (-1, 1), (-1, -1)]):
+            coordinates[1 + 2 * n + 4 * p + q, [j, k]] = [sj * step, sk * step]
+    f = element.propagate(_np.copy(coordinates), _np.zeros(coordinates.shape), global_parameters)[1]
+
+    offset = _np.copy(f[0])
+    matrix = _np.zeros((n, n))
+    tensor = _np.zeros((n, n, n))
+    for j in range(n):
+        matrix[:, j] = (f[1 + 2 * j] - f[2 + 2 * j]) / (2 * step)
+        tensor[:, j, j] = (f[1 + 2 * j] + f[2 + 2 * j] - 2 * f[0]) / (2 * step**2)
+    for p, (j, k) in enumerate(pairs):
+        pp, pm, mp, mm = f[1 + 2 * n + 4 * p : 5 + 2 * n + 4 * p]
+        tensor[:, j, k] = (pp - pm - mp + mm) / (4 * step**2)
+    return offset, matrix, tensor
+
+
+def element_matrix(element, global_parameters: nList, step: float = 1e-5) -> _np.ndarray:
+    """
+    The transfer matrix of an element around the reference orbit: the matrix of the Taylor integrators, or else
+    central finite differences of the tracking of 13 particles (see `element_maps` for the second order).
+
+    Args:
+        element: the element
+        global_parameters: the global parameters (relativistic beta)
+        step: the step of the finite differences
+
+    Returns:
+        the transfer matrix of the element
+    """
+    integrator = element.integrator
+    if integrator is not None and integrator.uses_maps(element):
+        matrix = integrator.maps(element, global_parameters)[0]
+        if matrix.shape == (6, 6):
+            return matrix
+    coordinates = _np.zeros((13, 6))
+    for j in range(6):
+        coordinates[1 + 2 * j, j] = step
+        coordinates[2 + 2 * j, j] = -step
+    f = element.propagate(coordinates, _np.zeros(coordinates.shape), global_parameters)[1]
+    return ((f[1::2, :6] - f[2::2, :6]) / (2 * step)).T
+
+
+def _quantity(value: float, units) -> Any:
+    """A value expressed in the units of the default value of a parameter (None if dimensionless)."""
+    return value if units is None else _ureg.Quantity(value, units)
+
+
+@_contextmanager
+def _element_attributes(element, attributes: Dict):
+    """Temporarily set attributes of an element; the original attributes are restored exactly on exit."""
+    original = {k: element.attributes[k] for k in attributes}
+    try:
+        element.set_parameters(attributes)
+        yield element
+    finally:
+        element.set_parameters(original)
+
+
+def element_matrix_derivatives(
+    element,
+    parameters: List[str],
+    global_parameters: nList,
+    step: float = 1e-6,
+) -> _np.ndarray:
+    """
+    Derivatives of the transfer matrix of an element (see `element_matrix`) with respect to some of its parameters.
+    When the integrator provides the analytic derivatives of the matrix with respect to the parameter vector of the
+    element (see `Integrator.matrix_derivatives`), they are combined with the derivatives of the parameter vector
+    with respect to the parameters; otherwise the matrix itself is differentiated by central finite differences.
+
+    Args:
+        element: the element
+        parameters: the parameters (e.g. 'K1', 'ANGLE', 'L'), whose values are expressed in the units of their
+                    default value
+        global_parameters: the global parameters (relativistic beta)
+        step: the relative step of the finite differences
+
+    Returns:
+        the derivatives, with shape (number of parameters, 6, 6)
+    """
+    units = _numeric_parameters(element.__class__)
+    integrator = element.integrator
+    analytic = integrator.matrix_derivatives(element, global_parameters)
+    result = _np.zeros((len(parameters), 6, 6))
+    for k, p in enumerate(parameters):
+        if p not in units:
+            raise _ManzoniException(f"{p} is not a numerical parameter of {element.NAME}.")
+        value = _magnitude(element.attributes[p], units[p])
+        h = step * max(1.0, abs(value))
+        shifted = [_quantity(value + d, units[p]) for d in (h, -h)]
+        evaluations = []
+        for v in shifted:
+            with _element_attributes(element, {p: v}):
+                if analytic is not None:
+                    evaluations.append(_np.asarray(list(integrator.cache(element)), dtype=float))
+                else:
+                    evaluations.append(element_matrix(element, global_parameters))
+        derivative = (evaluations[0] - evaluations[1]) / (2 * h)
+        result[k] = _np.tensordot(derivative, analytic, axes=1) if analytic is not None else derivative
+    return result
+
+
+def compose(
+    elements: List,
+    global_parameters: nList,
+    second_order: bool = True,
+) -> Tuple[_np.ndarray, _np.ndarray, _np.ndarray]:
+    """
+    Compose the maps of consecutive elements into a single map x -> K + R x + T x x (truncated at the second order).
+
+    Args:
+        elements: the elements, in the order of the beamline
+        global_parameters: the global parameters (relativistic beta)
+        second_order: compose the second-order tensors (otherwise only the offsets and the transfer matrices)
+
+    Returns:
+        the offset K, the transfer matrix R and the tensor T of the composed map
+    """
+    offset, matrix, tensor = _np.zeros(6), _np.eye(6), _np.zeros((6, 6, 6))
+    for e in elements:
+        k, r, t = element_maps(e, global_parameters)
+        if not second_order:
+            t = _np.zeros((6, 6, 6))
+        offset, matrix, tensor = _compose_maps(offset, matrix, tensor, k, r, t)
+    return offset, matrix, tensor
+
+
+def track_composed(
+    beamline: _Input,
+    beam: _Beam,
+    observers: List[Optional[_Observer]] = None,
+    check_apertures_exit: bool = False,
+    second_order: bool = True,
+    seed: Optional[int] = None,
+    turn: int = 0,
+):
+    """
+    Tracking with composed maps: the runs of consecutive elements that are neither observed nor checked for
+    apertures are replaced by their composed map (see `compose`), so that they cost a single matrix (and tensor)
+    propagation regardless of their number of elements. The composed maps are truncated at the second order.
+
+    The material elements (scatterers, degraders) and the elements seen by the observers are tracked individually,
+    so that the observers receive the actual beams at their entrance and at their exit; the elements with an
+    aperture end a composed run. The observers should be given the list of elements they observe, otherwise all
+    the elements are observed and nothing is composed.
+
+    Args:
+        beamline:
+        beam:
+        observers: the observers, finalized at the end of the tracking (see `Observer.finalize`)
+        check_apertures_exit:
+        second_order: compose the second-order tensors (otherwise the composed maps are linear)
+        seed: the seed of the random numbers of the material elements
+        turn: the turn (or any call counter) mixed with the seed, see `Input.track`
+    Returns:
+    """
+    if observers is None:
+        observers = []
+    observers = [o for o in observers if o is not None]
+    global_parameters = _global_parameters(beam, seed, turn)
+
+    def observed(element) -> bool:
+        return any(o.elements is None or element.NAME in o.elements for o in observers)
+
+    b1 = _np.copy(beam.distribution)
+    b2 = _np.zeros(b1.shape)
+    segment = []
+    for index, e in enumerate(beamline.sequence):
+        if isinstance(e, _MaterialElement):
+            b1, b2 = e.propagate(b1, b2, global_parameters)
+        else:
+            segment.append(e)
+            last = index == len(beamline.sequence) - 1
+            if not (
+                last
+                or observed(e)
+                or (check_apertures_exit and e.APERTYPE is not None)
+                or isinstance(beamline.sequence[index + 1], _MaterialElement)
+            ):
+                continue
+            # An observed element is tracked on its own, so that the observers see the beam at its entrance
+            composed = segment[:-1] if observed(e) else segment
+            if len(composed) == 1:
+                b1, b2 = composed[0].propagate(b1, b2, global_parameters)
+            elif len(composed) > 1:
+                offset, matrix, tensor = compose(composed, global_parameters, second_order)
+                indices, values = _sparse_tensor(tensor)
+                _batched_vector_matrix_sparse_tensor(b1[:, :6], b2[:, :6], matrix, indices, values)
+                b2[:, :6] += offset
+                b2[:, 6:] = b1[:, 6:]  # Only the phase-space coordinates are propagated by the composed maps
+            if len(composed) < len(segment):
+                if composed:
+                    b2, b1 = b1, b2
+                b1, b2 = e.propagate(b1, b2, global_parameters)
+            segment = []
+        if check_apertures_exit:
+            b1, b2 = e.check_aperture(b1, b2)
+        _notify(observers, e, b1, b2)
+        if b1.shape != b2.shape:
+            b1 = _np.zeros(b2.shape)
+        if b2.shape[0] == 0:
+            break
+        b2, b1 = b1, b2
+    _finalize(observers)
 
 
 def twiss(
@@ -152,5 +537,456 @@ def twiss(
     return matrix
 
 
-def match(beamline: _Input, beam: _Beam):
-    ...
+def twiss_from_maps(
+    beamline: _Input,
+    kinematics: _Kinematics,
+    twiss_init: _BetaBlock = None,
+    elements: Optional[List[str]] = None,
+    twiss_parametrization: bool = True,
+    with_phase_unrolling: bool = True,
+) -> _pd.DataFrame:
+    """
+    Linear optics from the products of the transfer matrices of the elements (see `element_matrix`), without
+    tracking. The matrices are converted to the conventions of georges_core (the sixth coordinate is the momentum
+    offset) and the Twiss functions follow the parametrization of `georges_core.twiss.Twiss`, so that the columns
+    are the same as the ones of `twiss`. The optics are computed around the reference orbit (no kicked orbit is
+    followed).
+
+    Args:
+        beamline: the beamline
+        kinematics: the kinematics of the reference particle
+        twiss_init: the initial Twiss parameters (if None, the periodic Twiss parameters of the full beamline)
+        elements: compute the optics only at the exit of these elements (all the elements if None)
+        twiss_parametrization: compute the Twiss functions (otherwise only the transfer matrices)
+        with_phase_unrolling: unroll the phase advances (with a subset of elements, the phase advance between two
+                              consecutive selected elements must stay below 2 pi)
+
+    Returns:
+        the dataframe with the transfer matrices (and the Twiss functions) at the exit of the elements
+    """
+    global_parameters = nList()
+    global_parameters.append(kinematics.beta)
+    sequence = beamline.sequence
+    matrices = _np.empty((len(sequence), 6, 6))
+    for i, e in enumerate(sequence):
+        matrices[i] = element_matrix(e, global_parameters)
+    return _twiss_from_matrices(
+        beamline,
+        _cumulative_matrices(matrices),
+        kinematics.beta,
+        twiss_init,
+        elements,
+        twiss_parametrization,
+        with_phase_unrolling,
+    )
+
+
+def twiss_configurations(
+    beamline: _Input,
+    kinematics: _Kinematics,
+    configurations: _pd.DataFrame,
+    twiss_init: _BetaBlock = None,
+    elements: Optional[List[str]] = None,
+    twiss_parametrization: bool = True,
+    with_phase_unrolling: bool = True,
+) -> _pd.DataFrame:
+    """
+    Linear optics of several configurations (sets of parameters) of a beamline, as `twiss_from_maps`. The transfer
+    matrices of all the configurations are computed in a single jitted call on the compiled beamline (see
+    `CompiledBeamline.matrices_configurations`), in parallel over the configurations.
+
+    Args:
+        beamline: the beamline
+        kinematics: the kinematics of the reference particle
+        configurations: one row per configuration and one column per (element, parameter) pair; the values follow
+                        the conventions of `Input.set_parameters_batch`
+        twiss_init: the initial Twiss parameters (if None, the periodic Twiss parameters of each configuration)
+        elements: compute the optics only at the exit of these elements (all the elements if None)
+        twiss_parametrization: compute the Twiss functions (otherwise only the transfer matrices)
+        with_phase_unrolling: unroll the phase advances
+
+    Returns:
+        the dataframe with the transfer matrices (and the Twiss functions), indexed by configuration and element
+    """
+    cumulated = beamline.compile().matrices_configurations(configurations, kinematics.beta)
+    return _twiss_from_matrices(
+        beamline,
+        cumulated,
+        kinematics.beta,
+        twiss_init,
+        elements,
+        twiss_parametrization,
+        with_phase_unrolling,
+        configurations=configurations.index,
+    )
+
+
+def jacobian(
+    beamline: _Input,
+    kinematics: _Kinematics,
+    targets: List[str],
+    variables: List[Tuple[str, str]],
+    step: float = 1e-6,
+) -> _pd.DataFrame:
+    """
+    Derivatives of the transfer matrices from the entrance of the beamline to the exit of some elements with respect
+    to parameters of the elements. The derivatives of the matrices of the elements are analytic when the integrator
+    provides them (see `element_matrix_derivatives`) and are propagated to the targets in a jitted kernel, so that
+    no Twiss computation is repeated. The matrices follow the conventions of `twiss_from_maps`.
+
+    Args:
+        beamline: the beamline
+        kinematics: the kinematics of the reference particle
+        targets: the elements at the exit of which the derivatives are computed
+        variables: the (element, parameter) pairs, the values of the parameters being expressed in the units of
+                   their default value
+        step: the relative step of the finite differences (for the elements without analytic derivatives)
+
+    Returns:
+        the dataframe of the derivatives, indexed by the target element and the matrix element (R11, R12, ...), with
+        one column per variable
+
+    Examples:
+        >>> mi.jacobian(kin, targets=["D3"], variables=[("Q1", "K1"), ("B1", "ANGLE")])  # doctest: +SKIP
+    """
+    global_parameters = nList()
+    global_parameters.append(kinematics.beta)
+    sequence = beamline.sequence
+    matrices = _np.empty((len(sequence), 6, 6))
+    for i, e in enumerate(sequence):
+        matrices[i] = element_matrix(e, global_parameters)
+    derivatives = _matrices_derivatives(beamline, matrices, targets, variables, global_parameters, step)
+    derivatives = _to_twiss_coordinates(derivatives, kinematics.beta)
+    index = _pd.MultiIndex.from_product(
+        [targets, [f"R{i + 1}{j + 1}" for i in range(6) for j in range(6)]],
+        names=["NAME", "MATRIX"],
+    )
+    columns = _pd.MultiIndex.from_tuples([tuple(v) for v in variables], names=["ELEMENT", "PARAMETER"])
+    return _pd.DataFrame(
+        derivatives.transpose(0, 2, 3, 1).reshape(len(targets) * 36, len(variables)),
+        index=index,
+        columns=columns,
+    )
+
+
+def _matrices_derivatives(
+    beamline: _Input,
+    matrices: _np.ndarray,
+    targets: List[str],
+    variables: List[Tuple[str, str]],
+    global_parameters: nList,
+    step: float,
+) -> _np.ndarray:
+    """Derivatives (shape (targets, variables, 6, 6)) of the cumulated matrices, in the Manzoni coordinates."""
+    for e in list(targets) + [v[0] for v in variables]:
+        if e not in beamline.mapper:
+            raise _ManzoniException(f"Unknown element: {e}.")
+    positions = _np.array([beamline.mapper[e] for e, _ in variables], dtype=_np.int64)
+    derivatives = _np.zeros((len(variables), 6, 6))
+    for i in _pd.unique(positions):
+        selected = _np.flatnonzero(positions == i)
+        derivatives[selected] = element_matrix_derivatives(
+            beamline.sequence[i],
+            [variables[k][1] for k in selected],
+            global_parameters,
+            step,
+        )
+    indices = _np.array([beamline.mapper[e] for e in targets], dtype=_np.int64)
+    order = _np.argsort(indices, kind="stable")
+    result = _np.empty((len(targets), len(variables), 6, 6))
+    result[order] = _cumulative_matrices_derivatives(matrices, positions, derivatives, indices[order])
+    return result
+
+
+def _to_twiss_coordinates(matrices: _np.ndarray, beta: float) -> _np.ndarray:
+    """Transfer matrices (shape (..., 6, 6)) in the coordinates of georges_core."""
+    # From (X, PX, Y, PY, DPP, PT) to the coordinates of georges_core (X, PX, Y, PY, L, DPP)
+    # with PT = beta * DPP at first order; the fifth (longitudinal) row and column are left empty
+    to_manzoni = _np.zeros((6, 6))
+    to_manzoni[:4, :4] = _np.eye(4)
+    to_manzoni[4, 5] = 1.0
+    to_manzoni[5, 5] = beta
+    from_manzoni = _np.zeros((6, 6))
+    from_manzoni[:4, :4] = _np.eye(4)
+    from_manzoni[5, 5] = 1.0
+    return from_manzoni @ matrices @ to_manzoni
+
+
+def _periodic_twiss(r: _np.ndarray) -> Dict[str, _np.ndarray]:
+    """Periodic Twiss parameters of one-turn matrices (shape (n, 6, 6)), as `georges_core.twiss.Twiss`."""
+    twiss = {}
+    with _np.errstate(invalid="ignore", divide="ignore"):
+        for plane, p in [(1, 0), (2, 2)]:
+            mu = _np.arccos((r[:, p, p] + r[:, p + 1, p + 1]) / 2.0)
+            beta = r[:, p, p + 1] / _np.sin(mu)
+            mu = _np.where(beta < 0.0, -mu, mu)
+            twiss[f"BETA{plane}{plane}"] = _np.abs(beta)
+            twiss[f"ALPHA{plane}{plane}"] = (r[:, p, p] - r[:, p + 1, p + 1]) / (2.0 * _np.sin(mu))
+            twiss[f"GAMMA{plane}{plane}"] = -r[:, p + 1, p] / _np.sin(mu)
+    disp = _np.linalg.solve(_np.eye(4) - r[:, :4, :4], r[:, :4, 5:6])[:, :, 0]
+    for i in range(4):
+        twiss[f"DISP{i + 1}"] = disp[:, i]
+    return twiss
+
+
+def _twiss_from_matrices(
+    beamline: _Input,
+    cumulated: _np.ndarray,
+    beta: float,
+    twiss_init: Optional[_BetaBlock],
+    elements: Optional[List[str]],
+    twiss_parametrization: bool,
+    with_phase_unrolling: bool,
+    configurations: Optional[_pd.Index] = None,
+) -> _pd.DataFrame:
+    r = _to_twiss_coordinates(cumulated.reshape(-1, cumulated.shape[-3], 6, 6), beta)
+
+    sequence = beamline.sequence
+    names = [e.NAME for e in sequence]
+    s = _np.array([e.AT_EXIT.m_as("m") for e in sequence])
+    if twiss_parametrization and twiss_init is None:
+        init = _periodic_twiss(r[:, -1])
+    elif twiss_parametrization:
+        init = {
+            k: _np.full(r.shape[0], twiss_init[k] if u is None else twiss_init[k].m_as(u))
+            for k, u in [("BETA11", "m"), ("BETA22", "m"), ("GAMMA11", "m**-1"), ("GAMMA22", "m**-1")]
+            + [("ALPHA11", None), ("ALPHA22", None), ("DISP1", "m"), ("DISP2", None), ("DISP3", "m"), ("DISP4", None)]
+        }
+    if elements is not None:
+        selected = [beamline.mapper[e] for e in elements]
+        r, names, s = r[:, selected], list(elements), s[selected]
+
+    data = {f"R{i + 1}{j + 1}": r[:, :, i, j] for i in range(6) for j in range(6)}
+    data["S"] = _np.broadcast_to(s, r.shape[:2])
+    if twiss_parametrization:
+        # Same parametrization as georges_core.twiss.Twiss, vectorized over the configurations and the elements
+        twiss = {}
+        for plane, p in [(1, 0), (2, 2)]:
+            r11, r12, r21, r22 = r[:, :, p, p], r[:, :, p, p + 1], r[:, :, p + 1, p], r[:, :, p + 1, p + 1]
+            alpha0 = init[f"ALPHA{plane}{plane}"][:, None]
+            beta0 = init[f"BETA{plane}{plane}"][:, None]
+            gamma0 = init[f"GAMMA{plane}{plane}"][:, None]
+            d0 = init[f"DISP{2 * plane - 1}"][:, None]
+            dp0 = init[f"DISP{2 * plane}"][:, None]
+            twiss[f"BETA{plane}{plane}"] = r11**2 * beta0 - 2.0 * r11 * r12 * alpha0 + r12**2 * gamma0
+            twiss[f"ALPHA{plane}{plane}"] = -r11 * r21 * beta0 + (r11 * r22 + r12 * r21) * alpha0 - r12 * r22 * gamma0
+            twiss[f"GAMMA{plane}{plane}"] = r21**2 * beta0 - 2.0 * r21 * r22 * alpha0 + r22**2 * gamma0
+            twiss[f"MU{plane}"] = _np.arctan2(r12, r11 * beta0 - r12 * alpha0)
+            twiss[f"DET{plane}"] = r11 * r22 - r12 * r21
+            twiss[f"DISP{2 * plane - 1}"] = d0 * r11 + dp0 * r12 + r[:, :, p, 5]
+            twiss[f"DISP{2 * plane}"] = d0 * r21 + dp0 * r22 + r[:, :, p + 1, 5]
+        columns = ["BETA11", "BETA22", "ALPHA11", "ALPHA22", "GAMMA11", "GAMMA22", "MU1", "MU2", "DET1", "DET2"]
+        columns += ["DISP1", "DISP2", "DISP3", "DISP4"]
+        data.update({c: twiss[c] for c in columns})
+        if with_phase_unrolling:
+            for plane in (1, 2):
+                data[f"MU{plane}U"] = _np.array([_phase_unrolling(_np.copy(mu)) for mu in twiss[f"MU{plane}"]])
+
+    data = {k: _np.ravel(v) for k, v in data.items()}
+    if configurations is None:
+        return _pd.DataFrame(data, index=names)
+    index = _pd.MultiIndex.from_product([configurations, names], names=["CONFIGURATION", "NAME"])
+    return _pd.DataFrame(data, index=index)
+
+
+class MatchResult(NamedTuple):
+    """The result of a matching (see `match`)."""
+
+    variables: _pd.DataFrame
+    """The variables (ELEMENT, PARAMETER), with their INITIAL and final VALUE."""
+    constraints: _pd.DataFrame
+    """The constraints (ELEMENT, QUANTITY), with their TARGET, WEIGHT and final VALUE."""
+    history: _pd.DataFrame
+    """The COST and the elapsed TIME (in seconds) of each iteration (each evaluation of the Jacobian)."""
+    success: bool
+    message: str
+
+
+SIGMA_QUANTITIES = {"SIGMA_X": 0, "SIGMA_PX": 1, "SIGMA_Y": 2, "SIGMA_PY": 3}
+"""The beam sizes that can be matched, with the corresponding coordinate."""
+
+
+def match(
+    beamline: _Input,
+    kinematics: _Kinematics,
+    variables: List[Tuple],
+    constraints: List[Tuple],
+    beam: Optional[_Beam] = None,
+    twiss_init: _BetaBlock = None,
+    method: str = "trf",
+    step: float = 1e-6,
+    max_iterations: int = 100,
+    tolerance: float = 1e-10,
+    apply: bool = True,
+    derivatives: str = "finite-differences",
+) -> MatchResult:
+    """
+    Match the linear optics of a beamline with a least-squares solver (`scipy.optimize.least_squares`).
+
+    The optics are computed from the transfer matrices of the compiled beamline (see `twiss_configurations`), which
+    is compiled once. The Jacobian is obtained by forward finite differences, all the variables being shifted in a
+    single batch of configurations evaluated in parallel. With analytic derivatives, the transfer matrices of the
+    shifted configurations are instead extrapolated from the derivatives of the matrices (see `jacobian`), so that
+    the beamline is lowered only once per iteration.
+
+    Args:
+        beamline: the beamline
+        kinematics: the kinematics of the reference particle
+        variables: the (element, parameter) pairs to vary, optionally with the bounds (lower, upper) of their values;
+                   the values are expressed in the units of the default value of the parameters
+        constraints: the (element, quantity, target) or (element, quantity, target, weight) constraints, at the exit
+                     of the elements; the quantities are the columns of `twiss_from_maps` (Twiss functions and
+                     transfer matrix elements) or the beam sizes of `SIGMA_QUANTITIES` (requires the beam)
+        beam: the beam whose covariance matrix is propagated for the beam size constraints
+        twiss_init: the initial Twiss parameters (if None, the periodic Twiss parameters of the beamline)
+        method: the algorithm of `scipy.optimize.least_squares` ('trf', 'dogbox' or 'lm' without bounds)
+        step: the relative step of the finite differences
+        max_iterations: the maximum number of iterations
+        tolerance: the tolerance on the cost, on the variables and on the gradient
+        apply: set the final values of the variables on the beamline
+        derivatives: 'finite-differences' or 'analytic' (derivatives of the transfer matrices)
+
+    Returns:
+        the result of the matching
+
+    Examples:
+        >>> result = match(mi, kin, variables=[("Q1", "K1"), ("Q2", "K1")],
+        ...                constraints=[("D3", "BETA11", 10.0), ("D3", "ALPHA11", 0.0)])  # doctest: +SKIP
+        >>> result.history  # doctest: +SKIP
+    """
+    variables = [tuple(v) for v in variables]
+    constraints = [tuple(c) + (1.0,) * (4 - len(c)) for c in constraints]
+    columns = _pd.MultiIndex.from_tuples([v[:2] for v in variables])
+    lower = _np.array([v[2][0] if len(v) > 2 else -_np.inf for v in variables], dtype=float)
+    upper = _np.array([v[2][1] if len(v) > 2 else _np.inf for v in variables], dtype=float)
+    initial = _np.empty(len(variables))
+    for k, (name, p, *_) in enumerate(variables):
+        element = beamline.sequence[beamline.mapper[name]]
+        units = _numeric_parameters(element.__class__)
+        if p not in units:
+            raise _ManzoniException(f"{p} is not a numerical parameter of {name}.")
+        initial[k] = _magnitude(element.attributes[p], units[p])
+    targets = _np.array(
+        [t.to_base_units().magnitude if isinstance(t, _ureg.Quantity) else t for _, _, t, _ in constraints],
+        dtype=float,
+    )
+    weights = _np.array([w for *_, w in constraints], dtype=float)
+    elements = list(dict.fromkeys(c[0] for c in constraints))
+    positions = [elements.index(c[0]) for c in constraints]
+    sigma_in = None
+    if any(c[1] in SIGMA_QUANTITIES for c in constraints):
+        if beam is None:
+            raise _ManzoniException("The beam is required to match the beam sizes.")
+        sigma_in = _beam_moments(_np.ascontiguousarray(beam.distribution), 6)[1]
+    if derivatives not in ("finite-differences", "analytic"):
+        raise _ManzoniException(f"Unknown derivatives: {derivatives}.")
+    compiled = beamline.compile()
+    beta = kinematics.beta
+    indices = [beamline.mapper[e] for e in elements]
+    global_parameters = nList()
+    global_parameters.append(beta)
+    if derivatives == "analytic":
+        sequence = beamline.sequence
+        matrices = _np.empty((len(sequence), 6, 6))
+        for i, e in enumerate(sequence):
+            matrices[i] = element_matrix(e, global_parameters)
+        # The Twiss functions depend on the matrices at the constraints (and on the one-turn matrix if periodic)
+        needed = list(dict.fromkeys(elements + ([sequence[-1].NAME] if twiss_init is None else [])))
+
+    def evaluate(x: _np.ndarray) -> _np.ndarray:
+        return compiled.matrices_configurations(_pd.DataFrame(x, columns=columns), beta)
+
+    def constrained(cumulated: _np.ndarray) -> _np.ndarray:
+        optics = _twiss_from_matrices(
+            beamline,
+            cumulated,
+            beta,
+            twiss_init,
+            elements,
+            True,
+            False,
+            _pd.RangeIndex(cumulated.shape[0]),
+        )
+        values = _np.empty((cumulated.shape[0], len(constraints)))
+        for k, (_, quantity, _, _) in enumerate(constraints):
+            if quantity in SIGMA_QUANTITIES:
+                m = cumulated[:, indices[positions[k]]]
+                j = SIGMA_QUANTITIES[quantity]
+                values[:, k] = _np.sqrt(_np.einsum("ni,ij,nj->n", m[:, j], sigma_in, m[:, j]))
+            else:
+                values[:, k] = optics[quantity].values.reshape(cumulated.shape[0], len(elements))[:, positions[k]]
+        return values
+
+    def extrapolate(x: _np.ndarray, h: _np.ndarray) -> _np.ndarray:
+        cumulated = _np.repeat(evaluate(x[None, :]), len(x) + 1, axis=0)
+        with _ExitStack() as stack:
+            for i in _pd.unique(_np.array([beamline.mapper[e] for e, *_ in variables])):
+                e = beamline.sequence[i]
+                units = _numeric_parameters(e.__class__)
+                stack.enter_context(
+                    _element_attributes(
+                        e,
+                        {p: _quantity(v, units.get(p)) for (name, p), v in zip(columns, x) if name == e.NAME},
+                    ),
+                )
+                matrices[i] = element_matrix(e, global_parameters)
+            d = _matrices_derivatives(beamline, matrices, needed, list(columns), global_parameters, step)
+        for t, e in enumerate(needed):
+            cumulated[1:, beamline.mapper[e]] += h[:, None, None] * d[t]
+        return cumulated
+
+    history = []
+    clock = [_time.perf_counter()]
+
+    def residuals(x: _np.ndarray) -> _np.ndarray:
+        return weights * (constrained(evaluate(x[None, :]))[0] - targets)
+
+    def jacobian(x: _np.ndarray) -> _np.ndarray:
+        h = step * _np.maximum(1.0, _np.abs(x))
+        h = _np.where(x + h > upper, -h, h)  # Stay within the bounds
+        if derivatives == "analytic":
+            batch = extrapolate(x, h)
+        else:
+            batch = evaluate(_np.vstack([x, x + _np.diag(h)]))
+        values = weights * (constrained(batch) - targets)
+        now = _time.perf_counter()
+        history.append((len(history), 0.5 * _np.sum(values[0] ** 2), now - clock[0]))
+        clock[0] = now
+        return ((values[1:] - values[0]) / h[:, None]).T
+
+    solution = _least_squares(
+        residuals,
+        initial,
+        jac=jacobian,
+        bounds=(lower, upper) if method != "lm" else (-_np.inf, _np.inf),
+        method=method,
+        max_nfev=max_iterations * (len(variables) + 1) if method == "lm" else max_iterations,
+        ftol=tolerance,
+        xtol=tolerance,
+        gtol=tolerance,
+    )
+    if apply:
+        beamline.set_parameters_batch([(e, p, v) for (e, p), v in zip(columns, solution.x)])
+    final = constrained(evaluate(solution.x[None, :]))[0]
+    return MatchResult(
+        variables=_pd.DataFrame(
+            {
+                "ELEMENT": [v[0] for v in variables],
+                "PARAMETER": [v[1] for v in variables],
+                "INITIAL": initial,
+                "VALUE": solution.x,
+            },
+        ),
+        constraints=_pd.DataFrame(
+            {
+                "ELEMENT": [c[0] for c in constraints],
+                "QUANTITY": [c[1] for c in constraints],
+                "TARGET": targets,
+                "WEIGHT": weights,
+                "VALUE": final,
+            },
+        ),
+        history=_pd.DataFrame(history, columns=["ITERATION", "COST", "TIME"]).set_index("ITERATION"),
+        success=bool(solution.success),
+        message=solution.message,
+    )
@@ -19,7 +19,9 @@ from ..apertures import (
     phase_space_aperture_check,
     rectangular_aperture_check,
 )
-from ..integrators import IntegratorType, MadXIntegrator
+from ..integrators import Binding, IntegratorType, MadXIntegrator
+
+_DIMENSIONLESS = _ureg.Quantity(1).dimensionality
 
 
 class ManzoniException(Exception):
@@ -46,16 +48,16 @@ class ElementType(type):
     def __new__(mcs, name: str, bases: Tuple[ElementType, type, ...], dct: Dict[str, Any]):
         # Insert a default initializer (constructor) in case one is not present
         if "__init__" not in dct:
+            defaults = {}
+            if "post_init" in dct:  # Resolved once for the class, not for each instance
+                defaults = {
+                    parameter_name: parameter_value.default
+                    for parameter_name, parameter_value in inspect.signature(dct["post_init"]).parameters.items()
+                    if parameter_value.default is not inspect.Parameter.empty
+                }
 
             def default_init(self, name: str = "", integrator: IntegratorType = MadXIntegrator, *params, **kwargs):
                 """Default initializer for all Commands."""
-                defaults = {}
-                if "post_init" in dct:
-                    defaults = {
-                        parameter_name: parameter_value.default
-                        for parameter_name, parameter_value in inspect.signature(dct["post_init"]).parameters.items()
-                        if parameter_value.default is not inspect.Parameter.empty
-                    }
                 bases[0].__init__(self, name, integrator, dct.get("PARAMETERS", {}), *params, **{**defaults, **kwargs})
                 if "post_init" in dct:
                     dct["post_init"](self, **kwargs)
@@ -68,6 +70,9 @@ class ElementType(type):
         if "post_init" in dct and len(bases) > 0:
             dct["_POST_INIT"] = {*getattr(bases[0], "_POST_INIT", {}), *dct["post_init"].__code__.co_varnames}
 
+        # Dimensionality of the default values of the parameters, filled when they are first set
+        dct["_DIMENSIONALITIES"] = {}
+
         # Add PARAMETERS from the base class
         try:
             dct["PARAMETERS"] = {**getattr(bases[0], "PARAMETERS", {}), **dct.get("PARAMETERS", {})}
@@ -135,6 +140,8 @@ class Element(metaclass=ElementType):
             **kwargs:
         """
         self._attributes = {}
+        self._magnitudes = {}
+        self._version = 0
         for d in (Element.PARAMETERS,) + params:
             self._attributes = dict(self._attributes, **{k: v[0] for k, v in d.items()})
         for k, v in kwargs.items():
@@ -239,17 +246,83 @@ class Element(metaclass=ElementType):
             try:
                 dimension = v.dimensionality
             except AttributeError:
-                dimension = _ureg.Quantity(1).dimensionality  # No dimension
-            try:
-                if default is not None and dimension != _ureg.Quantity(default).dimensionality:
-                    raise ManzoniAttributeException(
-                        f"Invalid dimension ({dimension} "
-                        f"instead of {_ureg.Quantity(default).dimensionality}) "
-                        f"for parameter {k_}={v} of {self.__class__.__name__}.",
-                    )
-            except (ValueError, TypeError, _UndefinedUnitError):
-                pass
+                dimension = _DIMENSIONLESS  # No dimension
+            default_dimension = self._default_dimensionality(k_)
+            if default_dimension is not None and dimension != default_dimension:
+                raise ManzoniAttributeException(
+                    f"Invalid dimension ({dimension} "
+                    f"instead of {default_dimension}) "
+                    f"for parameter {k_}={v} of {self.__class__.__name__}.",
+                )
             self._attributes[k_] = v
+            self._magnitudes.pop(k_, None)
+            self._version += 1
+            if k_ not in Element.PARAMETERS:
+                self._parameter_changed(k_)
+
+    @property
+    def version(self) -> int:
+        """A counter incremented each time a parameter of the element is set (see `SequenceTable`)."""
+        return self._version
+
+    def magnitude(self, k: str, units: str) -> float:
+        """
+        The magnitude of a parameter in given units. The pint conversion is done once after each assignment of the
+        parameter, which only discards the magnitudes of this parameter: the caches of the elements are recomputed
+        from the stored magnitudes of the parameters that did not change.
+
+        Args:
+            k: the parameter
+            units: the units of the magnitude (e.g. 'm**-2')
+
+        Returns:
+            the magnitude of the parameter
+        """
+        magnitudes = self._magnitudes.setdefault(k, {})
+        try:
+            return magnitudes[units]
+        except KeyError:
+            magnitudes[units] = magnitude = float(self._attributes[k].m_as(units))
+            return magnitude
+
+    def _parameter_changed(self, k: str):
+        """
+        Called when a parameter of the element is set.
+
+        Args:
+            k: the name of the parameter
+        """
+        pass
+
+    @classmethod
+    def _default_dimensionality(cls, k: str) -> Any:
+        """
+        The dimensionality of the default value of a given parameter, computed once per class and parameter.
+
+        Args:
+            k: the parameter
+
+        Returns:
+            the dimensionality, or None if the default value has no dimension that can be checked
+        """
+        try:
+            return cls._DIMENSIONALITIES[k]
+        except KeyError:
+            pass
+        try:
+            default = cls.PARAMETERS[k][0]
+        except (TypeError, IndexError):
+            default = cls.PARAMETERS[k]
+        try:  # Avoid a bug in pint where a string starting with '#' cannot be parsed
+            default = default.lstrip("#")
+        except AttributeError:
+            pass
+        try:
+            dimension = _ureg.Quantity(default).dimensionality if default is not None else None
+        except (ValueError, TypeError, _UndefinedUnitError):
+            dimension = None
+        cls._DIMENSIONALITIES[k] = dimension
+        return dimension
 
     def _retrieve_default_parameter_value(self, k: str) -> Any:
         """
@@ -330,8 +403,13 @@ class ManzoniElement(Element, _Patchable):
             **kwargs:
         """
         super().__init__(name, *params, **kwargs)
-        self._integrator: Optional[IntegratorType] = integrator or self.INTEGRATOR
+        self._integrator: Optional[IntegratorType] = None
+        self._binding: Optional[Binding] = None
+        self.integrator = integrator or self.INTEGRATOR
         self._cache: Optional[nList] = None
+        self._cache_key: Optional[tuple] = None
+        self._parameter_vector: Optional[_np.ndarray] = None
+        self._stale: bool = True
         self._frozen: bool = False
 
     def propagate(
@@ -351,7 +429,7 @@ class ManzoniElement(Element, _Patchable):
 
         """
 
-        return self.integrator.propagate(self, beam, out, global_parameters)
+        return self._binding.propagate(self, beam, out, global_parameters)
 
     def check_aperture(
         self,
@@ -367,15 +445,26 @@ class ManzoniElement(Element, _Patchable):
         Returns:
 
         """
-        if self.APERTYPE is not None:
-            aperture_check, aperture_parameters = self.aperture
-            out = _np.compress(
-                aperture_check(out, aperture_parameters),
-                out,
-                axis=0,
-            )
+        mask = self.aperture_mask(out)
+        if mask is not None:
+            out = _np.compress(mask, out, axis=0)
         return beam, out
 
+    def aperture_mask(self, beam: _np.ndarray) -> Optional[_np.ndarray]:
+        """
+        Check which particles are inside the aperture of the element, without removing the others.
+
+        Args:
+            beam: the beam to check
+
+        Returns:
+            a boolean array (True for the particles inside the aperture), or None if the element has no aperture
+        """
+        if self.APERTYPE is None:
+            return None
+        aperture_check, aperture_parameters = self.aperture
+        return aperture_check(beam, aperture_parameters)
+
     def freeze(self):
         """
 
@@ -425,6 +514,13 @@ class ManzoniElement(Element, _Patchable):
     @integrator.setter
     def integrator(self, integrator: IntegratorType):
         self._integrator = integrator
+        self._binding = integrator.bind(self) if integrator is not None else None
+        self._stale = True
+
+    @property
+    def binding(self) -> Optional[Binding]:
+        """The kernel resolved by the integrator for this element (see `Integrator.bind`)."""
+        return self._binding
 
     @property
     def parameters(self) -> list:
@@ -478,11 +574,84 @@ class ManzoniElement(Element, _Patchable):
 
     def clear_cache(self):
         self._cache = None
+        self._cache_key = None
+        self._parameter_vector = None
+
+    def _parameter_changed(self, k: str):
+        self._stale = True
+
+    def set_parameters(self, parameters: Dict[str, Any]):
+        """
+        Set parameters of the element and invalidate its cache; a frozen element is refreshed (once for all the
+        parameters) so that it is tracked with the new values. The values are stored as given, without the checks of
+        the attribute access: they must have the dimension of the default value of each parameter.
+
+        Args:
+            parameters: the new value of each parameter
+
+        Examples:
+            >>> q1.set_parameters({"K1": 2 * _ureg.m**-2, "L": 0.5 * _ureg.m})  # doctest: +SKIP
+        """
+        for k, v in parameters.items():
+            self._attributes[k] = v
+            self._magnitudes.pop(k, None)
+            self._version += 1
+            self._parameter_changed(k)
+        if self.frozen:
+            self.refresh()
+
+    def set_parameter(self, name: str, value: Any):
+        """
+        Set a parameter of the element (see `set_parameters`).
+
+        Args:
+            name: the name of the parameter
+            value: the new value
+        """
+        self.set_parameters({name: value})
+
+    def refresh(self):
+        """
+        Recompute the cache of the element now, even if the element is frozen.
+
+        Returns:
+            the element
+        """
+        self._stale = True
+        frozen, self._frozen = self._frozen, False
+        self.cache  # Calls it!
+        self._frozen = frozen
+        return self
 
     @property
     def cache(self) -> nList:
-        if not self.frozen:
+        """
+        The parameters of the element, as computed by its integrator (with the units removed). They are only
+        recomputed after a parameter of the element has been set (or its integrator changed), unless the element
+        is frozen. A recomputation goes through `Integrator.cache`, which reads the magnitudes of the parameters
+        (see `magnitude`): only the parameters set since the previous computation are converted by pint.
+        """
+        if self._cache is None or (self._stale and not self.frozen):
             self._cache = nList()
             for e in self.integrator.cache(self):
                 self._cache.append(e)
+            self._cache_key = None
+            self._parameter_vector = None
+            self._stale = False
         return self._cache
+
+    @property
+    def parameter_vector(self) -> _np.ndarray:
+        """The parameters of the element (see `cache`) as a contiguous float64 array, passed to the kernels."""
+        cache = self.cache
+        if self._parameter_vector is None:
+            self._parameter_vector = _np.ascontiguousarray(list(cache), dtype=_np.float64)
+        return self._parameter_vector
+
+    @property
+    def cache_key(self) -> tuple:
+        """A hashable copy of the cache, used to look up the transfer maps of the element in the map cache."""
+        cache = self.cache
+        if self._cache_key is None:
+            self._cache_key = tuple(cache)
+        return self._cache_key
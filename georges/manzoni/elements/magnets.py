@@ -110,7 +110,7 @@ class Gap(_ManzoniElement):
             _np.copyto(dst=beam_out, src=beam_in, casting="no")
             return beam_in, beam_out
         else:
-            return self.integrator.propagate(self, beam_in, beam_out, global_parameters)
+            return self._binding.propagate(self, beam_in, beam_out, global_parameters)
 
     @property
     def parameters(self) -> list:
@@ -118,7 +118,7 @@ class Gap(_ManzoniElement):
             map(
                 float,
                 [
-                    self.L.m_as("meter"),
+                    self.magnitude("L", "meter"),
                 ],
             ),
         )
@@ -176,7 +176,7 @@ class SRotation(_ManzoniElement):
             map(
                 float,
                 [
-                    self.ANGLE.m_as("radian"),
+                    self.magnitude("ANGLE", "radian"),
                 ],
             ),
         )
@@ -221,9 +221,9 @@ class Quadrupole(Magnet):
 
     @property
     def parameters(self) -> list:
-        k1 = self.K1.m_as("m**-2")
-        k1s = self.K1S.m_as("m**-2")
-        tilt = self.TILT.m_as("radian")
+        k1 = self.magnitude("K1", "m**-2")
+        k1s = self.magnitude("K1S", "m**-2")
+        tilt = self.magnitude("TILT", "radian")
 
         if k1s != 0.0 or tilt != 0.0:
             tilt -= _np.arctan2(k1s, k1) / 2
@@ -233,7 +233,7 @@ class Quadrupole(Magnet):
             map(
                 float,
                 [
-                    self.L.m_as("m"),
+                    self.magnitude("L", "m"),
                     k1,
                     tilt,
                 ],
@@ -294,11 +294,11 @@ class Bend(Magnet):
 
     @property
     def length(self) -> float:
-        return self.L.m_as("m")
+        return self.magnitude("L", "m")
 
     @property
     def edges(self) -> Tuple[float, float]:
-        return self.E1.m_as("radian"), self.E2.m_as("radian")
+        return self.magnitude("E1", "radian"), self.magnitude("E2", "radian")
 
     @property
     def fringe_field_integrals(self) -> Tuple[float, float]:
@@ -310,12 +310,12 @@ class Bend(Magnet):
     def parameters(self) -> list:
         # Generic parameters
         length = self.length
-        h = self.ANGLE.m_as("radian") / self.length
-        if self.K0.m_as("m**-1") is None or self.K0.m_as("m**-1") == 0:
+        h = self.magnitude("ANGLE", "radian") / self.length
+        if self.magnitude("K0", "m**-1") is None or self.magnitude("K0", "m**-1") == 0:
             k0 = h
         else:
-            k0 = self.K0.m_as("m**-1")
-        hgap = self.HGAP.m_as("m")
+            k0 = self.magnitude("K0", "m**-1")
+        hgap = self.magnitude("HGAP", "m")
         e1, e2 = self.edges
         fint, fintx = self.fringe_field_integrals
         entrance_fringe_x, entrance_fringe_y = Bend.compute_fringe(h, e1, hgap, fint)
@@ -326,10 +326,10 @@ class Bend(Magnet):
                 float,
                 [
                     length,  # 0
-                    self.ANGLE.m_as("radian"),  # 1
-                    self.K1.m_as("m**-2"),  # 2
-                    self.K2.m_as("m**-3"),  # 3
-                    self.TILT.m_as("radian"),  # 4
+                    self.magnitude("ANGLE", "radian"),  # 1
+                    self.magnitude("K1", "m**-2"),  # 2
+                    self.magnitude("K2", "m**-3"),  # 3
+                    self.magnitude("TILT", "radian"),  # 4
                     h,  # 5
                     k0,  # 6
                     entrance_fringe_x,  # 7
@@ -356,8 +356,8 @@ class RBend(Bend):
 
     @property
     def length(self) -> float:
-        length = self.L.m_as("m")
-        angle = self.ANGLE.m_as("rad")
+        length = self.magnitude("L", "m")
+        angle = self.magnitude("ANGLE", "rad")
         if angle > 1e-8:
             return length * angle / (2.0 * _np.sin(angle / 2.0))
         else:
@@ -365,8 +365,8 @@ class RBend(Bend):
 
     @property
     def edges(self) -> Tuple[float, float]:
-        alpha = self.ANGLE.m_as("radian") / 2.0
-        return self.E1.m_as("radian") + alpha, self.E2.m_as("radian") + alpha
+        alpha = self.magnitude("ANGLE", "radian") / 2.0
+        return self.magnitude("E1", "radian") + alpha, self.magnitude("E2", "radian") + alpha
 
 
 class Fringein(Bend):
@@ -417,12 +417,12 @@ class Fringein(Bend):
                 float,
                 [
                     self.length,  # 0
-                    self.ANGLE.m_as("radian"),  # 1
-                    self.K1.m_as("m**-2"),  # 2
-                    self.E1.m_as("radian"),  # 3
-                    self.HGAP.m_as("m"),  # 4
+                    self.magnitude("ANGLE", "radian"),  # 1
+                    self.magnitude("K1", "m**-2"),  # 2
+                    self.magnitude("E1", "radian"),  # 3
+                    self.magnitude("HGAP", "m"),  # 4
                     self.FINT,  # 5
-                    self.R1.m_as("m"),  # 6
+                    self.magnitude("R1", "m"),  # 6
                 ],
             ),
         )
@@ -475,12 +475,12 @@ class Fringeout(Bend):
                 float,
                 [
                     self.length,  # 0
-                    self.ANGLE.m_as("radian"),  # 1
-                    self.K1.m_as("m**-2"),  # 2
-                    self.E2.m_as("radian"),  # 3
-                    self.HGAP.m_as("m"),  # 4
+                    self.magnitude("ANGLE", "radian"),  # 1
+                    self.magnitude("K1", "m**-2"),  # 2
+                    self.magnitude("E2", "radian"),  # 3
+                    self.magnitude("HGAP", "m"),  # 4
                     self.FINTX,  # 5
-                    self.R2.m_as("m"),  # 6
+                    self.magnitude("R2", "m"),  # 6
                 ],
             ),
         )
@@ -518,9 +518,9 @@ class DipEdge(Magnet):
 
     @property
     def parameters(self) -> list:
-        h = self.H.m_as("m**-1")
-        e1 = self.E1.m_as("radian")
-        hgap = self.HGAP.m_as("m")
+        h = self.magnitude("H", "m**-1")
+        e1 = self.magnitude("E1", "radian")
+        hgap = self.magnitude("HGAP", "m")
         fint = self.FINT
         return list(Bend.compute_fringe(h, e1, hgap, fint))
 
@@ -563,9 +563,9 @@ class Multipole(Magnet):
             map(
                 float,
                 [
-                    self.L.m_as("m"),
-                    self.K1.m_as("m**-2"),
-                    self.K2.m_as("m**-3"),
+                    self.magnitude("L", "m"),
+                    self.magnitude("K1", "m**-2"),
+                    self.magnitude("K2", "m**-3"),
                 ],
             ),
         )
@@ -602,8 +602,8 @@ class Sextupole(Magnet):
             map(
                 float,
                 [
-                    self.L.m_as("m"),
-                    self.K2.m_as("m**-3"),
+                    self.magnitude("L", "m"),
+                    self.magnitude("K2", "m**-3"),
                 ],
             ),
         )
@@ -657,7 +657,7 @@ class Kicker(Magnet):
 
     @property
     def parameters(self) -> list:
-        tilt = -self.TILT.m_as("radian")
+        tilt = -self.magnitude("TILT", "radian")
         ct = _np.cos(tilt)
         st = _np.sin(tilt)
         hkick = self.HKICK
@@ -668,7 +668,7 @@ class Kicker(Magnet):
             map(
                 float,
                 [
-                    self.L.m_as("m"),
+                    self.magnitude("L", "m"),
                     _hkick,
                     _vkick,
                 ],
@@ -714,7 +714,7 @@ class HKicker(Magnet):
 
     @property
     def parameters(self) -> list:
-        tilt = -self.TILT.m_as("radian")
+        tilt = -self.magnitude("TILT", "radian")
         ct = _np.cos(tilt)
         st = _np.sin(tilt)
         kick = self.KICK
@@ -724,7 +724,7 @@ class HKicker(Magnet):
             map(
                 float,
                 [
-                    self.L.m_as("m"),
+                    self.magnitude("L", "m"),
                     hkick,
                     vkick,
                 ],
@@ -766,7 +766,7 @@ class VKicker(Magnet):
 
     @property
     def parameters(self) -> list:
-        tilt = -self.TILT.m_as("radian")
+        tilt = -self.magnitude("TILT", "radian")
         ct = _np.cos(tilt)
         st = _np.sin(tilt)
         kick = self.KICK
@@ -776,7 +776,7 @@ class VKicker(Magnet):
             map(
                 float,
                 [
-                    self.L.m_as("m"),
+                    self.magnitude("L", "m"),
                     hkick,
                     vkick,
                 ],
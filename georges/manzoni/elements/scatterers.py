@@ -1,7 +1,9 @@
 """
 TODO
 """
-from typing import List, Tuple
+import functools as _functools
+import zlib as _zlib
+from typing import List, Optional, Tuple
 
 import numpy as _np
 
@@ -13,11 +15,51 @@ except ModuleNotFoundError:
 from ... import Kinematics
 from ... import ureg as _ureg
 from ...fermi import materials
-from ..beam import Beam as _Beam
 from ..integrators import MadXIntegrator, MadXParaxialDriftIntegrator
+from ..kernels import degrader, random_indices, random_stream_key, scattering
 from .elements import ManzoniElement as _ManzoniElement
 
 
+@_functools.lru_cache(maxsize=256)
+def degrader_slices(material, kinetic_energy: float, thickness: float, slices: int) -> _np.ndarray:
+    """
+    The table of the slices of a thick degrader, computed once per material, energy, thickness and number of slices.
+    Each slice is described by its entrance energy, its Fermi-Eyges parameters (computed at this energy), the
+    standard deviation of the momentum offset it adds and its transmission. The energy spread and the transmission
+    models give cumulated values at the exit energy: they are distributed over the slices so that their totals are the
+    ones of the single-step model (the variances add up and the transmissions multiply).
+
+    Args:
+        material: the material of the degrader
+        kinetic_energy: the kinetic energy at the entrance of the degrader (MeV)
+        thickness: the thickness of the degrader (m)
+        slices: the number of slices
+
+    Returns:
+        a read-only array with one row per slice: length, kinetic energy, A0, A1, A2, momentum offset, transmission
+    """
+    length = thickness / slices
+    energies = [kinetic_energy]
+    for k in range(slices):
+        energies.append(material.stopping(length * _ureg.m, energies[-1] * _ureg.MeV).ekin.m_as("MeV"))
+    table = _np.zeros((slices, 7))
+    dpp = losses = 0.0
+    for k in range(slices):
+        fe = material.scattering(
+            kinetic_energy=energies[k] * _ureg.MeV,
+            thickness=length * _ureg.m,
+            entrance_kinetic_energy=kinetic_energy * _ureg.MeV,
+        )
+        dpp_exit = material.energy_dispersion(energy=energies[k + 1] * _ureg.MeV)
+        losses_exit = material.losses(energy=energies[k + 1] * _ureg.MeV)
+        table[k, :5] = [length, energies[k], *fe["A"]]
+        table[k, 5] = _np.sqrt(max(dpp_exit**2 - dpp**2, 0.0))
+        table[k, 6] = min(losses_exit / losses, 1.0) if k > 0 and losses != 0 else losses_exit
+        dpp, losses = dpp_exit, losses_exit
+    table.flags.writeable = False
+    return table
+
+
 class MaterialElement(_ManzoniElement):
     INTEGRATOR = None
 
@@ -44,16 +86,92 @@ class MaterialElement(_ManzoniElement):
     def beta(self):
         return Kinematics(self.KINETIC_ENERGY, kinetic=True).beta
 
+    def random_key(self, global_parameters: list, stream: int = 0) -> _np.uint64:
+        """
+        The key of a stream of counter-based random numbers of the element (see `kernels.random_stream_key`). With a
+        seed (the second global parameter, see `Input.track`), the key only depends on the seed, on the turn (the third
+        global parameter) and on the name of the element, so that the tracking is reproducible; otherwise the seed is
+        drawn from the numpy random state. The elements sharing a name therefore draw the same samples.
+
+        Args:
+            global_parameters: the global parameters (relativistic beta and optionally the seed and the turn)
+            stream: the identifier of the stream, for the elements using several streams
+
+        Returns:
+            the key of the stream
+        """
+        if global_parameters is not None and len(global_parameters) > 1:
+            seed = int(global_parameters[1])
+            if len(global_parameters) > 2 and global_parameters[2] != 0:
+                seed = _np.uint64(random_stream_key(seed, int(global_parameters[2])))
+        else:
+            seed = int(nprandom.randint(0, 2**31 - 1))
+        return _np.uint64(random_stream_key(seed, (_zlib.crc32(self.NAME.encode()) << 8) + stream))
+
     @staticmethod
-    def pseudo_aperture_check(beam, beta):
+    def fermi_eyges_cholesky(a0: float, a1: float, a2: float) -> List[float]:
+        """
+        The Cholesky factor (L11, L21, L22) of the Fermi-Eyges covariance [[A2, A1], [A1, A0]] of a plane.
+
+        Args:
+            a0: the variance of the angle
+            a1: the covariance of the position and of the angle
+            a2: the variance of the position
+
+        Returns:
+            the entries of the lower triangular factor
+        """
+        l11 = _np.sqrt(a2) if a2 > 0 else 0.0
+        l21 = a1 / l11 if l11 > 0 else 0.0
+        return [l11, l21, _np.sqrt(max(a0 - l21**2, 0.0))]
+
+    @staticmethod
+    def pseudo_aperture_mask(beam, beta) -> _np.ndarray:
         px = beam[:, 1]
         py = beam[:, 3]
         pt = beam[:, 5]
-        condition = 1 + 2 * pt / beta + pt**2 - px**2 - py**2 >= 0
-        checked_beam = _np.compress(condition, beam, axis=0)
+        return 1 + 2 * pt / beta + pt**2 - px**2 - py**2 >= 0
+
+    @staticmethod
+    def pseudo_aperture_check(beam, beta):
+        checked_beam = _np.compress(MaterialElement.pseudo_aperture_mask(beam, beta), beam, axis=0)
 
         return checked_beam
 
+    def survival_mask(self, beam: _np.ndarray) -> Optional[_np.ndarray]:
+        """
+        Check which particles are not stopped by the element, in the way of `aperture_mask`.
+
+        Args:
+            beam: the beam at the entrance of the element
+
+        Returns:
+            a boolean array (True for the particles going through), or None if the element does not stop particles
+            according to their coordinates
+        """
+        return None
+
+    def propagate_indices(
+        self,
+        beam_in: _np.ndarray,
+        beam_out: _np.ndarray = None,
+        global_parameters: list = None,
+    ) -> Tuple[_np.ndarray, _np.ndarray, Optional[_np.ndarray]]:
+        """
+        Propagate the beam and give the rows of the input beam making up the output beam, so that the particles can
+        still be identified after an element which removes or resamples them (see `core.track_with_losses`).
+
+        Args:
+            beam_in: the beam at the entrance of the element
+            beam_out: the (preallocated) beam at the exit of the element
+            global_parameters: the global parameters (relativistic beta and optionally the seed and the turn)
+
+        Returns:
+            the input beam, the output beam and the row in the input beam of each output particle (None if unknown)
+        """
+        beam_in, beam_out = self.propagate(beam_in, beam_out, global_parameters)
+        return beam_in, beam_out, None
+
 
 class Scatterer(MaterialElement):
     """
@@ -98,27 +216,38 @@ class Scatterer(MaterialElement):
         beam_out: _np.ndarray = None,
         global_parameters: list = None,
     ) -> Tuple[_np.ndarray, _np.ndarray]:
+        return self.propagate_indices(beam_in, beam_out, global_parameters)[:2]
+
+    def propagate_indices(
+        self,
+        beam_in: _np.ndarray,
+        beam_out: _np.ndarray = None,
+        global_parameters: list = None,
+    ) -> Tuple[_np.ndarray, _np.ndarray, Optional[_np.ndarray]]:
         if self.material is materials.Vacuum:
             _np.copyto(dst=beam_out, src=beam_in, casting="no")
-            return beam_in, beam_out
+            return beam_in, beam_out, None
         a0 = self.cache[0]
 
-        beam_out[:, 0] = beam_in[:, 0]
-        beam_out[:, 2] = beam_in[:, 2]
-        beam_out[:, 4] = beam_in[:, 4]
-        beam_out[:, 5] = beam_in[:, 5]
+        _np.copyto(dst=beam_out, src=beam_in, casting="no")
+        scattering(beam_out, _np.array([0.0, 0.0, a0]), 0.0, 0, self.random_key(global_parameters))
 
-        beam_out[:, 1] = beam_in[:, 1] + nprandom.normal(0.0, a0, size=beam_in.shape[0])
-        beam_out[:, 3] = beam_in[:, 3] + nprandom.normal(0.0, a0, size=beam_in.shape[0])
+        mask = self.pseudo_aperture_mask(beam_out, self.beta)
+        indices = _np.flatnonzero(mask)
+        if indices.shape[0] == beam_out.shape[0]:
+            return beam_in, beam_out, None
 
-        beam_out = self.pseudo_aperture_check(beam_out, self.beta)
-
-        return beam_in, beam_out
+        return beam_in, _np.compress(mask, beam_out, axis=0), indices
 
 
 class Degrader(MaterialElement):
     """
-    Define a Degrader.
+    Define a Degrader. By default the scattering, the energy spread and the losses are computed in a single step at
+    the entrance energy; with `SLICES` > 1 the material is split in slices, each one with the parameters computed at
+    its own entrance energy (see `degrader_slices`). The slices are built so that their totals are the Fermi-Eyges
+    parameters, the energy spread and the transmission of the whole degrader, and the kicks are Gaussian in both
+    cases: the sliced model is statistically equivalent to the single step (same covariance at the exit) and only
+    draws `SLICES` times more random numbers.
 
     Attributes:
         PARAMETERS (dict): Dictionary containing the parameters of the Degrader with their default values.
@@ -134,7 +263,8 @@ class Degrader(MaterialElement):
                        'MATERIAL': <class 'georges.fermi.materials.Beryllium'>,
                        'KINETIC_ENERGY': <Quantity(230, 'megaelectronvolt')>,
                        'L': <Quantity(5, 'centimeter')>,
-                       'WITH_LOSSES': True}
+                       'WITH_LOSSES': True,
+                       'SLICES': 1}
     """
 
     PARAMETERS = {
@@ -142,19 +272,37 @@ class Degrader(MaterialElement):
         "KINETIC_ENERGY": (0.0 * _ureg.MeV, "Incoming beam energy"),
         "L": (0.0 * _ureg.m, "Degrader length"),
         "WITH_LOSSES": (False, "Boolean to compute losses and dpp"),
+        "SLICES": (1, "Number of slices of the degrader"),
     }
     """Parameters of the element, with their default value and their descriptions."""
 
     @property
     def parameters(self) -> List[float]:
-        fe = self.material.scattering(kinetic_energy=self.KINETIC_ENERGY, thickness=self.L)
+        if self.SLICES <= 1:
+            fe = self.material.scattering(kinetic_energy=self.KINETIC_ENERGY, thickness=self.L)
+            a0, a1, a2 = fe["A"]
+            dpp = self.material.energy_dispersion(energy=self.degraded_energy)
+            losses = self.material.losses(energy=self.degraded_energy)
+            slices = _np.array([[self.L.m_as("m"), *self.fermi_eyges_cholesky(a0, a1, a2), dpp]])
+        else:
+            table = degrader_slices(self.material, self.KINETIC_ENERGY.m_as("MeV"), self.L.m_as("m"), int(self.SLICES))
+            # Fermi-Eyges parameters of the whole degrader, each slice being followed by a drift to the exit
+            a0, a1, a2 = 0.0, 0.0, 0.0
+            for k, (length, _, s0, s1, s2, *_) in enumerate(table):
+                r = length * (table.shape[0] - 1 - k)
+                a0, a1, a2 = a0 + s0, a1 + s1 + r * s0, a2 + s2 + 2 * r * s1 + r**2 * s0
+            dpp = _np.sqrt(_np.sum(table[:, 5] ** 2))
+            losses = _np.prod(table[:, 6])
+            slices = _np.array([[row[0], *self.fermi_eyges_cholesky(*row[2:5]), row[5]] for row in table])
         return [
             self.L.m_as("m"),
-            fe["A"][0],
-            fe["A"][1],
-            fe["A"][2],
-            self.material.energy_dispersion(energy=self.degraded_energy),
-            self.material.losses(energy=self.degraded_energy),
+            a0,
+            a1,
+            a2,
+            dpp,
+            losses,
+            *self.fermi_eyges_cholesky(a0, a1, a2),
+            slices,
         ]
 
     def propagate(
@@ -163,61 +311,49 @@ class Degrader(MaterialElement):
         beam_out: _np.ndarray = None,
         global_parameters: list = None,
     ) -> Tuple[_np.ndarray, _np.ndarray]:
-        length, a0, a1, a2, dpp, losses = self.cache
+        return self.propagate_indices(beam_in, beam_out, global_parameters)[:2]
+
+    def propagate_indices(
+        self,
+        beam_in: _np.ndarray,
+        beam_out: _np.ndarray = None,
+        global_parameters: list = None,
+    ) -> Tuple[_np.ndarray, _np.ndarray, Optional[_np.ndarray]]:
+        length, a0, a1, a2, dpp, losses, l11, l21, l22, slices = self.cache
 
         if length == 0:
             _np.copyto(dst=beam_out, src=beam_in, casting="no")
-            return beam_in, beam_out
+            return beam_in, beam_out, None
 
         # Monte-Carlo method
         # Remove particles
         if self.WITH_LOSSES is True and losses != 1:
-            idx = _np.random.randint(beam_in.shape[0], size=int(losses * beam_in.shape[0]))
-            beam_out = beam_in[idx, :]
-        else:
-            beam_out = beam_in
-
-        # Transport matrix
-        matrix = _np.array(
-            [
-                [1, length, 0, 0, 0, 0],
-                [0, 1, 0, 0, 0, 0],
-                [0, 0, 1, length, 0, 0],
-                [0, 0, 0, 1, 0, 0],
-                [0, 0, 0, 0, 1, 0],
-                [0, 0, 0, 0, 0, 1],
-            ],
-        )
-        beam_out = beam_out.dot(matrix.T)
-
-        # If the integrator is not MAD-X based, swap the last 2 columns
-        if self.integrator not in [MadXIntegrator, MadXParaxialDriftIntegrator]:
-            beam_out[:, [-2, -1]] = beam_out[:, [-1, -2]]
-
-        # Interactions
-        if self.material is not materials.Vacuum:
-            beam_out += nprandom.multivariate_normal(
-                [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
-                _np.array(
-                    [
-                        [a2, a1, 0.0, 0.0, 0.0, 0.0],
-                        [a1, a0, 0.0, 0.0, 0.0, 0.0],
-                        [0.0, 0.0, a2, a1, 0.0, 0.0],
-                        [0.0, 0.0, a1, a0, 0.0, 0.0],
-                        [0.0, 0.0, 0.0, 0.0, dpp**2, 0.0],
-                        [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
-                    ],
-                ),
-                int(beam_out.shape[0]),
+            idx = random_indices(
+                int(losses * beam_in.shape[0]),
+                beam_in.shape[0],
+                self.random_key(global_parameters, stream=1),
             )
-
-        if self.integrator not in [MadXIntegrator, MadXParaxialDriftIntegrator]:
-            beam_out[:, [-1, -2]] = beam_out[:, [-2, -1]]
         else:
-            beam_out[:, -1] = _Beam.compute_pt(beam_out[:, -2], self.beta, first_order=False)
-            beam_out = self.pseudo_aperture_check(beam_out, self.beta)
+            idx = _np.arange(beam_in.shape[0])
+        if beam_out is None or beam_out.shape[1] != beam_in.shape[1] or beam_out.shape[0] < idx.shape[0]:
+            beam_out = _np.empty((idx.shape[0], beam_in.shape[1]))
+
+        # Transport, interactions and pseudo-aperture in a single pass (over all the slices), in the preallocated beam
+        # (the momentum offset is the last column if the integrator is not MAD-X based)
+        madx = self.integrator in [MadXIntegrator, MadXParaxialDriftIntegrator]
+        n = degrader(
+            beam_in,
+            beam_out,
+            idx,
+            slices,
+            self.material is not materials.Vacuum,
+            4 if madx else 5,
+            self.beta if madx else 1.0,
+            madx,
+            self.random_key(global_parameters),
+        )
 
-        return beam_in, beam_out
+        return beam_in, beam_out[:n], idx[:n]
 
 
 class BeamStop(MaterialElement):
@@ -255,25 +391,34 @@ class BeamStop(MaterialElement):
             self.RADIUS.m_as("m"),
         ]
 
+    def survival_mask(self, beam: _np.ndarray) -> Optional[_np.ndarray]:
+        length, radius = self.parameters
+        if length == 0 or radius == 0:
+            return None
+        return (beam[:, 0] ** 2 + beam[:, 2] ** 2) > radius**2
+
     def propagate(
         self,
         beam_in: _np.ndarray,
         beam_out: _np.ndarray = None,
         global_parameters: list = None,
     ) -> Tuple[_np.ndarray, _np.ndarray]:
-        length, radius = self.parameters
+        return self.propagate_indices(beam_in, beam_out, global_parameters)[:2]
 
-        if length == 0 or radius == 0:
+    def propagate_indices(
+        self,
+        beam_in: _np.ndarray,
+        beam_out: _np.ndarray = None,
+        global_parameters: list = None,
+    ) -> Tuple[_np.ndarray, _np.ndarray, Optional[_np.ndarray]]:
+        mask = self.survival_mask(beam_in)
+
+        if mask is None:
             _np.copyto(dst=beam_out, src=beam_in, casting="no")
-            return beam_in, beam_out
+            return beam_in, beam_out, None
 
         else:
-            beam_out = _np.compress(
-                (beam_in[:, 0] ** 2 + beam_in[:, 2] ** 2) > radius**2,
-                beam_in,
-                axis=0,
-            )
-            return beam_in, beam_out
+            return beam_in, _np.compress(mask, beam_in, axis=0), _np.flatnonzero(mask)
 
 
 class Gap(Degrader):
@@ -10,7 +10,7 @@ It is necessary to correct the particles' propagation through these elements dur
 """
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as _np
 import pandas as _pd
@@ -18,15 +18,31 @@ from georges_core import Kinematics as _Kinematics
 from georges_core import ureg as _ureg
 from georges_core.sequences import BetaBlock as _BetaBlock
 from georges_core.sequences import Sequence as _Sequence
+from numba.typed import List as nList
+from pint import DimensionalityError as _DimensionalityError
 
 from ..fermi import materials
 from . import elements
 from .beam import Beam as _Beam
-from .core import track, twiss
+from .compiled import CompiledBeamline
+from .core import (
+    MatchResult,
+    compose,
+    jacobian,
+    match,
+    track,
+    track_composed,
+    twiss,
+    twiss_configurations,
+    twiss_from_maps,
+)
 from .elements import ManzoniElement
+from .elements.elements import ManzoniAttributeException, ManzoniException
 from .elements.scatterers import MaterialElement
 from .integrators import Integrator, MadXIntegrator
+from .losses import LossRecord
 from .observers import Observer as _Observer
+from .table import SequenceTable
 
 MANZONI_FLAVOR = {"Sbend": "SBend", "Rbend": "RBend"}
 
@@ -37,10 +53,13 @@ class Input:
         sequence: Optional[List[elements.ManzoniElement]] = None,
         beam: Optional[_Beam] = None,
         mapper: Dict[str, int] = None,
+        merged: Optional[Dict[str, List[str]]] = None,
     ):
         self._sequence = sequence
         self._beam = beam
         self.mapper = mapper
+        self.merged = merged or {}
+        self._table: Optional[SequenceTable] = None
 
     @property
     def sequence(self):  # pragma: no cover
@@ -50,12 +69,33 @@ class Input:
     def beam(self):  # pragma: no cover
         return self._beam
 
-    def to_df(self):
+    @property
+    def table(self) -> SequenceTable:
+        """
+        The numerical parameters of the elements, stored class by class in structured arrays (see `SequenceTable`).
+        The rows of the elements whose parameters were set since they were read, by any means, are read again when
+        they are accessed (see `SequenceTable.sync`).
         """
+        if self._table is None:
+            self._table = SequenceTable(self.sequence)
+        return self._table
+
+    def refresh_table(self):
+        """Rebuild the table of the parameters of the elements (see `table`) at its next use."""
+        self._table = None
+
+    def to_df(self, strip_units: bool = False):
+        """
+
+        Args:
+            strip_units: only the numerical parameters, without units, read from the table of the parameters (see
+                         `table`)
 
         Returns: A pandas.DataFrame of the sequence
 
         """
+        if strip_units:
+            return self.table.to_df()
 
         _ = list(map(lambda e: _pd.Series(e.attributes), self.sequence))
         df = _pd.concat(_, axis=1).T
@@ -66,15 +106,24 @@ class Input:
     def df(self):  # pragma: no cover
         return self.to_df()
 
-    def freeze(self):
+    def freeze(self, kinematics: Optional[_Kinematics] = None):
         """
-        Freezes all elements in the input sequence.
+        Freezes all elements in the input sequence and pre-populates the map cache of their integrators.
+
+        Args:
+            kinematics: the kinematics of the reference particle, needed to pre-compute the maps that depend on
+                        the reference energy (MAD8 integrators); these maps are otherwise computed at the first tracking
 
         Returns:
             `self` to allow method chaining
         """
+        global_parameters = nList([kinematics.beta if kinematics is not None else 1.0])
         for e in self._sequence:
             e.freeze()
+            integrator = e.integrator
+            if integrator.MAP_CACHE is not None and integrator.uses_maps(e):
+                if kinematics is not None or not integrator.MAPS_DEPEND_ON_BETA:
+                    integrator.maps(e, global_parameters)
         return self
 
     def unfreeze(self):
@@ -93,6 +142,10 @@ class Input:
         beam: _Beam,
         observers: Union[List[_Observer], _Observer] = None,
         check_apertures: bool = True,
+        losses: Optional[LossRecord] = None,
+        composed: bool = False,
+        seed: Optional[int] = None,
+        turn: int = 0,
     ) -> Union[List[_Observer], _Observer]:
         """
 
@@ -100,19 +153,78 @@ class Input:
             beam:
             observers:
             check_apertures:
+            losses: a `LossRecord` to record where the particles are lost (the beam is then tracked with
+                    a fixed-size buffer, see `core.track_with_losses`)
+            composed: replace the runs of elements that are neither observed nor checked for apertures by their
+                      composed (second-order) map, see `core.track_composed`
+            seed: the seed of the random numbers of the material elements (scattering, energy straggling and
+                  losses); the tracking is reproducible for a given seed, whatever the number of threads. The random
+                  numbers of an element only depend on the seed, the turn and the name of the element: repeated
+                  calls with the same seed and turn draw the same samples, as do the elements sharing a name
+            turn: the turn (or any call counter) mixed with the seed, so that successive calls with the same seed
+                  (e.g. turn-by-turn tracking) draw independent samples
 
         Returns:
             the `Observer` object containing the tracking results.
         """
         if not isinstance(observers, list):
             observers = [observers]
-        track(self, beam, observers, check_apertures_exit=check_apertures)
+        if composed:
+            if losses is not None:
+                raise ManzoniException("The losses cannot be recorded with the composed maps.")
+            track_composed(self, beam, observers, check_apertures_exit=check_apertures, seed=seed, turn=turn)
+        else:
+            track(
+                self,
+                beam,
+                observers,
+                check_apertures_exit=check_apertures,
+                losses=losses,
+                seed=seed,
+                turn=turn,
+            )
         if observers is not None:
             if len(observers) == 1:
                 return observers[0]
             else:
                 return observers
 
+    def compose(
+        self,
+        kinematics: _Kinematics,
+        from_element: Optional[str] = None,
+        to_element: Optional[str] = None,
+        second_order: bool = True,
+    ) -> Tuple[_np.ndarray, _np.ndarray, _np.ndarray]:
+        """
+        Compose the maps of the elements between two elements (both included) into a single map
+        x -> K + R x + T x x, truncated at the second order (T is upper triangular, Tijk with j <= k).
+
+        Args:
+            kinematics: the kinematics of the reference particle
+            from_element: the name of the first element (the beginning of the line by default)
+            to_element: the name of the last element (the end of the line by default)
+            second_order: compose the second-order tensors (otherwise only the transfer matrices)
+
+        Returns:
+            the offset K (non-zero with kickers), the transfer matrix R and the tensor T of the composed map
+        """
+        start = 0 if from_element is None else self.mapper[from_element]
+        stop = len(self.sequence) - 1 if to_element is None else self.mapper[to_element]
+        global_parameters = nList([kinematics.beta])
+        return compose(self.sequence[start : stop + 1], global_parameters, second_order)
+
+    def compile(self) -> CompiledBeamline:
+        """
+        Lowers the sequence into a `CompiledBeamline` that tracks the whole line in a single jitted call.
+
+        The compiled beamline is a snapshot of the current parameters of the elements.
+
+        Returns:
+            the compiled beamline.
+        """
+        return CompiledBeamline(self)
+
     def twiss(
         self,
         kinematics: _Kinematics,
@@ -136,12 +248,129 @@ class Input:
         """
         return twiss(self, kinematics, reference_particle, offsets, twiss_parametrization, twiss_init)
 
+    def twiss_from_maps(
+        self,
+        kinematics: _Kinematics,
+        twiss_init: _BetaBlock = None,
+        elements: Optional[List[str]] = None,
+        twiss_parametrization: bool = True,
+    ) -> _pd.DataFrame:
+        """
+        Linear optics from the products of the transfer matrices of the elements, without tracking (see
+        `core.twiss_from_maps`).
+
+        Args:
+            kinematics: the kinematics of the reference particle
+            twiss_init: the initial Twiss parameters (if None, the periodic Twiss parameters of the beamline)
+            elements: compute the optics only at the exit of these elements (all the elements if None)
+            twiss_parametrization: compute the Twiss functions (otherwise only the transfer matrices)
+
+        Returns:
+            The dataframe with the Twiss functions at each (selected) element.
+        """
+        return twiss_from_maps(self, kinematics, twiss_init, elements, twiss_parametrization)
+
+    def jacobian(
+        self,
+        kinematics: _Kinematics,
+        targets: List[str],
+        variables: List[Tuple[str, str]],
+        step: float = 1e-6,
+    ) -> _pd.DataFrame:
+        """
+        Derivatives of the transfer matrices at the exit of the targets with respect to parameters of the elements
+        (see `core.jacobian`).
+
+        Args:
+            kinematics: the kinematics of the reference particle
+            targets: the elements at the exit of which the derivatives are computed
+            variables: the (element, parameter) pairs, e.g. `[("Q1", "K1"), ("B1", "ANGLE")]`
+            step: the relative step of the finite differences (for the elements without analytic derivatives)
+
+        Returns:
+            the dataframe of the derivatives, indexed by the target and the matrix element, one column per variable
+        """
+        return jacobian(self, kinematics, targets, variables, step)
+
+    def twiss_configurations(
+        self,
+        kinematics: _Kinematics,
+        configurations: _pd.DataFrame,
+        twiss_init: _BetaBlock = None,
+        elements: Optional[List[str]] = None,
+        twiss_parametrization: bool = True,
+    ) -> _pd.DataFrame:
+        """
+        Linear optics of several configurations of the beamline in a single jitted call (see
+        `core.twiss_configurations`). The elements are left unchanged.
+
+        Args:
+            kinematics: the kinematics of the reference particle
+            configurations: one row per configuration and one column per (element, parameter) pair, e.g.
+                            `pd.DataFrame({("Q1", "K1"): [1.0, 2.0], ("Q2", "K1"): [-1.0, -2.0]})`
+            twiss_init: the initial Twiss parameters (if None, the periodic Twiss parameters of each configuration)
+            elements: compute the optics only at the exit of these elements (all the elements if None)
+            twiss_parametrization: compute the Twiss functions (otherwise only the transfer matrices)
+
+        Returns:
+            The dataframe with the Twiss functions, indexed by configuration and element.
+        """
+        return twiss_configurations(self, kinematics, configurations, twiss_init, elements, twiss_parametrization)
+
+    def track_configurations(
+        self,
+        beam: _Beam,
+        configurations: _pd.DataFrame,
+        check_apertures: bool = True,
+        chunk_size: int = 1024,
+    ) -> Dict:
+        """
+        Track a beam through several configurations of the beamline in a single jitted call, in parallel over the
+        configurations (see `CompiledBeamline.track_configurations`). The elements are left unchanged.
+
+        Args:
+            beam: the beam to track (the same for all the configurations)
+            configurations: one row per configuration and one column per (element, parameter) pair
+            check_apertures: check the apertures at the exit of each element
+            chunk_size: the number of particles tracked together by a thread
+
+        Returns:
+            the distribution of the surviving particles at the end of the beamline for each configuration
+        """
+        return self.compile().track_configurations(beam, configurations, check_apertures, chunk_size)
+
+    def match(
+        self,
+        kinematics: _Kinematics,
+        variables: List[Tuple],
+        constraints: List[Tuple],
+        beam: Optional[_Beam] = None,
+        twiss_init: _BetaBlock = None,
+        **kwargs,
+    ) -> MatchResult:
+        """
+        Match the linear optics of the beamline (see `core.match`).
+
+        Args:
+            kinematics: the kinematics of the reference particle
+            variables: the (element, parameter) pairs to vary, optionally with their bounds
+            constraints: the (element, quantity, target) or (element, quantity, target, weight) constraints
+            beam: the beam whose covariance matrix is propagated for the beam size constraints
+            twiss_init: the initial Twiss parameters (if None, the periodic Twiss parameters of the beamline)
+            **kwargs: the options of the solver (`method`, `step`, `max_iterations`, `tolerance`, `apply`)
+
+        Returns:
+            the result of the matching
+        """
+        return match(self, kinematics, variables, constraints, beam, twiss_init, **kwargs)
+
     def adjust_energy(self, input_energy: _ureg.Quantity):
         current_energy = input_energy
         for e in self.sequence:
             if isinstance(e, MaterialElement):
                 e.KINETIC_ENERGY = current_energy
                 current_energy = e.degraded_energy
+        self.refresh_table()
 
     def compute_efficiency(self, input_energy: _ureg.Quantity) -> float:
         self.adjust_energy(input_energy)
@@ -152,8 +381,8 @@ class Input:
         return efficiency
 
     def set_integrator(self, integrator: Integrator = MadXIntegrator):
-        for i in range(len(self.mapper)):
-            self.sequence[i].integrator = integrator
+        for e in self.sequence:
+            e.integrator = integrator
 
     # TODO: use method __setitem__ instead ?
     def set_parameters(self, element: str, parameters: Dict):
@@ -163,7 +392,83 @@ class Input:
             self.sequence[self.mapper[element]].__setattr__(param, parameters[param])
         self.sequence[self.mapper[element]].freeze()
 
-    def get_parameters(self, element: str, parameters: Optional[Union[List, str]] = None):
+    def set_parameters_batch(self, updates: Union[_pd.DataFrame, _np.ndarray, List[Tuple[str, str, object]]]):
+        """
+        Set parameters of several elements in one pass. The dimension of the values is checked once for each
+        parameter (and type of element), and only the caches of the updated elements are recomputed.
+
+        Values given without units are expressed in the units of the default value of the parameter (as with the
+        '_' suffix of the element attributes, e.g. 'K1_'). Quantities are converted to these units.
+
+        Args:
+            updates: a dataframe with the columns ELEMENT, PARAMETER and VALUE, or an array (or a list)
+                     of (element, parameter, value) rows
+
+        Examples:
+            >>> mi.set_parameters_batch([("Q1", "K1", 2.0), ("Q2", "K1", -2.0)])  # doctest: +SKIP
+        """
+        if not isinstance(updates, _pd.DataFrame):
+            updates = _pd.DataFrame(list(updates), columns=["ELEMENT", "PARAMETER", "VALUE"])
+        unknown = set(updates["ELEMENT"]) - set(self.mapper)
+        if len(unknown) > 0:
+            raise ManzoniException(f"Unknown elements: {sorted(unknown)}.")
+        updates = updates.assign(INDEX=updates["ELEMENT"].map(self.mapper).astype(int))
+        updates = updates.assign(CLASS=[self.sequence[i].__class__.__name__ for i in updates["INDEX"]])
+
+        updated: Dict[int, Dict] = {}
+        for (parameter, _), group in updates.groupby(["PARAMETER", "CLASS"], sort=False):
+            units, values = self._parameter_magnitudes(group["INDEX"].iat[0], parameter, group["VALUE"])
+            for i, v in zip(group["INDEX"], values):
+                updated.setdefault(i, {})[parameter] = v if units is None else _ureg.Quantity(v, units)
+
+        for i, parameters in updated.items():
+            self.sequence[i].set_parameters(parameters)
+
+    def _parameter_magnitudes(self, index: int, parameter: str, values) -> Tuple[Optional[_ureg.Unit], List[float]]:
+        """
+        Check the dimension of the values of a parameter (once for all the values) and convert them to the units of
+        the default value of the parameter.
+
+        Args:
+            index: the index of an element holding the parameter
+            parameter: the parameter
+            values: the values (quantities, or magnitudes in the units of the default value)
+
+        Returns:
+            the units of the parameter (None if the parameter is not a quantity) and the magnitudes
+        """
+        element = self.sequence[index]
+        class_name = element.__class__.__name__
+        if parameter not in element.attributes:
+            raise ManzoniAttributeException(f"The parameter {parameter} is not part of the {class_name}")
+        default = element._retrieve_default_parameter_value(parameter)
+        if isinstance(default, _ureg.Quantity):
+            units = default.units
+        elif isinstance(default, (int, float)) and not isinstance(default, bool):
+            units = _ureg.dimensionless
+        else:
+            raise ManzoniAttributeException(f"The parameter {parameter} of {class_name} is not numerical.")
+        try:
+            magnitudes = [v.m_as(units) if isinstance(v, _ureg.Quantity) else float(v) for v in values]
+        except _DimensionalityError as e:
+            raise ManzoniAttributeException(
+                f"Invalid dimension for parameter {parameter} of {class_name} ({units} expected).",
+            ) from e
+        return (units if isinstance(default, _ureg.Quantity) else None), magnitudes
+
+    def get_parameters(
+        self,
+        element: str,
+        parameters: Optional[Union[List, str]] = None,
+        strip_units: bool = False,
+    ):
+        if strip_units:  # Numerical parameters only, read from the table
+            if isinstance(parameters, str):
+                return self.table.get(self.mapper[element], parameters)
+            view = self.table.view(self.mapper[element])
+            if parameters is None:
+                return view.to_dict()
+            return {p: view[p] for p in parameters}
         if parameters is None:
             parameters = self.sequence[self.mapper[element]].attributes
             return dict(zip(parameters, list(map(self.sequence[self.mapper[element]].__getattr__, parameters))))
@@ -196,6 +501,78 @@ class Input:
         element_mapper = {k.NAME: v for v, k in enumerate(new_sequence)}
         return cls(sequence=new_sequence, mapper=element_mapper)
 
+    def merge_drifts(self, keep: Optional[List[str]] = None) -> Input:
+        """
+        Merge the runs of consecutive drifts, gaps and markers without aperture into single drifts. Only the elements
+        tracked with the same kernel as the merged drift are merged, so that the merge does not change the tracking.
+
+        The merged drift takes the name of the last element of the run, so that an observer of that element
+        still sees the same beam. The `mapper` of the new input maps all the original names to the index of the
+        element that replaces them, and `merged` gives the original names of each merged element.
+        The elements that must be observed individually are given in `keep`.
+
+        Args:
+            keep: the names of the elements that must not be merged (e.g. the elements seen by the observers)
+
+        Returns:
+            A new instance of manzoni.Input
+        """
+        keep = set(keep or [])
+        drift_kernels = {}
+
+        def drift_kernel(integrator: Integrator):
+            if integrator not in drift_kernels:
+                drift_kernels[integrator] = integrator.bind(elements.Drift("DRIFT")).kernel
+            return drift_kernels[integrator]
+
+        def mergeable(e: ManzoniElement) -> bool:
+            if not isinstance(e, (elements.Gap, elements.Marker)) or e.APERTYPE is not None or e.NAME in keep:
+                return False
+            # A gap is not tracked as a drift by all the integrators (e.g. `MadXParaxialDriftIntegrator`)
+            return isinstance(e, elements.Marker) or (
+                e.integrator is not None and e.binding.kernel is drift_kernel(e.integrator)
+            )
+
+        new_sequence = []
+        element_mapper = {}
+        merged = dict(self.merged)
+        run: List[ManzoniElement] = []
+
+        def flush():
+            if len(run) == 1:
+                new_sequence.append(run[0])
+            elif len(run) > 1:
+                integrators = {e.integrator for e in run if not isinstance(e, elements.Marker)}
+                length = sum((e.L for e in run if isinstance(e, elements.Gap)), 0 * _ureg.m)
+                if len(integrators) > 1:  # Do not merge across different integrators
+                    new_sequence.extend(run)
+                else:
+                    positions = {
+                        "AT_ENTRY": run[0].AT_ENTRY,
+                        "AT_CENTER": 0.5 * (run[0].AT_ENTRY + run[-1].AT_EXIT),
+                        "AT_EXIT": run[-1].AT_EXIT,
+                    }
+                    if len(integrators) == 0:
+                        e = elements.Marker(run[-1].NAME, **positions)
+                    else:
+                        e = elements.Drift(run[-1].NAME, integrator=integrators.pop(), L=length, **positions)
+                    new_sequence.append(e)
+                    merged[e.NAME] = [name for r in run for name in merged.get(r.NAME, [r.NAME])]
+            run.clear()
+
+        for e in self.sequence:
+            if mergeable(e):
+                run.append(e)
+                continue
+            flush()
+            new_sequence.append(e)
+        flush()
+
+        for i, e in enumerate(new_sequence):
+            for name in merged.get(e.NAME, [e.NAME]):
+                element_mapper[name] = i
+        return self.__class__(sequence=new_sequence, beam=self._beam, mapper=element_mapper, merged=merged)
+
     @classmethod
     def from_sequence(
         cls,
@@ -214,7 +591,6 @@ class Input:
 
         """
 
-        input_sequence = list()
         df_sequence = sequence.df.loc[from_element:to_element]
         if "MATERIAL" in df_sequence.columns:
             idx = df_sequence[sequence.df["MATERIAL"].notnull()].index
@@ -222,13 +598,27 @@ class Input:
                 if not isinstance(df_sequence.loc[ele, "MATERIAL"], materials.CompoundType):
                     df_sequence.loc[ele, "MATERIAL"] = getattr(materials, df_sequence.loc[ele, "MATERIAL"])
 
-        for name, element in df_sequence.iterrows():
-            element = element.replace({_np.nan: None})
-            element_class = getattr(elements, MANZONI_FLAVOR.get(element["CLASS"], element["CLASS"]))
-            parameters = list(set(list(element.index.values)).intersection(element_class.PARAMETERS.keys()))
-            params = element[parameters].dropna()  # Remove the None from the parameters.
-            input_sequence.append(
-                element_class(name, **params),
-            )
+        input_sequence = _elements_from_df(df_sequence)
         element_mapper = {k: v for v, k in enumerate(list(df_sequence.index.values))}
         return cls(sequence=input_sequence, mapper=element_mapper)
+
+
+def _elements_from_df(df: _pd.DataFrame) -> List[ManzoniElement]:
+    """
+    Create the Manzoni elements of a sequence dataframe. The rows are grouped by element class so that the parameter
+    columns (and the missing values) are resolved once per class instead of once per row.
+
+    Args:
+        df: the dataframe of the sequence (one row per element, with a CLASS column)
+
+    Returns:
+        the elements, in the order of the dataframe
+    """
+    input_sequence: List[Optional[ManzoniElement]] = [None] * len(df)
+    for class_name, group in df.groupby("CLASS", sort=False).indices.items():
+        element_class = getattr(elements, MANZONI_FLAVOR.get(class_name, class_name))
+        parameters = [c for c in df.columns if c in element_class.PARAMETERS]
+        rows = df.iloc[group][parameters]
+        for i, name, values, defined in zip(group, rows.index.values, rows.values, rows.notna().values):
+            input_sequence[i] = element_class(name, **{k: v for k, v, d in zip(parameters, values, defined) if d})
+    return input_sequence
@@ -6,22 +6,35 @@ it can be used with, so that if this integrator is selected, the propagate funct
 will be called via the propagate function of the integrator to allow the tracking.
 
 """
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
 
 import numpy as _np
+import pandas as _pd
 from numba.typed import List as nList
 
-from .kernels import batched_vector_matrix, batched_vector_matrix_tensor
+from .kernels import (
+    batched_vector_chromatic_matrix,
+    batched_vector_chromatic_matrix_tensor,
+    batched_vector_interpolated_matrix,
+    batched_vector_interpolated_matrix_tensor,
+    batched_vector_matrix,
+    batched_vector_matrix_tensor,
+)
 from .maps import (
     compute_mad_combined_dipole_matrix,
+    compute_mad_combined_dipole_matrix_derivatives,
     compute_mad_combined_dipole_tensor,
     compute_mad_drift_matrix,
+    compute_mad_drift_matrix_derivatives,
     compute_mad_drift_tensor,
     compute_mad_quadrupole_matrix,
+    compute_mad_quadrupole_matrix_derivatives,
     compute_mad_quadrupole_tensor,
     compute_transport_combined_dipole_ex_matrix,
     compute_transport_combined_dipole_ex_tensor,
     compute_transport_combined_dipole_matrix,
+    compute_transport_combined_dipole_matrix_derivatives,
     compute_transport_combined_dipole_tensor,
     compute_transport_fringe_in_ex_matrix,
     compute_transport_fringe_in_ex_tensor,
@@ -38,6 +51,7 @@ from .maps import (
     compute_transport_quadrupole_ex_matrix,
     compute_transport_quadrupole_ex_tensor,
     compute_transport_quadrupole_matrix,
+    compute_transport_quadrupole_matrix_derivatives,
     compute_transport_quadrupole_tensor,
     compute_transport_sextupole_ex_matrix,
     compute_transport_sextupole_ex_tensor,
@@ -53,6 +67,8 @@ from .maps import (
 )
 
 __all__ = [
+    "Binding",
+    "MapCache",
     "IntegratorType",
     "Integrator",
     "MadXIntegrator",
@@ -65,15 +81,119 @@ __all__ = [
     "TransportFirstOrderTaylorIntegratorExact",
     "TransportSecondOrderTaylorIntegrator",
     "TransportSecondOrderTaylorIntegratorExact",
+    "TransportFirstOrderTaylorIntegratorInterpolated",
+    "TransportSecondOrderTaylorIntegratorInterpolated",
     "PTCIntegrator",
 ]
 
 
+MAD8_DRIFT_LIKE = ["GAP", "RECTANGULARCOLLIMATOR", "ELLIPTICALCOLLIMATOR", "CIRCULARCOLLIMATOR", "DUMP"]
+TRANSPORT_DRIFT_LIKE = ["DRIFT"] + MAD8_DRIFT_LIKE
+
+
+class Binding(NamedTuple):
+    """
+    The kernel resolved by an integrator for a type of element (see `Integrator.bind`).
+
+    Attributes:
+        kernel: the tracking kernel used for the element (None if the integrator does not track it)
+        propagate: a function `propagate(element, beam_in, beam_out, global_parameters)` calling the kernel
+                   with the parameters (cache or transfer maps) of the element
+    """
+
+    kernel: Optional[Callable]
+    propagate: Callable
+
+
+def _bind_cache_kernel(kernel: Callable) -> Binding:
+    """Binding of a kernel taking the parameters of the element (MAD-X tracking routines)."""
+
+    def propagate(element, beam_in, beam_out, global_parameters):
+        return kernel(beam_in, beam_out, element.parameter_vector, global_parameters)
+
+    return Binding(kernel, propagate)
+
+
+def _identity(element, beam_in, beam_out, global_parameters):
+    return beam_in, beam_out
+
+
+class MapCache:
+    """
+    Least-recently-used cache of the transfer maps (matrix and tensor) of the elements.
+
+    The maps are keyed by the integrator, the element class, the parameters of the element (its cache) and,
+    for the integrators whose maps depend on the reference energy, the relativistic beta. Repeated trackings
+    (scans, optimisations) reuse the maps as long as the parameters of the elements do not change.
+
+    Examples:
+        >>> cache = MapCache(maxsize=2)
+        >>> cache.get("a", lambda: (1, None))
+        (1, None)
+        >>> cache.get("a", lambda: (2, None))
+        (1, None)
+        >>> cache.hits, cache.misses
+        (1, 1)
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        """
+
+        Args:
+            maxsize: the maximum number of maps kept in the cache
+        """
+        self.maxsize = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._maps: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._maps)
+
+    def __contains__(self, key) -> bool:
+        return key in self._maps
+
+    def get(self, key: Hashable, compute: Callable[[], Tuple]) -> Tuple:
+        """
+        Get the maps for a key, computing (and caching) them if needed.
+
+        Args:
+            key: the key of the maps
+            compute: computes the maps if they are not cached
+
+        Returns:
+            the cached maps
+        """
+        try:
+            maps = self._maps[key]
+            self._maps.move_to_end(key)
+            self.hits += 1
+            return maps
+        except KeyError:
+            pass
+        self.misses += 1
+        maps = compute()
+        self._maps[key] = maps
+        if len(self._maps) > self.maxsize:
+            self._maps.popitem(last=False)
+        return maps
+
+    def clear(self):
+        """Remove all the maps from the cache and reset the statistics."""
+        self._maps.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 class IntegratorType(type):
     pass
 
 
 class Integrator(metaclass=IntegratorType):
+    MAP_CACHE: Optional[MapCache] = MapCache()
+    MAPS_DEPEND_ON_BETA: bool = False
+    BINDINGS: Dict[Tuple[IntegratorType, str], Binding] = {}
+
     @classmethod
     def propagate(
         cls,
@@ -82,7 +202,103 @@ class Integrator(metaclass=IntegratorType):
         beam_out: _np.ndarray,
         global_parameters: nList,
     ) -> Tuple[_np.ndarray, _np.ndarray]:
-        return beam_in, beam_out
+        return cls.bind(element).propagate(element, beam_in, beam_out, global_parameters)
+
+    @classmethod
+    def resolve(cls, name: str) -> Binding:
+        """
+        Resolve the kernel used by the integrator for a type of element.
+
+        Args:
+            name: the name of the element class (in upper case)
+
+        Returns:
+            the binding of the kernel
+        """
+        return Binding(None, _identity)
+
+    @classmethod
+    def bind(cls, element) -> Binding:
+        """
+        The kernel used by the integrator for an element. The kernels are resolved once per integrator and element
+        class and kept in `BINDINGS`, the elements keep their binding so that tracking does not go through the
+        dispatch at each call.
+
+        Args:
+            element: the element
+
+        Returns:
+            the binding of the kernel
+        """
+        key = (cls, element.__class__.__name__.upper())
+        binding = Integrator.BINDINGS.get(key)
+        if binding is None:
+            binding = Integrator.BINDINGS[key] = cls.resolve(key[1])
+        return binding
+
+    @classmethod
+    def compute_maps(cls, element, global_parameters: nList) -> Tuple[Optional[_np.ndarray], Optional[_np.ndarray]]:
+        """
+        Compute the transfer matrix and the second-order tensor of an element.
+
+        Args:
+            element: the element
+            global_parameters: the global parameters (relativistic beta)
+
+        Returns:
+            the transfer matrix and the tensor (None if the integrator does not use them)
+        """
+        return None, None
+
+    @classmethod
+    def uses_maps(cls, element) -> bool:
+        """
+        Whether the element is tracked with its transfer maps (see `compute_maps`).
+
+        Args:
+            element: the element
+
+        Returns:
+            True if the integrator tracks the element with its transfer matrix (and tensor)
+        """
+        return False
+
+    @classmethod
+    def matrix_derivatives(cls, element, global_parameters: nList) -> Optional[_np.ndarray]:
+        """
+        The derivatives of the transfer matrix of an element with respect to each of its parameters (the entries of
+        its `parameter_vector`), when they are known analytically.
+
+        Args:
+            element: the element
+            global_parameters: the global parameters (relativistic beta)
+
+        Returns:
+            an array with one derivative of the transfer matrix per parameter (None if not available)
+        """
+        return None
+
+    @classmethod
+    def maps(cls, element, global_parameters: nList) -> Tuple[Optional[_np.ndarray], Optional[_np.ndarray]]:
+        """
+        The transfer matrix and the second-order tensor of an element, from the map cache (`MAP_CACHE`) if enabled.
+
+        Args:
+            element: the element
+            global_parameters: the global parameters (relativistic beta)
+
+        Returns:
+            the transfer matrix and the tensor (None if the integrator does not use them)
+        """
+        if cls.MAP_CACHE is None:
+            return cls.compute_maps(element, global_parameters)
+        key = (
+            cls,
+            element.__class__.__name__.upper(),
+            element.cache_key,
+            global_parameters[0] if cls.MAPS_DEPEND_ON_BETA else None,
+        )
+        return cls.MAP_CACHE.get(key, lambda: cls.compute_maps(element, global_parameters))
 
 
 class MadXIntegrator(Integrator):
@@ -104,13 +320,8 @@ class MadXIntegrator(Integrator):
     }
 
     @classmethod
-    def propagate(cls, element, beam_in: _np.ndarray, beam_out: _np.ndarray, global_parameters: nList):
-        return cls.METHODS.get(element.__class__.__name__.upper())(
-            beam_in,
-            beam_out,
-            element.cache,
-            global_parameters,
-        )
+    def resolve(cls, name: str) -> Binding:
+        return _bind_cache_kernel(cls.METHODS.get(name))
 
     @classmethod
     def cache(cls, element) -> List:
@@ -136,7 +347,7 @@ class MadXParaxialDriftIntegrator(MadXIntegrator):
 
 
 class Mad8Integrator(Integrator):
-    pass
+    MAPS_DEPEND_ON_BETA = True
 
 
 class Mad8FirstOrderTaylorIntegrator(Mad8Integrator):
@@ -146,34 +357,47 @@ class Mad8FirstOrderTaylorIntegrator(Mad8Integrator):
         "SBEND": compute_mad_combined_dipole_matrix,
         "QUADRUPOLE": compute_mad_quadrupole_matrix,
     }
+    DERIVATIVES = {
+        "DRIFT": compute_mad_drift_matrix_derivatives,
+        "BEND": compute_mad_combined_dipole_matrix_derivatives,
+        "SBEND": compute_mad_combined_dipole_matrix_derivatives,
+        "QUADRUPOLE": compute_mad_quadrupole_matrix_derivatives,
+    }
 
     @classmethod
-    def propagate(cls, element, beam_in, beam_out, global_parameters: nList):
-        if element.__class__.__name__.upper() in ["HKICKER", "VKICKER"]:
-            return track_madx_kicker(beam_in, beam_out, element.cache, global_parameters)
+    def resolve(cls, name: str) -> Binding:
+        if name in ["HKICKER", "VKICKER"]:
+            return _bind_cache_kernel(track_madx_kicker)
 
-        elif element.__class__.__name__.upper() in [
-            "GAP",
-            "RECTANGULARCOLLIMATOR",
-            "ELLIPTICALCOLLIMATOR",
-            "CIRCULARCOLLIMATOR",
-            "DUMP",
-        ]:
-            return batched_vector_matrix(
-                beam_in,
-                beam_out,
-                compute_mad_drift_matrix(element.cache, global_parameters),
-            )
-
-        elif element.__class__.__name__.upper() == "SROTATION":
-            return track_madx_srotation(beam_in, beam_out, element.cache, global_parameters)
+        elif name == "SROTATION":
+            return _bind_cache_kernel(track_madx_srotation)
 
         else:
-            return batched_vector_matrix(
-                beam_in,
-                beam_out,
-                cls.MATRICES.get(element.__class__.__name__.upper())(element.cache, global_parameters),
-            )
+
+            def propagate(element, beam_in, beam_out, global_parameters):
+                return batched_vector_matrix(beam_in, beam_out, cls.maps(element, global_parameters)[0])
+
+            return Binding(batched_vector_matrix, propagate)
+
+    @classmethod
+    def uses_maps(cls, element) -> bool:
+        name = element.__class__.__name__.upper()
+        return name in cls.MATRICES or name in MAD8_DRIFT_LIKE
+
+    @classmethod
+    def compute_maps(cls, element, global_parameters: nList) -> Tuple[_np.ndarray, Optional[_np.ndarray]]:
+        if element.__class__.__name__.upper() in MAD8_DRIFT_LIKE:
+            return compute_mad_drift_matrix(element.parameter_vector, global_parameters), None
+        return cls.MATRICES.get(element.__class__.__name__.upper())(element.parameter_vector, global_parameters), None
+
+    @classmethod
+    def matrix_derivatives(cls, element, global_parameters: nList) -> Optional[_np.ndarray]:
+        name = element.__class__.__name__.upper()
+        if name in MAD8_DRIFT_LIKE:
+            return compute_mad_drift_matrix_derivatives(element.parameter_vector, global_parameters)
+        if name in cls.DERIVATIVES:
+            return cls.DERIVATIVES[name](element.parameter_vector, global_parameters)
+        return None
 
     @classmethod
     def cache(cls, element) -> List:
@@ -189,34 +413,26 @@ class Mad8SecondOrderTaylorIntegrator(Mad8FirstOrderTaylorIntegrator):
     }
 
     @classmethod
-    def propagate(cls, element, beam_in, beam_out, global_parameters: nList):
-        if element.__class__.__name__.upper() in ["HKICKER", "VKICKER"]:
-            return track_madx_kicker(beam_in, beam_out, element.cache, global_parameters)
+    def resolve(cls, name: str) -> Binding:
+        if name in ["HKICKER", "VKICKER", "SROTATION"]:
+            return super().resolve(name)
 
-        elif element.__class__.__name__.upper() in [
-            "GAP",
-            "RECTANGULARCOLLIMATOR",
-            "ELLIPTICALCOLLIMATOR",
-            "CIRCULARCOLLIMATOR",
-            "DUMP",
-        ]:
-            return batched_vector_matrix_tensor(
-                beam_in,
-                beam_out,
-                compute_mad_drift_matrix(element.cache, global_parameters),
-                compute_mad_drift_tensor(element.cache, global_parameters),
-            )
+        def propagate(element, beam_in, beam_out, global_parameters):
+            return batched_vector_matrix_tensor(beam_in, beam_out, *cls.maps(element, global_parameters))
 
-        elif element.__class__.__name__.upper() == "SROTATION":
-            return track_madx_srotation(beam_in, beam_out, element.cache, global_parameters)
+        return Binding(batched_vector_matrix_tensor, propagate)
 
-        else:
-            return batched_vector_matrix_tensor(
-                beam_in,
-                beam_out,
-                cls.MATRICES.get(element.__class__.__name__.upper())(element.cache, global_parameters),
-                cls.TENSORS.get(element.__class__.__name__.upper())(element.cache, global_parameters),
+    @classmethod
+    def compute_maps(cls, element, global_parameters: nList) -> Tuple[_np.ndarray, Optional[_np.ndarray]]:
+        if element.__class__.__name__.upper() in MAD8_DRIFT_LIKE:
+            return (
+                compute_mad_drift_matrix(element.parameter_vector, global_parameters),
+                compute_mad_drift_tensor(element.parameter_vector, global_parameters),
             )
+        return (
+            cls.MATRICES.get(element.__class__.__name__.upper())(element.parameter_vector, global_parameters),
+            cls.TENSORS.get(element.__class__.__name__.upper())(element.parameter_vector, global_parameters),
+        )
 
     @classmethod
     def cache(cls, element) -> List:
@@ -224,7 +440,19 @@ class Mad8SecondOrderTaylorIntegrator(Mad8FirstOrderTaylorIntegrator):
 
 
 class TransportIntegrator(Integrator):
-    pass
+    @classmethod
+    def resolve(cls, name: str) -> Binding:
+        if name in ["HKICKER", "VKICKER"]:
+            return _bind_cache_kernel(track_madx_kicker)
+
+        elif name in TRANSPORT_DRIFT_LIKE:
+            return _bind_cache_kernel(track_madx_drift)
+
+        elif name == "SROTATION":
+            return _bind_cache_kernel(track_madx_srotation)
+
+        else:
+            return super().resolve(name)
 
 
 class TransportFirstOrderTaylorIntegrator(TransportIntegrator):
@@ -237,32 +465,34 @@ class TransportFirstOrderTaylorIntegrator(TransportIntegrator):
         "FRINGEIN": compute_transport_fringe_in_matrix,
         "FRINGEOUT": compute_transport_fringe_out_matrix,
     }
+    DERIVATIVES = {
+        "BEND": compute_transport_combined_dipole_matrix_derivatives,
+        "SBEND": compute_transport_combined_dipole_matrix_derivatives,
+        "QUADRUPOLE": compute_transport_quadrupole_matrix_derivatives,
+    }
 
     @classmethod
-    def propagate(cls, element, beam_in, beam_out, global_parameters: nList):
-        if element.__class__.__name__.upper() in ["HKICKER", "VKICKER"]:
-            return track_madx_kicker(beam_in, beam_out, element.cache, global_parameters)
+    def resolve(cls, name: str) -> Binding:
+        if name in ["HKICKER", "VKICKER", "SROTATION"] + TRANSPORT_DRIFT_LIKE:
+            return super().resolve(name)
 
-        elif element.__class__.__name__.upper() in [
-            "DRIFT",
-            "GAP",
-            "RECTANGULARCOLLIMATOR",
-            "ELLIPTICALCOLLIMATOR",
-            "CIRCULARCOLLIMATOR",
-            "DUMP",
-        ]:
-            return track_madx_drift(beam_in, beam_out, element.cache, global_parameters)
+        def propagate(element, beam_in, beam_out, global_parameters):
+            return batched_vector_matrix(beam_in, beam_out, cls.maps(element, global_parameters)[0])
 
-        elif element.__class__.__name__.upper() == "SROTATION":
-            return track_madx_srotation(beam_in, beam_out, element.cache, global_parameters)
+        return Binding(batched_vector_matrix, propagate)
 
-        else:
-            b = batched_vector_matrix(
-                beam_in,
-                beam_out,
-                cls.MATRICES.get(element.__class__.__name__.upper())(element.cache),
-            )
-            return b[0], b[1]
+    @classmethod
+    def uses_maps(cls, element) -> bool:
+        return element.__class__.__name__.upper() in cls.MATRICES
+
+    @classmethod
+    def compute_maps(cls, element, global_parameters: nList) -> Tuple[_np.ndarray, Optional[_np.ndarray]]:
+        return cls.MATRICES.get(element.__class__.__name__.upper())(element.parameter_vector), None
+
+    @classmethod
+    def matrix_derivatives(cls, element, global_parameters: nList) -> Optional[_np.ndarray]:
+        derivatives = cls.DERIVATIVES.get(element.__class__.__name__.upper())
+        return None if derivatives is None else derivatives(element.parameter_vector)
 
     @classmethod
     def cache(cls, element) -> List:
@@ -281,33 +511,21 @@ class TransportFirstOrderTaylorIntegratorExact(TransportIntegrator):
     }
 
     @classmethod
-    def propagate(cls, element, beam_in, beam_out, global_parameters: nList):
-        if element.__class__.__name__.upper() in ["HKICKER", "VKICKER"]:
-            return track_madx_kicker(beam_in, beam_out, element.cache, global_parameters)
-
-        elif element.__class__.__name__.upper() in [
-            "DRIFT",
-            "GAP",
-            "RECTANGULARCOLLIMATOR",
-            "ELLIPTICALCOLLIMATOR",
-            "CIRCULARCOLLIMATOR",
-            "DUMP",
-        ]:
-            return track_madx_drift(beam_in, beam_out, element.cache, global_parameters)
-
-        elif element.__class__.__name__.upper() == "SROTATION":
-            return track_madx_srotation(beam_in, beam_out, element.cache, global_parameters)
-
-        else:
-            b2 = _np.zeros(beam_in.shape)
-            for i in range(beam_in.shape[0]):
-                updated_parameters = element.cache.copy()
+    def resolve(cls, name: str) -> Binding:
+        if name in ["HKICKER", "VKICKER", "SROTATION"] + TRANSPORT_DRIFT_LIKE:
+            return super().resolve(name)
+        compute_matrix = cls.MATRICES.get(name)
 
-                updated_parameters.append(beam_in[i, 4])
-                matrix = cls.MATRICES.get(element.__class__.__name__.upper())(updated_parameters)
-                b2[i, :] = batched_vector_matrix(_np.array([beam_in[i, :]]), _np.array([beam_out[i, :]]), matrix)[1]
+        def propagate(element, beam_in, beam_out, global_parameters):
+            return batched_vector_chromatic_matrix(
+                beam_in,
+                beam_out,
+                element.parameter_vector,
+                4,
+                compute_matrix,
+            )
 
-            return beam_in, b2
+        return Binding(batched_vector_chromatic_matrix, propagate)
 
     @classmethod
     def cache(cls, element) -> List:
@@ -326,31 +544,21 @@ class TransportSecondOrderTaylorIntegrator(TransportFirstOrderTaylorIntegrator):
     }
 
     @classmethod
-    def propagate(cls, element, beam_in, beam_out, global_parameters: nList):
-        if element.__class__.__name__.upper() in ["HKICKER", "VKICKER"]:
-            return track_madx_kicker(beam_in, beam_out, element.cache, global_parameters)
+    def resolve(cls, name: str) -> Binding:
+        if name in ["HKICKER", "VKICKER", "SROTATION"] + TRANSPORT_DRIFT_LIKE:
+            return super().resolve(name)
 
-        elif element.__class__.__name__.upper() in [
-            "DRIFT",
-            "GAP",
-            "RECTANGULARCOLLIMATOR",
-            "ELLIPTICALCOLLIMATOR",
-            "CIRCULARCOLLIMATOR",
-            "DUMP",
-        ]:
-            return track_madx_drift(beam_in, beam_out, element.cache, global_parameters)
+        def propagate(element, beam_in, beam_out, global_parameters):
+            return batched_vector_matrix_tensor(beam_in, beam_out, *cls.maps(element, global_parameters))
 
-        elif element.__class__.__name__.upper() == "SROTATION":
-            return track_madx_srotation(beam_in, beam_out, element.cache, global_parameters)
+        return Binding(batched_vector_matrix_tensor, propagate)
 
-        else:
-            b = batched_vector_matrix_tensor(
-                beam_in,
-                beam_out,
-                cls.MATRICES.get(element.__class__.__name__.upper())(element.cache),
-                cls.TENSORS.get(element.__class__.__name__.upper())(element.cache),
-            )
-            return b[0], b[1]
+    @classmethod
+    def compute_maps(cls, element, global_parameters: nList) -> Tuple[_np.ndarray, Optional[_np.ndarray]]:
+        return (
+            cls.MATRICES.get(element.__class__.__name__.upper())(element.parameter_vector),
+            cls.TENSORS.get(element.__class__.__name__.upper())(element.parameter_vector),
+        )
 
     @classmethod
     def cache(cls, element) -> List:
@@ -369,43 +577,154 @@ class TransportSecondOrderTaylorIntegratorExact(TransportFirstOrderTaylorIntegra
     }
 
     @classmethod
-    def propagate(cls, element, beam_in, beam_out, global_parameters: nList):
-        if element.__class__.__name__.upper() in ["HKICKER", "VKICKER"]:
-            return track_madx_kicker(beam_in, beam_out, element.cache, global_parameters)
-
-        elif element.__class__.__name__.upper() in [
-            "DRIFT",
-            "GAP",
-            "RECTANGULARCOLLIMATOR",
-            "ELLIPTICALCOLLIMATOR",
-            "CIRCULARCOLLIMATOR",
-            "DUMP",
-        ]:
-            return track_madx_drift(beam_in, beam_out, element.cache, global_parameters)
-
-        elif element.__class__.__name__.upper() == "SROTATION":
-            return track_madx_srotation(beam_in, beam_out, element.cache, global_parameters)
+    def resolve(cls, name: str) -> Binding:
+        if name in ["HKICKER", "VKICKER", "SROTATION"] + TRANSPORT_DRIFT_LIKE:
+            return super().resolve(name)
+        compute_matrix = cls.MATRICES.get(name)
+        compute_tensor = cls.TENSORS.get(name)
+
+        def propagate(element, beam_in, beam_out, global_parameters):
+            return batched_vector_chromatic_matrix_tensor(
+                beam_in,
+                beam_out,
+                element.parameter_vector,
+                5,
+                compute_matrix,
+                compute_tensor,
+            )
 
-        else:
-            b2 = _np.zeros(beam_in.shape)
-            for i in range(beam_in.shape[0]):
-                updated_parameters = element.cache.copy()
-                updated_parameters.append(beam_in[i, 5])
-                matrix = cls.MATRICES.get(element.__class__.__name__.upper())(updated_parameters)
-                tensor = cls.TENSORS.get(element.__class__.__name__.upper())(updated_parameters)
-                b2[i, :] = batched_vector_matrix_tensor(
-                    _np.array([beam_in[i, :]]),
-                    _np.array([beam_out[i, :]]),
-                    matrix,
-                    tensor,
-                )[1]
-
-            return beam_in, b2
+        return Binding(batched_vector_chromatic_matrix_tensor, propagate)
 
     @classmethod
     def cache(cls, element) -> List:
         return element.parameters
 
 
+class TransportFirstOrderTaylorIntegratorInterpolated(TransportFirstOrderTaylorIntegratorExact):
+    """
+    Same maps as `TransportFirstOrderTaylorIntegratorExact`, but instead of computing the map of each particle, the
+    maps are tabulated on a regular grid of momentum offsets (`OFFSET_MIN`, `OFFSET_MAX`, `GRID_POINTS`) and
+    interpolated linearly for each particle. The tables are kept in the map cache.
+
+    Use `with_grid` to change the grid and `interpolation_error` to check the accuracy against the exact maps.
+    """
+
+    EXACT: IntegratorType = TransportFirstOrderTaylorIntegratorExact
+    COLUMN: int = 4
+    OFFSET_MIN: float = -0.1
+    OFFSET_MAX: float = 0.1
+    GRID_POINTS: int = 201
+
+    @classmethod
+    def with_grid(cls, offset_min: float, offset_max: float, grid_points: int) -> IntegratorType:
+        """
+        Create the same integrator with a different interpolation grid.
+
+        Args:
+            offset_min: the lowest momentum offset of the grid
+            offset_max: the highest momentum offset of the grid
+            grid_points: the number of points of the grid (at least 2)
+
+        Returns:
+            the integrator (a subclass) using the new grid
+        """
+        if grid_points < 2 or offset_max <= offset_min:
+            raise ValueError("The interpolation grid must have at least two points and a positive range.")
+        return IntegratorType(
+            cls.__name__,
+            (cls,),
+            {"OFFSET_MIN": offset_min, "OFFSET_MAX": offset_max, "GRID_POINTS": grid_points},
+        )
+
+    @classmethod
+    def grid(cls) -> _np.ndarray:
+        """The momentum offsets at which the maps are tabulated."""
+        return _np.linspace(cls.OFFSET_MIN, cls.OFFSET_MAX, cls.GRID_POINTS)
+
+    @classmethod
+    def uses_maps(cls, element) -> bool:
+        return element.__class__.__name__.upper() in cls.MATRICES
+
+    @classmethod
+    def compute_maps(cls, element, global_parameters: nList) -> Tuple[_np.ndarray, Optional[_np.ndarray]]:
+        name = element.__class__.__name__.upper()
+        parameters = _np.append(element.parameter_vector, 0.0)
+        matrices = _np.zeros((cls.GRID_POINTS, 6, 6))
+        tensors = _np.zeros((cls.GRID_POINTS, 6, 6, 6)) if hasattr(cls, "TENSORS") else None
+        for i, offset in enumerate(cls.grid()):
+            parameters[-1] = offset
+            matrices[i] = cls.MATRICES[name](parameters)
+            if tensors is not None:
+                tensors[i] = cls.TENSORS[name](parameters)
+        return matrices, tensors
+
+    @classmethod
+    def resolve(cls, name: str) -> Binding:
+        if name not in cls.MATRICES:
+            return super().resolve(name)
+        step = (cls.OFFSET_MAX - cls.OFFSET_MIN) / (cls.GRID_POINTS - 1)
+
+        if not hasattr(cls, "TENSORS"):
+
+            def propagate(element, beam_in, beam_out, global_parameters):
+                matrices = cls.maps(element, global_parameters)[0]
+                return batched_vector_interpolated_matrix(beam_in, beam_out, matrices, cls.OFFSET_MIN, step, cls.COLUMN)
+
+            return Binding(batched_vector_interpolated_matrix, propagate)
+
+        def propagate(element, beam_in, beam_out, global_parameters):
+            matrices, tensors = cls.maps(element, global_parameters)
+            return batched_vector_interpolated_matrix_tensor(
+                beam_in,
+                beam_out,
+                matrices,
+                tensors,
+                cls.OFFSET_MIN,
+                step,
+                cls.COLUMN,
+            )
+
+        return Binding(batched_vector_interpolated_matrix_tensor, propagate)
+
+    @classmethod
+    def interpolation_error(cls, elements: List, beam: _np.ndarray, global_parameters: nList = None) -> _pd.DataFrame:
+        """
+        Compare the interpolated maps with the exact maps, element by element. The beam is tracked with the exact
+        maps and, at each element, the same input particles are also propagated with the interpolated maps.
+
+        Args:
+            elements: the elements (e.g. the sequence of a Manzoni `Input`)
+            beam: the particles used for the comparison
+            global_parameters: the global parameters (relativistic beta)
+
+        Returns:
+            a pandas DataFrame with the maximum absolute error on each coordinate, for each element
+        """
+        if global_parameters is None:
+            global_parameters = nList([1.0])
+        errors = {}
+        b1 = _np.copy(beam)
+        for e in elements:
+            b2 = cls.EXACT.propagate(e, b1, _np.zeros(b1.shape), global_parameters)[1]
+            if cls.uses_maps(e):
+                interpolated = cls.propagate(e, b1, _np.zeros(b1.shape), global_parameters)[1]
+                errors[e.NAME] = _np.max(_np.abs(interpolated - b2), axis=0, initial=0.0)[:6]
+            b1 = b2
+        return _pd.DataFrame.from_dict(errors, orient="index", columns=["X", "PX", "Y", "PY", "L", "DPP"])
+
+
+class TransportSecondOrderTaylorIntegratorInterpolated(
+    TransportFirstOrderTaylorIntegratorInterpolated,
+    TransportSecondOrderTaylorIntegratorExact,
+):
+    """
+    Same maps as `TransportSecondOrderTaylorIntegratorExact`, tabulated on a grid of momentum offsets and
+    interpolated linearly for each particle (see `TransportFirstOrderTaylorIntegratorInterpolated`).
+    """
+
+    EXACT: IntegratorType = TransportSecondOrderTaylorIntegratorExact
+    COLUMN: int = 5
+
+
 class PTCIntegrator(Integrator):
     pass
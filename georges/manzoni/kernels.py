@@ -2,6 +2,8 @@
 The file `kernels.py` contains the loops that are the core of the particles propagation based on
 their coordinates. Different batches are available, to allow a matrix (order 1) propagation,
 a tensor (order 2) propagation or a matrix followed by a tensor (orders 1+2) propagations.
+The reductions of the beam used by the observers (moments, histograms, quantiles) are also defined here, as well
+as the counter-based random numbers used by the scattering kernels of the material elements.
 """
 import numba as _nb
 import numpy as _np
@@ -45,6 +47,70 @@ def batched_vector_tensor(b1: _np.ndarray, b2: _np.ndarray, tensor: _np.ndarray)
     return b1, b2
 
 
+@njit(nogil=True)
+def sparse_tensor(tensor: _np.ndarray):
+    """
+    Extract the nonzero entries of the upper triangular part (Tijk with j <= k) of a second-order tensor.
+
+    Args:
+        tensor: the second-order tensor as a numpy array
+
+    Returns:
+        the (i, j, k) indices of the nonzero entries as an array of shape (n, 3) and their values
+    """
+    n = 0
+    for i in range(tensor.shape[0]):
+        for j in range(tensor.shape[1]):
+            for k in range(j, tensor.shape[2]):
+                if tensor[i, j, k] != 0.0:
+                    n += 1
+    indices = _np.empty((n, 3), dtype=_np.int64)
+    values = _np.empty(n)
+    n = 0
+    for i in range(tensor.shape[0]):
+        for j in range(tensor.shape[1]):
+            for k in range(j, tensor.shape[2]):
+                if tensor[i, j, k] != 0.0:
+                    indices[n, 0] = i
+                    indices[n, 1] = j
+                    indices[n, 2] = k
+                    values[n] = tensor[i, j, k]
+                    n += 1
+    return indices, values
+
+
+@njit(parallel=True, nogil=True)
+def batched_vector_matrix_sparse_tensor(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    matrix: _np.ndarray,
+    indices: _np.ndarray,
+    values: _np.ndarray,
+):
+    """
+    Matrix followed by tensor propagation, with the tensor given as a list of its nonzero entries (see `sparse_tensor`).
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        matrix: the transfer matrix as a numpy array
+        indices: the (i, j, k) indices of the nonzero entries of the tensor
+        values: the values of the nonzero entries of the tensor
+
+    Returns:
+        the source and the destination (result) arrays
+    """
+    for h in _nb.prange(b1.shape[0]):
+        for i in range(matrix.shape[0]):
+            s = 0.0
+            for j in range(matrix.shape[1]):
+                s += matrix[i, j] * b1[h, j]
+            b2[h, i] = s
+        for n in range(values.shape[0]):
+            b2[h, indices[n, 0]] += values[n] * b1[h, indices[n, 1]] * b1[h, indices[n, 2]]
+    return b1, b2
+
+
 @njit(nogil=True)
 def batched_vector_matrix_tensor(
     b1: _np.ndarray,
@@ -53,19 +119,44 @@ def batched_vector_matrix_tensor(
     tensor: _np.ndarray,
 ):
     """
+    Matrix followed by tensor propagation. Most of the entries of the second-order tensors are zero: only the nonzero
+    entries are extracted and applied to the particles (in parallel).
 
     Args:
-        b1:
-        b2:
-        matrix:
-        tensor:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        matrix: the transfer matrix as a numpy array
+        tensor: the second-order tensor as a numpy array (upper triangular, Tijk with j <= k)
 
     Returns:
+        the source and the destination (result) arrays
+    """
+    indices, values = sparse_tensor(tensor)
+    return batched_vector_matrix_sparse_tensor(b1, b2, matrix, indices, values)
+
 
+@njit(parallel=True, nogil=True)
+def batched_vector_matrix_dense_tensor(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    matrix: _np.ndarray,
+    tensor: _np.ndarray,
+):
     """
-    for h in range(b1.shape[0]):
+    Matrix followed by tensor propagation, walking the full upper triangular part of the tensor.
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        matrix: the transfer matrix as a numpy array
+        tensor: the second-order tensor as a numpy array
+
+    Returns:
+        the source and the destination (result) arrays
+    """
+    for h in _nb.prange(b1.shape[0]):
         for i in range(tensor.shape[0]):
-            s = 0
+            s = 0.0
             for j in range(tensor.shape[1]):
                 s += matrix[i, j] * b1[h, j]
                 for k in range(j, tensor.shape[2]):  # Assume upper triangular matrix Mjk = Ti::
@@ -74,6 +165,645 @@ def batched_vector_matrix_tensor(
     return b1, b2
 
 
+@njit(parallel=True, nogil=True)
+def batched_vector_chromatic_matrix(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    parameters: _np.ndarray,
+    column: int,
+    compute_matrix,
+):
+    """
+    Matrix propagation with a transfer matrix evaluated for each particle: the particle's coordinate `column`
+    (momentum offset) is appended to the element parameters before computing its matrix.
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        parameters: the parameters of the element
+        column: the coordinate of the particles appended to the parameters
+        compute_matrix: the (jitted) function computing the transfer matrix from the parameters
+
+    Returns:
+        the source and the destination (result) arrays
+    """
+    n = parameters.shape[0]
+    for h in _nb.prange(b1.shape[0]):
+        p = _np.empty(n + 1)
+        p[:n] = parameters
+        p[n] = b1[h, column]
+        vector_matrix_row(b1, b2, h, compute_matrix(p))
+    return b1, b2
+
+
+@njit(parallel=True, nogil=True)
+def batched_vector_chromatic_matrix_tensor(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    parameters: _np.ndarray,
+    column: int,
+    compute_matrix,
+    compute_tensor,
+):
+    """
+    Matrix followed by tensor propagation with the transfer maps evaluated for each particle: the particle's
+    coordinate `column` (momentum offset) is appended to the element parameters before computing its maps.
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        parameters: the parameters of the element
+        column: the coordinate of the particles appended to the parameters
+        compute_matrix: the (jitted) function computing the transfer matrix from the parameters
+        compute_tensor: the (jitted) function computing the second-order tensor from the parameters
+
+    Returns:
+        the source and the destination (result) arrays
+    """
+    n = parameters.shape[0]
+    for h in _nb.prange(b1.shape[0]):
+        p = _np.empty(n + 1)
+        p[:n] = parameters
+        p[n] = b1[h, column]
+        vector_matrix_tensor_row(b1, b2, h, compute_matrix(p), compute_tensor(p))
+    return b1, b2
+
+
+@njit(parallel=True, nogil=True)
+def batched_vector_interpolated_matrix(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    matrices: _np.ndarray,
+    offset_min: float,
+    offset_step: float,
+    column: int,
+):
+    """
+    Matrix propagation with transfer matrices tabulated on a regular grid of momentum offsets: the matrix of each
+    particle is interpolated linearly between the two nearest grid points (and extrapolated outside the grid).
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        matrices: the transfer matrices at each point of the grid
+        offset_min: the first point of the grid
+        offset_step: the spacing of the grid
+        column: the coordinate of the particles used for the interpolation
+
+    Returns:
+        the source and the destination (result) arrays
+    """
+    n = matrices.shape[0]
+    for h in _nb.prange(b1.shape[0]):
+        u = (b1[h, column] - offset_min) / offset_step
+        k = min(max(int(_np.floor(u)), 0), n - 2)
+        w = u - k
+        for i in range(matrices.shape[1]):
+            s = 0.0
+            for j in range(matrices.shape[2]):
+                s += ((1 - w) * matrices[k, i, j] + w * matrices[k + 1, i, j]) * b1[h, j]
+            b2[h, i] = s
+    return b1, b2
+
+
+@njit(parallel=True, nogil=True)
+def batched_vector_interpolated_matrix_tensor(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    matrices: _np.ndarray,
+    tensors: _np.ndarray,
+    offset_min: float,
+    offset_step: float,
+    column: int,
+):
+    """
+    Matrix followed by tensor propagation with the maps tabulated on a regular grid of momentum offsets: the maps of
+    each particle are interpolated linearly between the two nearest grid points (and extrapolated outside the grid).
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        matrices: the transfer matrices at each point of the grid
+        tensors: the second-order tensors at each point of the grid
+        offset_min: the first point of the grid
+        offset_step: the spacing of the grid
+        column: the coordinate of the particles used for the interpolation
+
+    Returns:
+        the source and the destination (result) arrays
+    """
+    n = matrices.shape[0]
+    for h in _nb.prange(b1.shape[0]):
+        u = (b1[h, column] - offset_min) / offset_step
+        k = min(max(int(_np.floor(u)), 0), n - 2)
+        w = u - k
+        for i in range(tensors.shape[1]):
+            s = 0.0
+            for j in range(tensors.shape[2]):
+                s += ((1 - w) * matrices[k, i, j] + w * matrices[k + 1, i, j]) * b1[h, j]
+                for m in range(j, tensors.shape[3]):  # Assume upper triangular matrix Mjk = Ti::
+                    s += ((1 - w) * tensors[k, i, j, m] + w * tensors[k + 1, i, j, m]) * b1[h, j] * b1[h, m]
+            b2[h, i] = s
+    return b1, b2
+
+
 @njit
 def matrix_matrix(m1, m2):
-    return _np.matmul(m1, m2)
+    return _np.dot(m1, m2)
+
+
+@njit(nogil=True)
+def vector_matrix_row(b1: _np.ndarray, b2: _np.ndarray, i: int, matrix: _np.ndarray):
+    """
+    Apply a transfer matrix to a single particle.
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        i: index of the particle (row) to propagate
+        matrix: the transfer matrix as a numpy array
+    """
+    for j in range(matrix.shape[0]):
+        s = 0.0
+        for k in range(matrix.shape[1]):
+            s += matrix[j, k] * b1[i, k]
+        b2[i, j] = s
+
+
+@njit(nogil=True)
+def vector_matrix_tensor_row(b1: _np.ndarray, b2: _np.ndarray, i: int, matrix: _np.ndarray, tensor: _np.ndarray):
+    """
+    Apply a transfer matrix and a (upper triangular) second-order tensor to a single particle.
+
+    Args:
+        b1: a numpy array containing all the particles
+        b2: explicit destination for the result (must be different from b1)
+        i: index of the particle (row) to propagate
+        matrix: the transfer matrix as a numpy array
+        tensor: the second-order tensor as a numpy array
+    """
+    for j in range(tensor.shape[0]):
+        s = 0.0
+        for k in range(tensor.shape[1]):
+            s += matrix[j, k] * b1[i, k]
+            for m in range(k, tensor.shape[2]):  # Assume upper triangular matrix Mjk = Ti::
+                s += tensor[j, k, m] * b1[i, k] * b1[i, m]
+        b2[i, j] = s
+
+
+@njit
+def compose_maps(
+    k1: _np.ndarray,
+    r1: _np.ndarray,
+    t1: _np.ndarray,
+    k2: _np.ndarray,
+    r2: _np.ndarray,
+    t2: _np.ndarray,
+):
+    """
+    Compose two second-order maps x -> K + R x + T x x (T upper triangular, Tijk with j <= k), applying the first map
+    and then the second one. The result is truncated at the second order (truncated power series).
+
+    Args:
+        k1: the offset (zeroth order) of the first map
+        r1: the transfer matrix of the first map
+        t1: the tensor of the first map
+        k2: the offset of the second map
+        r2: the transfer matrix of the second map
+        t2: the tensor of the second map
+
+    Returns:
+        the offset, the transfer matrix and the tensor of the composed map
+    """
+    n = r1.shape[0]
+    # Symmetric forms of the tensors: sum_jk S_ijk x_j x_k
+    s1 = _np.zeros((n, n, n))
+    s2 = _np.zeros((n, n, n))
+    for i in range(n):
+        for j in range(n):
+            for k in range(j, n):
+                f = 1.0 if j == k else 0.5
+                s1[i, j, k] = s1[i, k, j] = f * t1[i, j, k]
+                s2[i, j, k] = s2[i, k, j] = f * t2[i, j, k]
+
+    # Second map expanded around the offset of the first map: x2 = K' + R' y + S2 y y with y = R1 x + S1 x x
+    k = k2 + _np.dot(r2, k1)
+    r = _np.copy(r2)
+    for i in range(n):
+        for m in range(n):
+            for p in range(n):
+                k[i] += s2[i, p, m] * k1[p] * k1[m]
+                r[i, m] += 2 * s2[i, p, m] * k1[p]
+
+    r_out = matrix_matrix(r, r1)
+    t_out = _np.zeros((n, n, n))
+    for i in range(n):
+        for j in range(n):
+            for q in range(j, n):
+                s = 0.0
+                for p in range(n):
+                    s += r[i, p] * s1[p, j, q]
+                    for m in range(n):
+                        s += s2[i, p, m] * r1[p, j] * r1[m, q]
+                t_out[i, j, q] = s if j == q else 2 * s
+    return k, r_out, t_out
+
+
+@njit(nogil=True)
+def phase_unrolling(phi: _np.ndarray) -> _np.ndarray:
+    """
+    Unroll (in place) the phase advances computed modulo 2 pi, as in `georges_core.twiss.Twiss`.
+
+    Args:
+        phi: the phase advances along the beamline
+
+    Returns:
+        the unrolled phase advances
+    """
+    if phi.shape[0] == 0:
+        return phi
+    if phi[0] < 0:
+        phi[0] += 2 * _np.pi
+    for i in range(1, phi.shape[0]):
+        if phi[i] < 0:
+            phi[i] += 2 * _np.pi
+        if phi[i - 1] - phi[i] > 0.5:
+            phi[i:] += 2 * _np.pi
+    return phi
+
+
+@njit(nogil=True)
+def cumulative_matrices(matrices: _np.ndarray) -> _np.ndarray:
+    """
+    Products of the transfer matrices of consecutive elements, from the entrance of the first element.
+
+    Args:
+        matrices: the transfer matrices of the elements, in the order of the beamline (shape (n, 6, 6))
+
+    Returns:
+        the transfer matrices from the entrance of the first element to the exit of each element
+    """
+    cumulated = _np.empty_like(matrices)
+    if matrices.shape[0] == 0:
+        return cumulated
+    cumulated[0] = matrices[0]
+    for i in range(1, matrices.shape[0]):
+        cumulated[i] = matrix_matrix(matrices[i], cumulated[i - 1])
+    return cumulated
+
+
+@njit(parallel=True, nogil=True)
+def cumulative_matrices_derivatives(
+    matrices: _np.ndarray,
+    positions: _np.ndarray,
+    derivatives: _np.ndarray,
+    targets: _np.ndarray,
+) -> _np.ndarray:
+    """
+    Derivatives of the transfer matrices from the entrance of the first element to the exit of some elements (see
+    `cumulative_matrices`) with respect to parameters of the elements. The derivative of the matrix of the element
+    of each parameter is propagated to the targets, in parallel over the parameters.
+
+    Args:
+        matrices: the transfer matrices of the elements, in the order of the beamline (shape (n, 6, 6))
+        positions: the index of the element of each parameter
+        derivatives: the derivative of the matrix of the element of each parameter (shape (p, 6, 6))
+        targets: the indices of the elements at the exit of which the derivatives are computed, in increasing order
+
+    Returns:
+        the derivatives, with shape (number of targets, p, 6, 6)
+    """
+    result = _np.zeros((targets.shape[0], positions.shape[0], 6, 6))
+    if targets.shape[0] == 0:
+        return result
+    cumulated = cumulative_matrices(matrices)
+    for v in _nb.prange(positions.shape[0]):
+        i = positions[v]
+        d = derivatives[v].copy() if i == 0 else matrix_matrix(derivatives[v], cumulated[i - 1])
+        t = 0
+        while t < targets.shape[0] and targets[t] < i:
+            t += 1
+        for k in range(i, targets[-1] + 1):
+            if k > i:
+                d = matrix_matrix(matrices[k], d)
+            while t < targets.shape[0] and targets[t] == k:
+                result[t, v] = d
+                t += 1
+    return result
+
+
+@njit(nogil=True)
+def _chunks(n: int) -> int:
+    """Number of chunks used to split n particles between the threads of the reduction kernels."""
+    return max(1, min(n // 1024, 4 * _nb.get_num_threads()))
+
+
+@njit(parallel=True, nogil=True)
+def beam_moments(b: _np.ndarray, n_coordinates: int):
+    """
+    First and second moments of the beam coordinates, in a single pass over the particles. The sums are accumulated
+    relative to the first particle to limit the numerical cancellation in the covariance.
+
+    Args:
+        b: a numpy array containing all the particles
+        n_coordinates: the number of coordinates (columns) to consider
+
+    Returns:
+        the mean of the coordinates and their (population) covariance matrix
+    """
+    n = b.shape[0]
+    m = n_coordinates
+    mean = _np.full(m, _np.nan)
+    covariance = _np.full((m, m), _np.nan)
+    if n == 0:
+        return mean, covariance
+    shift = _np.copy(b[0, :m])
+    n_chunks = _chunks(n)
+    sums = _np.zeros((n_chunks, m))
+    products = _np.zeros((n_chunks, m, m))
+    for c in _nb.prange(n_chunks):
+        d = _np.empty(m)
+        chunk_sums = _np.zeros(m)
+        chunk_products = _np.zeros((m, m))
+        for h in range(c * n // n_chunks, (c + 1) * n // n_chunks):
+            for j in range(m):
+                d[j] = b[h, j] - shift[j]
+            for j in range(m):
+                chunk_sums[j] += d[j]
+                for k in range(j, m):
+                    chunk_products[j, k] += d[j] * d[k]
+        sums[c] = chunk_sums
+        products[c] = chunk_products
+    s = sums.sum(axis=0) / n
+    p = products.sum(axis=0) / n
+    for j in range(m):
+        mean[j] = shift[j] + s[j]
+        for k in range(j, m):
+            covariance[j, k] = covariance[k, j] = p[j, k] - s[j] * s[k]
+    return mean, covariance
+
+
+@njit(parallel=True, nogil=True)
+def beam_histogram(b: _np.ndarray, column: int, low: float, high: float, bins: int):
+    """
+    Histogram of a coordinate of the beam on a fixed binning. The particles outside of the range are not counted.
+
+    Args:
+        b: a numpy array containing all the particles
+        column: the coordinate
+        low: the lower edge of the histogram
+        high: the upper edge of the histogram
+        bins: the number of bins
+
+    Returns:
+        the counts in each bin
+    """
+    n = b.shape[0]
+    n_chunks = _chunks(n)
+    counts = _np.zeros((n_chunks, bins), dtype=_np.int64)
+    scale = bins / (high - low)
+    for c in _nb.prange(n_chunks):
+        for h in range(c * n // n_chunks, (c + 1) * n // n_chunks):
+            x = b[h, column]
+            if low <= x <= high:
+                counts[c, min(int((x - low) * scale), bins - 1)] += 1
+    return counts.sum(axis=0)
+
+
+@njit(parallel=True, nogil=True)
+def beam_histogram2d(
+    b: _np.ndarray,
+    column_x: int,
+    column_y: int,
+    low_x: float,
+    high_x: float,
+    low_y: float,
+    high_y: float,
+    bins_x: int,
+    bins_y: int,
+):
+    """
+    Two-dimensional histogram of two coordinates of the beam on a fixed binning (see `beam_histogram`).
+
+    Returns:
+        the counts in each bin, as an array of shape (bins_x, bins_y)
+    """
+    n = b.shape[0]
+    n_chunks = _chunks(n)
+    counts = _np.zeros((n_chunks, bins_x, bins_y), dtype=_np.int64)
+    scale_x = bins_x / (high_x - low_x)
+    scale_y = bins_y / (high_y - low_y)
+    for c in _nb.prange(n_chunks):
+        for h in range(c * n // n_chunks, (c + 1) * n // n_chunks):
+            x = b[h, column_x]
+            y = b[h, column_y]
+            if low_x <= x <= high_x and low_y <= y <= high_y:
+                counts[c, min(int((x - low_x) * scale_x), bins_x - 1), min(int((y - low_y) * scale_y), bins_y - 1)] += 1
+    return counts.sum(axis=0)
+
+
+@njit(nogil=True)
+def beam_quantiles(b: _np.ndarray, column: int, quantiles: _np.ndarray, resolution: int):
+    """
+    Approximate quantiles of a coordinate of the beam, from a sketch of the distribution: a histogram with a fixed
+    number of bins between the extreme values, interpolated linearly. The error is bounded by the width of the bins,
+    (max - min) / resolution, and the memory does not depend on the number of particles.
+
+    Args:
+        b: a numpy array containing all the particles
+        column: the coordinate
+        quantiles: the quantiles to compute (between 0 and 1)
+        resolution: the number of bins of the sketch
+
+    Returns:
+        the values of the quantiles
+    """
+    n = b.shape[0]
+    values = _np.full(quantiles.shape[0], _np.nan)
+    if n == 0:
+        return values
+    low = _np.min(b[:, column])
+    high = _np.max(b[:, column])
+    if high == low:
+        values[:] = low
+        return values
+    cumulative = _np.cumsum(beam_histogram(b, column, low, high, resolution))
+    width = (high - low) / resolution
+    for q in range(quantiles.shape[0]):
+        target = quantiles[q] * n
+        i = _np.searchsorted(cumulative, target)
+        i = min(i, resolution - 1)
+        before = cumulative[i - 1] if i > 0 else 0
+        fraction = (target - before) / (cumulative[i] - before) if cumulative[i] > before else 0.0
+        values[q] = low + (i + fraction) * width
+    return values
+
+
+_SPLITMIX_INCREMENT = _np.uint64(0x9E3779B97F4A7C15)
+_SPLITMIX_MULTIPLIER_1 = _np.uint64(0xBF58476D1CE4E5B9)
+_SPLITMIX_MULTIPLIER_2 = _np.uint64(0x94D049BB133111EB)
+
+
+@njit(nogil=True)
+def _splitmix64(x: _np.uint64) -> _np.uint64:
+    """The SplitMix64 bijection of 64-bit integers, used as the hash of the counter-based random numbers."""
+    z = _np.uint64(x) + _SPLITMIX_INCREMENT
+    z = (z ^ (z >> _np.uint64(30))) * _SPLITMIX_MULTIPLIER_1
+    z = (z ^ (z >> _np.uint64(27))) * _SPLITMIX_MULTIPLIER_2
+    return z ^ (z >> _np.uint64(31))
+
+
+@njit(nogil=True)
+def random_stream_key(seed: int, stream: int) -> _np.uint64:
+    """
+    The key of a stream of counter-based random numbers.
+
+    Args:
+        seed: the seed
+        stream: the identifier of the stream (e.g. of an element)
+
+    Returns:
+        the key of the stream
+    """
+    return _splitmix64(_splitmix64(_np.uint64(seed)) ^ _np.uint64(stream))
+
+
+@njit(nogil=True)
+def random_uniform(key: _np.uint64, counter: _np.uint64) -> float:
+    """
+    A uniform random number in (0, 1), depending only on the key of the stream and on the counter: the random numbers
+    do not depend on the order in which they are drawn (nor on the number of threads).
+
+    Args:
+        key: the key of the stream (see `random_stream_key`)
+        counter: the counter
+
+    Returns:
+        the random number
+    """
+    z = _splitmix64(_np.uint64(key) ^ _splitmix64(counter))
+    return (_np.float64(z >> _np.uint64(11)) + 0.5) * (1.0 / 9007199254740992.0)
+
+
+@njit(nogil=True)
+def random_normal_pair(key: _np.uint64, counter: _np.uint64):
+    """Two independent standard normal random numbers (Box-Muller), using the counters `counter` and `counter + 1`."""
+    counter = _np.uint64(counter)
+    r = _np.sqrt(-2.0 * _np.log(random_uniform(key, counter)))
+    theta = 2.0 * _np.pi * random_uniform(key, counter + _np.uint64(1))
+    return r * _np.cos(theta), r * _np.sin(theta)
+
+
+@njit(parallel=True, nogil=True)
+def random_indices(n: int, size: int, key: _np.uint64) -> _np.ndarray:
+    """
+    Indices drawn uniformly (with replacement) in [0, size), from a stream of counter-based random numbers.
+
+    Args:
+        n: the number of indices
+        size: the upper bound (excluded) of the indices
+        key: the key of the stream
+
+    Returns:
+        the indices
+    """
+    indices = _np.empty(n, dtype=_np.int64)
+    for i in _nb.prange(n):
+        indices[i] = min(int(random_uniform(key, _np.uint64(i)) * size), size - 1)
+    return indices
+
+
+@njit(parallel=True, nogil=True)
+def scattering(b: _np.ndarray, cholesky: _np.ndarray, sigma_dpp: float, dpp_column: int, key: _np.uint64):
+    """
+    Add the multiple Coulomb scattering and the energy straggling to a beam, in place. The (x, px) and (y, py)
+    kicks follow the Fermi-Eyges covariance [[A2, A1], [A1, A0]] of each plane, given by its Cholesky factor. The
+    random numbers of a particle are drawn from counters derived from its index, so that the result is reproducible
+    for a given key whatever the number of threads.
+
+    Args:
+        b: a numpy array containing all the particles
+        cholesky: the Cholesky factor (L11, L21, L22) of the Fermi-Eyges covariance of a plane
+        sigma_dpp: the standard deviation of the momentum offset
+        dpp_column: the column of the momentum offset
+        key: the key of the stream of random numbers (see `random_stream_key`)
+    """
+    for i in _nb.prange(b.shape[0]):
+        counter = _np.uint64(i) * _np.uint64(6)
+        z0, z1 = random_normal_pair(key, counter)
+        z2, z3 = random_normal_pair(key, counter + _np.uint64(2))
+        z4, _ = random_normal_pair(key, counter + _np.uint64(4))
+        b[i, 0] += cholesky[0] * z0
+        b[i, 1] += cholesky[1] * z0 + cholesky[2] * z1
+        b[i, 2] += cholesky[0] * z2
+        b[i, 3] += cholesky[1] * z2 + cholesky[2] * z3
+        if sigma_dpp != 0.0:
+            b[i, dpp_column] += sigma_dpp * z4
+
+
+@njit(parallel=True, nogil=True)
+def degrader(
+    b1: _np.ndarray,
+    b2: _np.ndarray,
+    indices: _np.ndarray,
+    slices: _np.ndarray,
+    with_scattering: bool,
+    dpp_column: int,
+    beta: float,
+    madx: bool,
+    key: _np.uint64,
+) -> int:
+    """
+    Transport a beam through a degrader in a single pass: the (optional) resampling of the particles, then for each
+    slice of material the drift, the multiple Coulomb scattering and the energy straggling and, with the MAD-X
+    conventions, the computation of p_t and the pseudo-aperture check. The particles are written in the preallocated
+    beam `b2`; the ones kept by the pseudo-aperture are moved to its first rows (and their rows in `b1` to the first
+    entries of `indices`). With a single slice, the random numbers are the same as the ones of `scattering`.
+
+    Args:
+        b1: a numpy array containing all the particles at the entrance of the degrader
+        b2: a numpy array of at least `len(indices)` rows, receiving the particles at the exit
+        indices: the rows of `b1` to transport (all the particles or a resampling of them), compacted in place
+        slices: one row per slice with its length, the Cholesky factor (L11, L21, L22) of its Fermi-Eyges covariance
+            and the standard deviation of its momentum offset
+        with_scattering: add the scattering and the energy straggling (otherwise the degrader is a drift)
+        dpp_column: the column of the momentum offset
+        beta: the relativistic beta (used with the MAD-X conventions)
+        madx: compute p_t from the momentum offset and remove the particles outside of the pseudo-aperture
+        key: the key of the stream of random numbers (see `random_stream_key`)
+
+    Returns:
+        the number of particles at the exit of the degrader
+    """
+    n = indices.shape[0]
+    n_slices = slices.shape[0]
+    keep = _np.ones(n, dtype=_np.bool_)
+    for i in _nb.prange(n):
+        b2[i, :] = b1[indices[i], :]
+        for k in range(n_slices):
+            b2[i, 0] += slices[k, 0] * b2[i, 1]
+            b2[i, 2] += slices[k, 0] * b2[i, 3]
+            if with_scattering:
+                counter = (_np.uint64(i) * _np.uint64(n_slices) + _np.uint64(k)) * _np.uint64(6)
+                z0, z1 = random_normal_pair(key, counter)
+                z2, z3 = random_normal_pair(key, counter + _np.uint64(2))
+                z4, _ = random_normal_pair(key, counter + _np.uint64(4))
+                b2[i, 0] += slices[k, 1] * z0
+                b2[i, 1] += slices[k, 2] * z0 + slices[k, 3] * z1
+                b2[i, 2] += slices[k, 1] * z2
+                b2[i, 3] += slices[k, 2] * z2 + slices[k, 3] * z3
+                if slices[k, 4] != 0.0:
+                    b2[i, dpp_column] += slices[k, 4] * z4
+        if madx:
+            dpp = b2[i, 4]
+            pt = (-(2 / beta) + _np.sqrt((2 / beta) ** 2 + 4 * (dpp**2 + 2 * dpp))) / 2
+            b2[i, 5] = pt
+            keep[i] = 1 + 2 * pt / beta + pt**2 - b2[i, 1] ** 2 - b2[i, 3] ** 2 >= 0
+    n_kept = 0
+    for i in range(n):
+        if keep[i]:
+            if n_kept != i:
+                b2[n_kept, :] = b2[i, :]
+                indices[n_kept] = indices[i]
+            n_kept += 1
+    return n_kept
@@ -0,0 +1,242 @@
+"""
+The file `losses.py` contains the `LossRecord` class, which keeps track of where the particles are lost along
+the beamline. When a `LossRecord` is given to the tracking, the apertures do not remove the lost particles from
+the beam anymore: they are flagged as lost in a fixed-size buffer, and the beam is compacted only when the
+fraction of surviving particles drops below a threshold (or before an element that needs a compact beam,
+such as the scatterers and degraders).
+
+For each lost particle, the record keeps its identifier, the element where it is lost, the longitudinal position
+of the loss and (optionally) its coordinates at that point. Only the lost particles are copied, never the full beam.
+The record can be converted to a dataframe or histogrammed to build loss maps.
+"""
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as _np
+import pandas as _pd
+
+COORDINATES = ["X", "PX", "Y", "PY", "DPP", "PT"]
+
+
+class LossRecord:
+    """
+    Record of the element at which each particle is lost.
+
+    The particles are identified by their index in the initial distribution. The particles stopped by a beam stop are
+    identified as well. The ones removed by the degraders with losses and by the pseudo-aperture of the material
+    elements cannot be identified individually: they are counted per element, while the surviving particles keep
+    their identifier (a particle duplicated by the resampling of a degrader shares the identifier of its original).
+    The particles surviving an element which does not give the rows it keeps (see
+    `MaterialElement.propagate_indices`) are not identified anymore (their identifier is -1 if they are lost later).
+    """
+
+    def __init__(self, compaction_threshold: float = 0.5, with_coordinates: bool = True):
+        """
+
+        Args:
+            compaction_threshold: the beam is compacted when the fraction of alive particles in the buffers
+                                  drops below this threshold
+            with_coordinates: store the coordinates of the particles at the point where they are lost
+        """
+        self.compaction_threshold = compaction_threshold
+        self.with_coordinates = with_coordinates
+        self.elements: List[str] = []
+        self.lost_at: _np.ndarray = _np.zeros(0, dtype=int)
+        self.unidentified: Dict[int, int] = {}
+        self._chunks: List[Tuple[_np.ndarray, _np.ndarray, _np.ndarray, Optional[_np.ndarray]]] = []
+        self._records: Optional[Tuple[_np.ndarray, _np.ndarray, _np.ndarray, Optional[_np.ndarray]]] = None
+
+    def reset(self, n_particles: int, elements: List[str]):
+        """
+        Prepare the record for a new tracking.
+
+        Args:
+            n_particles: the number of particles in the initial distribution
+            elements: the names of the elements of the beamline
+        """
+        self.elements = list(elements)
+        self.lost_at = -_np.ones(n_particles, dtype=int)
+        self.unidentified = {}
+        self._chunks = []
+        self._records = None
+
+    def record(
+        self,
+        element_index: Union[int, _np.ndarray],
+        ids: _np.ndarray,
+        s: Union[float, _np.ndarray] = 0.0,
+        coordinates: Optional[_np.ndarray] = None,
+    ):
+        """
+        Record the particles lost at a given element.
+
+        Args:
+            element_index: the index of the element in the beamline (or one index per lost particle)
+            ids: the identifiers of the lost particles (-1 for the particles that are not identified anymore)
+            s: the longitudinal position of the losses (in meters)
+            coordinates: the coordinates of the lost particles
+        """
+        if ids.shape[0] == 0:
+            return
+        element_index = _np.broadcast_to(_np.asarray(element_index, dtype=int), ids.shape)
+        identified = ids >= 0
+        self.lost_at[ids[identified]] = element_index[identified]
+        self._chunks.append(
+            (
+                ids,
+                _np.array(element_index),
+                _np.array(_np.broadcast_to(s, ids.shape), dtype=float),
+                coordinates[:, :6] if self.with_coordinates and coordinates is not None else None,
+            ),
+        )
+        self._records = None
+
+    def record_unidentified(self, element_index: int, n: int):
+        """
+        Record a number of particles lost at a given element without identifying them.
+
+        Args:
+            element_index: the index of the element in the beamline
+            n: the number of lost particles
+        """
+        if n > 0:
+            self.unidentified[element_index] = self.unidentified.get(element_index, 0) + n
+
+    @property
+    def records(self) -> Tuple[_np.ndarray, _np.ndarray, _np.ndarray, Optional[_np.ndarray]]:
+        """The identifiers, element indices, positions and coordinates (if recorded) of all the recorded losses."""
+        if self._records is None:
+            if len(self._chunks) == 0:
+                self._records = (
+                    _np.zeros(0, dtype=int),
+                    _np.zeros(0, dtype=int),
+                    _np.zeros(0),
+                    _np.zeros((0, 6)) if self.with_coordinates else None,
+                )
+            else:
+                ids, indices, s, coordinates = zip(*self._chunks)
+                self._records = (
+                    _np.concatenate(ids),
+                    _np.concatenate(indices),
+                    _np.concatenate(s),
+                    _np.concatenate(coordinates) if all(c is not None for c in coordinates) else None,
+                )
+                self._chunks = [self._records]
+        return self._records
+
+    @property
+    def ids(self) -> _np.ndarray:
+        """The identifiers of the recorded lost particles."""
+        return self.records[0]
+
+    @property
+    def element_indices(self) -> _np.ndarray:
+        """The index of the element where each recorded particle is lost."""
+        return self.records[1]
+
+    @property
+    def s(self) -> _np.ndarray:
+        """The longitudinal position (in meters) where each recorded particle is lost."""
+        return self.records[2]
+
+    @property
+    def coordinates(self) -> Optional[_np.ndarray]:
+        """The coordinates of each recorded particle where it is lost."""
+        return self.records[3]
+
+    @property
+    def n_lost(self) -> int:
+        """The total number of lost particles."""
+        return int(self.ids.shape[0]) + sum(self.unidentified.values())
+
+    def lost_particles(self, element: Optional[str] = None) -> _np.ndarray:
+        """
+        The identifiers (index in the initial distribution) of the lost particles.
+
+        Args:
+            element: only return the particles lost at this element
+
+        Returns:
+            the identifiers of the lost particles
+        """
+        if element is None:
+            return _np.flatnonzero(self.lost_at >= 0)
+        return _np.flatnonzero(self.lost_at == self.elements.index(element))
+
+    def counts(self) -> _pd.Series:
+        """
+        The number of particles lost at each element.
+
+        Returns:
+            a pandas Series indexed by the element names
+        """
+        counts = _np.bincount(self.element_indices, minlength=len(self.elements))
+        for k, v in self.unidentified.items():
+            counts[k] += v
+        return _pd.Series(counts, index=self.elements, name="LOSSES")
+
+    def to_df(self) -> _pd.DataFrame:
+        """
+        All the recorded losses, one row per lost particle.
+
+        Returns:
+            a pandas DataFrame with the identifier, the element, the position and the coordinates of the losses
+        """
+        ids, indices, s, coordinates = self.records
+        df = _pd.DataFrame(
+            {
+                "ID": ids,
+                "ELEMENT": _np.array(self.elements, dtype=object)[indices] if len(self.elements) else [],
+                "S": s,
+            },
+        )
+        if coordinates is not None:
+            df[COORDINATES] = coordinates
+        return df
+
+    def histogram(
+        self,
+        bins: Union[int, _np.ndarray] = 100,
+        s_range: Optional[Tuple[float, float]] = None,
+        normalize: bool = False,
+    ) -> Tuple[_np.ndarray, _np.ndarray]:
+        """
+        Histogram of the longitudinal position of the recorded losses (loss map).
+
+        Args:
+            bins: number of bins or bin edges (in meters)
+            s_range: range of the histogram (in meters)
+            normalize: return the fraction of the initial particles lost in each bin instead of the counts
+
+        Returns:
+            the histogram and the bin edges
+        """
+        h, edges = _np.histogram(self.s, bins=bins, range=s_range)
+        if normalize and self.lost_at.shape[0] > 0:
+            h = h / self.lost_at.shape[0]
+        return h, edges
+
+    def histogram2d(
+        self,
+        x: str = "X",
+        y: str = "Y",
+        element: Optional[str] = None,
+        bins: Union[int, Tuple[int, int]] = 50,
+        ranges: Optional[Tuple[Tuple[float, float], Tuple[float, float]]] = None,
+    ) -> Tuple[_np.ndarray, _np.ndarray, _np.ndarray]:
+        """
+        Two-dimensional histogram of the coordinates of the lost particles (e.g. transverse loss distribution).
+
+        Args:
+            x: the coordinate along the first axis (X, PX, Y, PY, DPP, PT or S)
+            y: the coordinate along the second axis (X, PX, Y, PY, DPP, PT or S)
+            element: only histogram the particles lost at this element
+            bins: number of bins (for each axis)
+            ranges: ranges of the histogram
+
+        Returns:
+            the histogram and the bin edges along each axis
+        """
+        df = self.to_df()
+        if element is not None:
+            df = df[df["ELEMENT"] == element]
+        return _np.histogram2d(df[x].values, df[y].values, bins=bins, range=ranges)
@@ -9,9 +9,17 @@ for the three different integrator types, so the definition of the beam must be
 the integrator to be consistent.
 """
 
-from .mad8_combined_dipole import compute_mad_combined_dipole_matrix, compute_mad_combined_dipole_tensor
-from .mad8_drift import compute_mad_drift_matrix, compute_mad_drift_tensor, drift6
-from .mad8_quadrupole import compute_mad_quadrupole_matrix, compute_mad_quadrupole_tensor
+from .mad8_combined_dipole import (
+    compute_mad_combined_dipole_matrix,
+    compute_mad_combined_dipole_matrix_derivatives,
+    compute_mad_combined_dipole_tensor,
+)
+from .mad8_drift import compute_mad_drift_matrix, compute_mad_drift_matrix_derivatives, compute_mad_drift_tensor, drift6
+from .mad8_quadrupole import (
+    compute_mad_quadrupole_matrix,
+    compute_mad_quadrupole_matrix_derivatives,
+    compute_mad_quadrupole_tensor,
+)
 from .madx_combined_dipole import tmsect
 from .madx_thick import (
     track_madx_bend,
@@ -24,6 +32,7 @@ from .madx_thick import (
 )
 from .transport_combined_dipole import (
     compute_transport_combined_dipole_matrix,
+    compute_transport_combined_dipole_matrix_derivatives,
     compute_transport_combined_dipole_tensor,
 )
 from .transport_combined_dipole_ex import (
@@ -37,7 +46,11 @@ from .transport_fringe_out import compute_transport_fringe_out_matrix, compute_t
 from .transport_fringe_out_ex import compute_transport_fringe_out_ex_matrix, compute_transport_fringe_out_ex_tensor
 from .transport_multipole import compute_transport_multipole_matrix, compute_transport_multipole_tensor
 from .transport_multipole_ex import compute_transport_multipole_ex_matrix, compute_transport_multipole_ex_tensor
-from .transport_quadrupole import compute_transport_quadrupole_matrix, compute_transport_quadrupole_tensor
+from .transport_quadrupole import (
+    compute_transport_quadrupole_matrix,
+    compute_transport_quadrupole_matrix_derivatives,
+    compute_transport_quadrupole_tensor,
+)
 from .transport_quadrupole_ex import compute_transport_quadrupole_ex_matrix, compute_transport_quadrupole_ex_tensor
 from .transport_sextupole import compute_transport_sextupole_matrix, compute_transport_sextupole_tensor
 from .transport_sextupole_ex import compute_transport_sextupole_ex_matrix, compute_transport_sextupole_ex_tensor
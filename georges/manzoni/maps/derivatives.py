@@ -0,0 +1,120 @@
+"""
+Derivatives of the first-order transfer matrices with respect to the parameters of the elements. The matrices of
+the drifts, quadrupoles and combined-function dipoles are all built from the principal trajectories C, S, the
+dispersion function D and the integral J = (L - S) / K of each plane, whose derivatives are known in closed form.
+They are used by the jitted companions `compute_*_matrix_derivatives` of the matrix functions.
+"""
+import numpy as np
+from numba import njit
+
+SERIES_THRESHOLD: float = 1e-2
+"""Below this value of |K L**2|, the functions and their derivatives are evaluated with their power series."""
+
+
+@njit(cache=True)
+def focusing_functions(k: float, length: float):
+    """
+    The functions C, S, D and J of a plane with a focusing strength k, and their derivatives with respect to k.
+    The derivatives with respect to the length follow from C' = -k S, S' = C, D' = S and J' = D.
+
+    Args:
+        k: the focusing strength (positive if focusing)
+        length: the length
+
+    Returns:
+        the values (C, S, D, J) and their derivatives with respect to k
+    """
+    f = np.zeros(4)
+    df = np.zeros(4)
+    u = k * length**2
+    if abs(u) < SERIES_THRESHOLD:
+        for m in range(4):
+            factorial = 1.0
+            for i in range(1, m + 1):
+                factorial *= i
+            power = 1.0
+            for n in range(8):
+                if n > 0:
+                    factorial *= (2 * n + m - 1) * (2 * n + m)
+                    df[m] += -n * power / factorial
+                    power *= -u
+                f[m] += power / factorial
+            f[m] *= length**m
+            df[m] *= length ** (m + 2)
+        return f, df
+    if k > 0:
+        q = np.sqrt(k)
+        f[0] = np.cos(q * length)
+        f[1] = np.sin(q * length) / q
+    else:
+        q = np.sqrt(-k)
+        f[0] = np.cosh(q * length)
+        f[1] = np.sinh(q * length) / q
+    f[2] = (1 - f[0]) / k
+    f[3] = (length - f[1]) / k
+    df[0] = -length * f[1] / 2
+    df[1] = (length * f[0] - f[1]) / (2 * k)
+    df[2] = (length * f[1] / 2 - f[2]) / k
+    df[3] = -(df[1] + f[3]) / k
+    return f, df
+
+
+@njit(cache=True)
+def combined_dipole_matrix_derivatives(
+    length: float,
+    h: float,
+    k1: float,
+    beta: float,
+    gamma: float,
+    path_length: bool,
+) -> np.ndarray:
+    """
+    Derivatives of the transfer matrix of a combined-function dipole (a quadrupole if h = 0), with the horizontal
+    focusing h**2 + k1 and the vertical focusing -k1.
+
+    Args:
+        length: the length of the element
+        h: the curvature
+        k1: the normalized gradient
+        beta: the relativistic beta (dividing the dispersion terms)
+        gamma: the relativistic gamma
+        path_length: include the derivatives of the path length row (MAD conventions)
+
+    Returns:
+        the derivatives with respect to the length (at constant curvature), the curvature and the gradient
+    """
+    kx = h**2 + k1
+    ky = -k1
+    fx, dfx = focusing_functions(kx, length)
+    fy, dfy = focusing_functions(ky, length)
+    derivatives = np.zeros((3, 6, 6))
+    for p in range(3):
+        dl, dh, dkx, dky = 0.0, 0.0, 0.0, 0.0
+        if p == 0:
+            dl = 1.0
+        elif p == 1:
+            dh, dkx = 1.0, 2 * h
+        else:
+            dkx, dky = 1.0, -1.0
+        dcx = dfx[0] * dkx - kx * fx[1] * dl
+        dsx = dfx[1] * dkx + fx[0] * dl
+        ddx = dfx[2] * dkx + fx[1] * dl
+        djx = dfx[3] * dkx + fx[2] * dl
+        dcy = dfy[0] * dky - ky * fy[1] * dl
+        dsy = dfy[1] * dky + fy[0] * dl
+        R = derivatives[p]
+        R[0, 0] = dcx
+        R[0, 1] = dsx
+        R[0, 5] = (dh * fx[2] + h * ddx) / beta
+        R[1, 0] = -(dkx * fx[1] + kx * dsx)
+        R[1, 1] = dcx
+        R[1, 5] = (dh * fx[1] + h * dsx) / beta
+        R[2, 2] = dcy
+        R[2, 3] = dsy
+        R[3, 2] = -(dky * fy[1] + ky * dsy)
+        R[3, 3] = dcy
+        if path_length:
+            R[4, 0] = -R[1, 5]
+            R[4, 1] = -R[0, 5]
+            R[4, 5] = -(2 * h * dh * fx[3] + h**2 * djx) / beta**2 + dl / (beta**2 * gamma**2)
+    return derivatives
@@ -3,6 +3,8 @@
 import numpy as np
 from numba import njit
 
+from .derivatives import combined_dipole_matrix_derivatives
+
 
 @njit(cache=True)
 def compute_mad_combined_dipole_matrix(element_parameters: list, global_parameters: list) -> np.ndarray:
@@ -310,3 +312,31 @@ def compute_mad_combined_dipole_tensor(element_parameters: list, global_paramete
     T[4, 3, 3] = (h**2 * j1) / (2 * beta) - (h * jf * k2) / beta - (L + cy * sy) / (4 * beta)
 
     return T
+
+
+@njit(cache=True)
+def compute_mad_combined_dipole_matrix_derivatives(element_parameters: list, global_parameters: list) -> np.ndarray:
+    L: float = element_parameters[0]
+    alpha: float = element_parameters[1]
+    k1: float = element_parameters[2]
+    beta: float = global_parameters[0]
+    gamma = 1 / np.sqrt(1 - beta**2)
+    h = alpha / L
+    dR = np.zeros((len(element_parameters), 6, 6))
+    derivatives = combined_dipole_matrix_derivatives(L, h, k1, beta, gamma, True)
+    # The curvature is h = alpha / L
+    dR[0] = derivatives[0] - h / L * derivatives[1]
+    dR[1] = derivatives[1] / L
+    dR[2] = derivatives[2]
+
+    # Same truncated series of the integral J1 as the matrix
+    kx2 = h**2 + k1
+    if kx2 * L**2 < 1e-2:
+        j1 = L**3 / 6 - (kx2 * L**5) / 120 + (kx2**2 * L**7) / 5040
+        dj1_dl = L**2 / 2 - (kx2 * L**4) / 24 + (kx2**2 * L**6) / 720
+        dj1_dk = -(L**5) / 120 + (2 * kx2 * L**7) / 5040
+        for i, dl, dh in [(0, 1.0, -h / L), (1, 0.0, 1 / L), (2, 0.0, 0.0)]:
+            dkx2 = 2 * h * dh + (1.0 if i == 2 else 0.0)
+            dj1 = dj1_dl * dl + dj1_dk * dkx2
+            dR[i, 4, 5] = -(2 * h * dh * j1 + h**2 * dj1) / beta**2 + dl / (beta**2 * gamma**2)
+    return dR
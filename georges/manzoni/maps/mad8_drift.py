@@ -102,3 +102,14 @@ def compute_mad_drift_tensor(element_parameters: list, **_) -> _np.ndarray:
     T = _np.zeros((6, 6, 6))
 
     return T
+
+
+@njit(cache=True)
+def compute_mad_drift_matrix_derivatives(element_parameters: list, **_) -> _np.ndarray:
+    dR = _np.zeros((len(element_parameters), 6, 6))
+
+    # Derivatives with respect to the length
+    dR[0, 0, 1] = 1
+    dR[0, 2, 3] = 1
+
+    return dR
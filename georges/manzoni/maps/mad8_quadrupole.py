@@ -1,6 +1,8 @@
 import numpy as np
 from numba import njit
 
+from .derivatives import combined_dipole_matrix_derivatives
+
 
 @njit(cache=True)
 def compute_mad_quadrupole_matrix(element_parameters: list, global_parameters: list) -> np.ndarray:
@@ -93,3 +95,14 @@ def compute_mad_quadrupole_tensor(element_parameters: list, global_parameters: l
     T[4, 5, 5] = (-3 * L) / (2 * beta**3 * gamma**2)
 
     return T
+
+
+@njit(cache=True)
+def compute_mad_quadrupole_matrix_derivatives(element_parameters: list, global_parameters: list) -> np.ndarray:
+    L: float = element_parameters[0]
+    k1: float = element_parameters[1]
+    dR = np.zeros((len(element_parameters), 6, 6))
+    derivatives = combined_dipole_matrix_derivatives(L, 0.0, k1, 1.0, 1.0, False)
+    dR[0] = derivatives[0]
+    dR[1] = derivatives[2]
+    return dR
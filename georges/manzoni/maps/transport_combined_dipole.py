@@ -3,6 +3,8 @@ from numba import njit
 from numba.typed import List as nList
 from numpy import cos, cosh, sin, sinh, sqrt
 
+from .derivatives import combined_dipole_matrix_derivatives
+
 
 @njit(cache=True)
 def compute_transport_combined_dipole_matrix(
@@ -193,3 +195,20 @@ def compute_transport_combined_dipole_tensor(
             T[3, 1, 3] = sin(L * h)
             T[3, 3, 5] = 1 - cos(L * h)
     return T
+
+
+@njit(cache=True)
+def compute_transport_combined_dipole_matrix_derivatives(
+    element_parameters: nList,
+) -> np.ndarray:
+    L: float = element_parameters[0]
+    alpha: float = element_parameters[1]
+    h = alpha / L
+    k1: float = element_parameters[2]
+    dR = np.zeros((len(element_parameters), 6, 6))
+    derivatives = combined_dipole_matrix_derivatives(L, h, k1, 1.0, 1.0, False)
+    # The curvature is h = alpha / L
+    dR[0] = derivatives[0] - h / L * derivatives[1]
+    dR[1] = derivatives[1] / L
+    dR[2] = derivatives[2]
+    return dR
@@ -3,6 +3,8 @@ from numba import njit
 from numba.typed import List as nList
 from numpy import cos, cosh, sin, sinh, sqrt
 
+from .derivatives import combined_dipole_matrix_derivatives
+
 
 @njit(cache=True)
 def compute_transport_quadrupole_matrix(element_parameters: nList) -> np.ndarray:
@@ -63,3 +65,14 @@ def compute_transport_quadrupole_tensor(element_parameters: nList) -> np.ndarray
         T[3, 2, 5] = -L * k1 * cos(L * sqrt(-k1)) / 2 + sqrt(-k1) * sin(L * sqrt(-k1)) / 2
         T[3, 3, 5] = L * sqrt(-k1) * sin(L * sqrt(-k1)) / 2
     return T
+
+
+@njit(cache=True)
+def compute_transport_quadrupole_matrix_derivatives(element_parameters: nList) -> np.ndarray:
+    L: float = element_parameters[0]
+    k1: float = element_parameters[1]
+    dR = np.zeros((len(element_parameters), 6, 6))
+    derivatives = combined_dipole_matrix_derivatives(L, 0.0, k1, 1.0, 1.0, False)
+    dR[0] = derivatives[0]
+    dR[1] = derivatives[2]
+    return dR
@@ -1,17 +1,116 @@
-from typing import List, Optional
+import csv
+import os
+from typing import List, Optional, Tuple, Union
 
 import numpy as _np
 import pandas as _pd
-from georges_core.distribution import Distribution
+from georges_core import ureg as _ureg
 from lmfit import Model, Parameters
 from numba import njit
 
+from .kernels import beam_histogram, beam_histogram2d, beam_moments, beam_quantiles
+from .losses import COORDINATES
+
 
 class ObserverType(type):
     pass
 
 
+class BeamMoments:
+    """
+    Moments (number of particles, mean and covariance) of the beams at the entrance and at the exit of one element,
+    computed at their first use. The tracking creates one instance per element and gives it to all the observers
+    using the moments (see `notify`), so that the beams are reduced only once per element whatever the number of
+    observers deriving their values from the moments.
+    """
+
+    def __init__(self, b1: _np.ndarray, b2: _np.ndarray):
+        self._beams = (b1, b2)
+        self._moments = None
+
+    def __call__(self) -> Tuple[Tuple[int, _np.ndarray, _np.ndarray], Tuple[int, _np.ndarray, _np.ndarray]]:
+        """
+
+        Returns:
+            the number of particles, the mean and the covariance of the beam coordinates at the entrance and
+            at the exit of the element
+        """
+        if self._moments is None:
+            self._moments = tuple((b.shape[0], *beam_moments(b, min(6, b.shape[1]))) for b in self._beams)
+            self._beams = None
+        return self._moments
+
+
+def notify(observers: List, element, b1: _np.ndarray, b2: _np.ndarray):
+    """
+    Call the observers with the beams at the entrance and at the exit of an element. The moments of the beams are
+    computed once and shared by the observers using them.
+
+    Args:
+        observers: the observers, or any callable taking the element and the beams (None entries are skipped)
+        element: the tracked element
+        b1: the beam at the entrance of the element
+        b2: the beam at the exit of the element
+    """
+    moments = BeamMoments(b1, b2)
+    for o in observers:
+        if o is None:
+            continue
+        if getattr(o, "USES_MOMENTS", False):
+            o(element, b1, b2, moments)
+        else:
+            o(element, b1, b2)
+
+
+def finalize(observers: List):
+    """
+    Finalize the observers at the end of a tracking (see `Observer.finalize`).
+
+    Args:
+        observers: the observers, the callables without a `finalize` method are skipped
+    """
+    for o in observers:
+        if o is not None and hasattr(o, "finalize"):
+            o.finalize()
+
+
+def _twiss(n: int, covariance: _np.ndarray) -> _np.ndarray:
+    """
+    Twiss parameters of a beam from the covariance matrix of its coordinates, following
+    `georges_core.Distribution.compute_twiss`.
+
+    Args:
+        n: the number of particles
+        covariance: the (population) covariance matrix of X, PX, Y, PY and DPP
+
+    Returns:
+        the emittance, beta, alpha, dispersion and dispersion prime in X and in Y
+    """
+    s = covariance
+    if s[4, 4] == 0:
+        # Unbiased estimate of the emittance, as numpy.cov in georges_core
+        correction = n / (n - 1) if n > 1 else _np.nan
+        twiss = []
+        for i in (0, 2):
+            emit = _np.sqrt((s[i, i] * s[i + 1, i + 1] - s[i, i + 1] ** 2) * correction**2)
+            twiss += [emit, s[i, i] / emit, -s[i, i + 1] * correction / emit, 0, 0]
+        return _np.array(twiss)
+    twiss = []
+    for i in (0, 2):
+        disp = s[i, 4] / s[4, 4]
+        disp_p = s[i + 1, 4] / s[4, 4]
+        ebeta = s[i, i] - s[i, 4] ** 2 / s[4, 4]
+        egamma = s[i + 1, i + 1] - s[i + 1, 4] ** 2 / s[4, 4]
+        ealpha = -s[i, i + 1] + s[i + 1, 4] * s[i, 4] / s[4, 4]
+        emit = _np.sqrt(ebeta * egamma - ealpha**2)
+        twiss += [emit, ebeta / emit, ealpha / emit, disp, disp_p]
+    return _np.array(twiss)
+
+
 class Observer(metaclass=ObserverType):
+    USES_MOMENTS = False
+    """Whether the observer accepts the shared `BeamMoments` of the element as a fourth argument."""
+
     def __init__(self, elements):
         self.elements = elements
         self.data = []
@@ -25,6 +124,10 @@ class Observer(metaclass=ObserverType):
         else:
             return True
 
+    def finalize(self):
+        """Called at the end of each tracking, e.g. to close the files written by the observer."""
+        pass
+
     def to_df(self) -> _pd.DataFrame:
         return _pd.DataFrame(self.data, columns=self.headers).set_index("NAME")
 
@@ -61,6 +164,263 @@ class BeamObserver(Observer):
                 ),
             )
 
+    def _rows(self):
+        return self.data
+
+    def _beam(self, stored):
+        return stored
+
+    def snapshot(self, element: Optional[str] = None, location: str = "OUT") -> Tuple[_ureg.Quantity, _np.ndarray]:
+        """
+        The beam observed at one element, without building the dataframe of all the observed beams.
+
+        Args:
+            element: the name of the element (the first observed element if None)
+            location: "IN" for the beam at the entrance of the element, "OUT" for the beam at its exit
+
+        Returns:
+            the position (entry or exit of the element) and the beam distribution
+        """
+        for row in self._rows():
+            if element is None or row[0] == element:
+                if location == "IN":
+                    return row[1], self._beam(row[4])
+                return row[3], self._beam(row[5])
+        raise KeyError(element)
+
+
+class _Store:
+    """
+    Directory holding the rows of an observer. The rows are streamed to an index file (CSV) kept open during the
+    tracking and closed at its end (see `Observer.finalize`): the positions are saved in meters and the arrays
+    (beams, covariance matrices, ...) to `.npy` files of the directory, loaded lazily as read-only memory maps.
+    """
+
+    INDEX = "index.csv"
+    POSITIONS = ("AT_ENTRY", "AT_CENTER", "AT_EXIT")
+
+    def __init__(self, path: str, headers: Optional[Tuple[str, ...]] = None, overwrite: bool = False):
+        """
+
+        Args:
+            path: the directory of the store
+            headers: the headers of the rows of a new store, None to open the store of a previous tracking
+            overwrite: replace the store previously saved in the directory (an error is raised otherwise)
+        """
+        self.path = path
+        self._file = None
+        self._writer = None
+        self._rows = 0
+        index = os.path.join(path, self.INDEX)
+        if headers is None:
+            self.headers = tuple(_pd.read_csv(index, nrows=0).columns)
+            return
+        self.headers = tuple(headers)
+        if os.path.exists(index):
+            if not overwrite:
+                raise FileExistsError(
+                    f"{path} already holds the store of an observer, use overwrite=True to replace it.",
+                )
+            for row in self.read():
+                for f in row:
+                    if isinstance(f, str) and f.endswith(".npy") and os.path.exists(os.path.join(path, f)):
+                        os.remove(os.path.join(path, f))
+            os.remove(index)
+        os.makedirs(path, exist_ok=True)
+        with open(index, "w", newline="") as f:
+            csv.writer(f).writerow(self.headers)
+
+    def write(self, row: Tuple):
+        """Append a row to the index (opened if needed), the arrays of the row are saved to their own files."""
+        if self._file is None:
+            self._file = open(os.path.join(self.path, self.INDEX), "a", newline="")
+            self._writer = csv.writer(self._file)
+        cells = []
+        for header, value in zip(self.headers, row):
+            if value is None:
+                value = ""
+            elif header in self.POSITIONS:
+                value = value.m_as("m")
+            elif isinstance(value, _np.ndarray):
+                f = f"{self._rows:06d}_{header}.npy"
+                _np.save(os.path.join(self.path, f), value)
+                value = f
+            cells.append(value)
+        self._writer.writerow(cells)
+        self._rows += 1
+
+    def read(self) -> List[Tuple]:
+        """The rows of the index, with the positions as quantities and the file names of the arrays."""
+        if self._file is not None:
+            self._file.flush()
+        df = _pd.read_csv(
+            os.path.join(self.path, self.INDEX),
+            dtype={"NAME": str},
+            keep_default_na=False,
+            na_values=["nan"],
+        )
+        return [
+            tuple(
+                v * _ureg.m if h in self.POSITIONS else (None if v == "" else v)
+                for h, v in zip(self.headers, r)
+            )
+            for r in df.itertuples(index=False)
+        ]
+
+    def load(self, value):
+        """The array saved in a file of the store (as a read-only memory map), other values are returned as is."""
+        if isinstance(value, str) and value.endswith(".npy"):
+            return _np.load(os.path.join(self.path, value), mmap_mode="r")
+        return value
+
+    def close(self):
+        """Close the index, it is opened again by the next row."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+class PersistentBeamObserver(BeamObserver):
+    """
+
+    Save the beam distribution at the exit of the elements (optionnaly at their entrance) to a directory of `.npy`
+    files as the tracking proceeds, instead of keeping the beams in memory. The observed positions are streamed to an
+    index file of the directory, closed at the end of each tracking (see `finalize`, to be called when the observer
+    is used outside of a tracking). The beams are loaded lazily, as read-only memory maps, by element name.
+
+    Examples:
+        >>> observer = PersistentBeamObserver("beams", with_input_beams=True)  # doctest: +SKIP
+        >>> mi.track(beam=beam, observers=observer)  # doctest: +SKIP
+        >>> position, b = PersistentBeamObserver.load("beams").snapshot("Q1")  # doctest: +SKIP
+    """
+
+    def __init__(
+        self,
+        path: str,
+        elements: Optional[List[str]] = None,
+        with_input_beams: bool = False,
+        overwrite: bool = False,
+        read_only: bool = False,
+    ):
+        """
+
+        Args:
+            path: the directory of the store
+            elements: the observed elements (all the elements if None)
+            with_input_beams: save also the beams at the entrance of the elements
+            overwrite: replace the store previously saved in the directory (an error is raised otherwise)
+            read_only: open the store of a previous tracking instead of creating a new store
+        """
+        super().__init__(elements, with_input_beams)
+        self.path = path
+        self._store = _Store(path, None if read_only else self.headers, overwrite)
+
+    @classmethod
+    def load(cls, path: str) -> "PersistentBeamObserver":
+        """
+        Open the store of a previous tracking.
+
+        Args:
+            path: the directory of the store
+
+        Returns:
+            the observer of the store (the beams are not loaded)
+        """
+        return cls(path, read_only=True)
+
+    def __call__(self, element, b1, b2):
+        if Observer.__call__(self, element, b1, b2):
+            self._store.write(
+                (
+                    element.NAME,
+                    element.AT_ENTRY,
+                    element.AT_CENTER,
+                    element.AT_EXIT,
+                    b1 if self._with_input_beams else None,
+                    b2,
+                ),
+            )
+
+    def finalize(self):
+        """Close the index of the store, at the end of the tracking."""
+        self._store.close()
+
+    def _rows(self):
+        return self._store.read()
+
+    def _beam(self, stored):
+        return self._store.load(stored)
+
+    def to_df(self) -> _pd.DataFrame:
+        """The observed positions, with the beams as read-only memory maps."""
+        return _pd.DataFrame(
+            [(*row[:4], self._beam(row[4]), self._beam(row[5])) for row in self._rows()],
+            columns=self.headers,
+        ).set_index("NAME")
+
+
+class PersistentObserver(Observer):
+    """
+
+    Stream the rows of an observer (mean, sigma, Twiss parameters, ...) to a directory as the tracking proceeds,
+    instead of accumulating them in memory. The scalar values are written to an index file of the directory and the
+    arrays to `.npy` files, loaded lazily as read-only memory maps.
+
+    Examples:
+        >>> sigma = PersistentObserver("sigma", SigmaObserver())  # doctest: +SKIP
+        >>> mi.track(beam=beam, observers=sigma)  # doctest: +SKIP
+        >>> PersistentObserver.load("sigma").to_df()  # doctest: +SKIP
+    """
+
+    def __init__(self, path: str, observer: Optional[Observer] = None, overwrite: bool = False):
+        """
+
+        Args:
+            path: the directory of the store
+            observer: the observer whose rows are saved, None to open the store of a previous tracking
+            overwrite: replace the store previously saved in the directory (an error is raised otherwise)
+        """
+        super().__init__(None if observer is None else observer.elements)
+        self.observer = observer
+        self.USES_MOMENTS = getattr(observer, "USES_MOMENTS", False)
+        self._store = _Store(path, None if observer is None else observer.headers, overwrite)
+        self.headers = self._store.headers
+
+    @classmethod
+    def load(cls, path: str) -> "PersistentObserver":
+        """
+        Open the store of a previous tracking.
+
+        Args:
+            path: the directory of the store
+
+        Returns:
+            the observer of the store
+        """
+        return cls(path)
+
+    def __call__(self, element, b1, b2, moments: Optional[BeamMoments] = None):
+        if self.USES_MOMENTS:
+            self.observer(element, b1, b2, moments)
+        else:
+            self.observer(element, b1, b2)
+        for row in self.observer.data:
+            self._store.write(row)
+        self.observer.data.clear()
+
+    def finalize(self):
+        """Close the index of the store, at the end of the tracking."""
+        self.observer.finalize()
+        self._store.close()
+
+    def to_df(self) -> _pd.DataFrame:
+        """The rows of the store, with the arrays as read-only memory maps."""
+        return _pd.DataFrame(
+            [tuple(self._store.load(v) for v in row) for row in self._store.read()],
+            columns=self.headers,
+        ).set_index("NAME")
+
 
 class SuperObserver(Observer):
     def __init__(self, elements: Optional[List[str]] = None):
@@ -84,6 +444,8 @@ class MeanObserver(Observer):
 
     """
 
+    USES_MOMENTS = True
+
     def __init__(self, elements: Optional[List[str]] = None):
         super().__init__(elements)
         self.headers = (
@@ -103,24 +465,16 @@ class MeanObserver(Observer):
             "BEAM_OUT_DPP",
         )
 
-    def __call__(self, element, b1, b2):
+    def __call__(self, element, b1, b2, moments: Optional[BeamMoments] = None):
         if super().__call__(element, b1, b2):
+            (_, mean_in, _), (_, mean_out, _) = (moments or BeamMoments(b1, b2))()
             self.data.append(
                 (
                     element.NAME,
                     element.AT_ENTRY,
                     element.AT_CENTER,
                     element.AT_EXIT,
-                    b1[:, 0].mean(),
-                    b2[:, 0].mean(),
-                    b1[:, 2].mean(),
-                    b2[:, 2].mean(),
-                    b1[:, 1].mean(),
-                    b2[:, 1].mean(),
-                    b1[:, 3].mean(),
-                    b2[:, 3].mean(),
-                    b1[:, 4].mean(),
-                    b2[:, 4].mean(),
+                    *_np.stack([mean_in[[0, 2, 1, 3, 4]], mean_out[[0, 2, 1, 3, 4]]], axis=1).flatten(),
                 ),
             )
 
@@ -132,6 +486,8 @@ class SigmaObserver(Observer):
 
     """
 
+    USES_MOMENTS = True
+
     def __init__(self, elements: Optional[List[str]] = None):
         super().__init__(elements)
         self.headers = (
@@ -151,24 +507,18 @@ class SigmaObserver(Observer):
             "BEAM_OUT_DPP",
         )
 
-    def __call__(self, element, b1, b2):
+    def __call__(self, element, b1, b2, moments: Optional[BeamMoments] = None):
         if super().__call__(element, b1, b2):
+            (_, _, covariance_in), (_, _, covariance_out) = (moments or BeamMoments(b1, b2))()
+            sigma_in = _np.sqrt(_np.diag(covariance_in)[[0, 2, 1, 3, 4]])
+            sigma_out = _np.sqrt(_np.diag(covariance_out)[[0, 2, 1, 3, 4]])
             self.data.append(
                 (
                     element.NAME,
                     element.AT_ENTRY,
                     element.AT_CENTER,
                     element.AT_EXIT,
-                    b1[:, 0].std(),
-                    b2[:, 0].std(),
-                    b1[:, 2].std(),
-                    b2[:, 2].std(),
-                    b1[:, 1].std(),
-                    b2[:, 1].std(),
-                    b1[:, 3].std(),
-                    b2[:, 3].std(),
-                    b1[:, 4].std(),
-                    b2[:, 4].std(),
+                    *_np.stack([sigma_in, sigma_out], axis=1).flatten(),
                 ),
             )
 
@@ -230,6 +580,8 @@ class SymmetryObserver(Observer):
 
     """
 
+    USES_MOMENTS = True
+
     def __init__(self, elements: Optional[List[str]] = None):
         super().__init__(elements=elements)
 
@@ -242,15 +594,18 @@ class SymmetryObserver(Observer):
             "SYM_OUT",
         )
 
-    def __call__(self, element, b1, b2):
+    def __call__(self, element, b1, b2, moments: Optional[BeamMoments] = None):
+        (_, _, covariance_in), (_, _, covariance_out) = (moments or BeamMoments(b1, b2))()
+        sx_in, sy_in = _np.sqrt(covariance_in[0, 0]), _np.sqrt(covariance_in[2, 2])
+        sx_out, sy_out = _np.sqrt(covariance_out[0, 0]), _np.sqrt(covariance_out[2, 2])
         self.data.append(
             (
                 element.NAME,
                 element.AT_ENTRY,
                 element.AT_CENTER,
                 element.AT_EXIT,
-                abs(b1[:, 0].std() - b1[:, 2].std()) / (b1[:, 0].std() + b1[:, 2].std()),
-                abs(b2[:, 0].std() - b2[:, 2].std()) / (b2[:, 0].std() + b2[:, 2].std()),
+                abs(sx_in - sy_in) / (sx_in + sy_in),
+                abs(sx_out - sy_out) / (sx_out + sy_out),
             ),
         )
 
@@ -263,6 +618,8 @@ class TwissObserver(Observer):
 
     """
 
+    USES_MOMENTS = True
+
     def __init__(self, elements=None):
         super().__init__(elements)
         self.headers = (
@@ -292,11 +649,11 @@ class TwissObserver(Observer):
             "DISP_OUT_YP",
         )
 
-    def __call__(self, element, b1, b2):
+    def __call__(self, element, b1, b2, moments: Optional[BeamMoments] = None):
         if super().__call__(element, b1, b2):
-            # Do not use distribution but directly use numpy with numba
-            twiss_in = Distribution.compute_twiss(b1)
-            twiss_out = Distribution.compute_twiss(b2)
+            (n_in, _, covariance_in), (n_out, _, covariance_out) = (moments or BeamMoments(b1, b2))()
+            twiss_in = _twiss(n_in, covariance_in)
+            twiss_out = _twiss(n_out, covariance_out)
 
             self.data.append(
                 (
@@ -414,3 +771,200 @@ class IbaBpmObserver(Observer):
                     self.fit_bpm(b2[:, 2])[0],
                 ),
             )
+
+
+class MomentsObserver(Observer):
+    """
+
+    Compute the mean and the covariance matrix of the beam coordinates, at the entrance and at the exit of the
+    elements. The beam is reduced in a single (jitted) pass and never copied.
+
+    """
+
+    USES_MOMENTS = True
+
+    def __init__(self, elements: Optional[List[str]] = None):
+        super().__init__(elements)
+        self.headers = (
+            "NAME",
+            "AT_ENTRY",
+            "AT_CENTER",
+            "AT_EXIT",
+            "PARTICLES_IN",
+            "PARTICLES_OUT",
+            "MEAN_IN",
+            "MEAN_OUT",
+            "COVARIANCE_IN",
+            "COVARIANCE_OUT",
+        )
+
+    def __call__(self, element, b1, b2, moments: Optional[BeamMoments] = None):
+        if super().__call__(element, b1, b2):
+            (_, mean_in, covariance_in), (_, mean_out, covariance_out) = (moments or BeamMoments(b1, b2))()
+            self.data.append(
+                (
+                    element.NAME,
+                    element.AT_ENTRY,
+                    element.AT_CENTER,
+                    element.AT_EXIT,
+                    b1.shape[0],
+                    b2.shape[0],
+                    mean_in,
+                    mean_out,
+                    covariance_in,
+                    covariance_out,
+                ),
+            )
+
+
+class HistogramObserver(Observer):
+    """
+
+    Histogram one coordinate (or two coordinates) of the beam at the exit of the elements, on a fixed binning.
+    Only the counts are kept, their size does not depend on the number of particles.
+
+    """
+
+    def __init__(
+        self,
+        elements: Optional[List[str]] = None,
+        coordinates: Union[str, Tuple[str, str]] = "X",
+        bins: Union[int, Tuple[int, int]] = 100,
+        ranges: Union[Tuple[float, float], Tuple[Tuple[float, float], Tuple[float, float]]] = (-0.05, 0.05),
+    ):
+        """
+
+        Args:
+            elements: the observed elements (all the elements if None)
+            coordinates: the coordinate (X, PX, Y, PY, DPP or PT), or a pair of coordinates for a 2D histogram
+            bins: the number of bins (for each coordinate)
+            ranges: the range of the histogram (for each coordinate); the particles outside are not counted
+        """
+        super().__init__(elements)
+        self.coordinates = (coordinates,) if isinstance(coordinates, str) else tuple(coordinates)
+        self.bins = (bins,) * len(self.coordinates) if isinstance(bins, int) else tuple(bins)
+        self.ranges = (ranges,) * len(self.coordinates) if _np.ndim(ranges) == 1 else tuple(ranges)
+        self._columns = [COORDINATES.index(c) for c in self.coordinates]
+        self.headers = (
+            "NAME",
+            "AT_ENTRY",
+            "AT_CENTER",
+            "AT_EXIT",
+            "PARTICLES_OUT",
+            "HISTOGRAM",
+        )
+
+    @property
+    def edges(self) -> List[_np.ndarray]:
+        """The bin edges along each coordinate."""
+        return [_np.linspace(r[0], r[1], n + 1) for r, n in zip(self.ranges, self.bins)]
+
+    def __call__(self, element, b1, b2):
+        if super().__call__(element, b1, b2):
+            if len(self._columns) == 1:
+                histogram = beam_histogram(b2, self._columns[0], *self.ranges[0], self.bins[0])
+            else:
+                histogram = beam_histogram2d(b2, *self._columns, *self.ranges[0], *self.ranges[1], *self.bins)
+            self.data.append(
+                (
+                    element.NAME,
+                    element.AT_ENTRY,
+                    element.AT_CENTER,
+                    element.AT_EXIT,
+                    b2.shape[0],
+                    histogram,
+                ),
+            )
+
+
+class QuantileObserver(Observer):
+    """
+
+    Compute approximate quantiles of the beam coordinates at the exit of the elements, from a sketch of fixed size
+    of the distribution (see `kernels.beam_quantiles`).
+
+    """
+
+    def __init__(
+        self,
+        elements: Optional[List[str]] = None,
+        coordinates: Tuple[str, ...] = ("X", "Y"),
+        quantiles: Tuple[float, ...] = (0.05, 0.25, 0.5, 0.75, 0.95),
+        resolution: int = 4096,
+    ):
+        """
+
+        Args:
+            elements: the observed elements (all the elements if None)
+            coordinates: the coordinates (X, PX, Y, PY, DPP or PT)
+            quantiles: the quantiles (between 0 and 1)
+            resolution: the number of bins of the sketch, the error on the quantiles is bounded by the range of the
+                        coordinate divided by the resolution
+        """
+        super().__init__(elements)
+        self.coordinates = tuple(coordinates)
+        self.quantiles = _np.array(quantiles, dtype=float)
+        self.resolution = resolution
+        self.headers = ("NAME", "AT_ENTRY", "AT_CENTER", "AT_EXIT") + tuple(
+            f"BEAM_OUT_{c}_Q{100 * q:g}" for c in self.coordinates for q in self.quantiles
+        )
+
+    def __call__(self, element, b1, b2):
+        if super().__call__(element, b1, b2):
+            values = [
+                beam_quantiles(b2, COORDINATES.index(c), self.quantiles, self.resolution) for c in self.coordinates
+            ]
+            self.data.append(
+                (
+                    element.NAME,
+                    element.AT_ENTRY,
+                    element.AT_CENTER,
+                    element.AT_EXIT,
+                    *_np.concatenate(values),
+                ),
+            )
+
+
+class SampleObserver(Observer):
+    """
+
+    Keep a random sample of the beam at the exit of the elements, with a fixed budget of particles per element.
+
+    """
+
+    def __init__(self, elements: Optional[List[str]] = None, budget: int = 1000, seed: Optional[int] = None):
+        """
+
+        Args:
+            elements: the observed elements (all the elements if None)
+            budget: the maximum number of particles kept for each element
+            seed: the seed of the random generator
+        """
+        super().__init__(elements)
+        self.budget = budget
+        self._rng = _np.random.default_rng(seed)
+        self.headers = (
+            "NAME",
+            "AT_ENTRY",
+            "AT_CENTER",
+            "AT_EXIT",
+            "PARTICLES_OUT",
+            "BEAM_OUT",
+        )
+
+    def __call__(self, element, b1, b2):
+        if super().__call__(element, b1, b2):
+            if b2.shape[0] > self.budget:
+                sample = b2[_np.sort(self._rng.choice(b2.shape[0], size=self.budget, replace=False))]
+            else:
+                sample = _np.copy(b2)
+            self.data.append(
+                (
+                    element.NAME,
+                    element.AT_ENTRY,
+                    element.AT_CENTER,
+                    element.AT_EXIT,
+                    b2.shape[0],
+                    sample,
+                ),
+            )
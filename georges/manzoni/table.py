@@ -0,0 +1,226 @@
+"""
+The file `table.py` contains the `SequenceTable` class, a columnar (struct-of-arrays) representation of the
+parameters of the elements of a Manzoni `Input`. The numerical parameters of all the elements of a given class are
+stored in a single structured numpy array (one row per element, one field per parameter), as magnitudes expressed
+in the units of the default value of each parameter (meter, radian, 1/m**2, MeV, ...).
+
+The table is used to read and update the parameters of long beamlines without going through the pint attributes
+of each element. The rows of the elements whose parameters were set since they were read (see `Element.version`)
+are read again before being accessed, so that the table never gives stale values. `ElementView` gives a lightweight
+access to the row of a single element.
+"""
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as _np
+import pandas as _pd
+from georges_core import ureg as _ureg
+
+
+def _numeric_parameters(element_class: type) -> Dict[str, Any]:
+    """The numerical parameters of an element class, with the units of their default value."""
+    parameters = {}
+    for k, v in element_class.PARAMETERS.items():
+        default = v[0] if isinstance(v, tuple) else v
+        if isinstance(default, _ureg.Quantity):
+            parameters[k] = default.units
+        elif isinstance(default, (int, float)) and not isinstance(default, bool):
+            parameters[k] = None
+    return parameters
+
+
+def _magnitude(value: Any, units: Any) -> float:
+    if isinstance(value, _ureg.Quantity):
+        if units is None:
+            return value.m_as(_ureg.dimensionless)
+        if value._units == units._units:  # Avoid the conversion when the value is already in the right units
+            return float(value.magnitude)
+        return value.m_as(units)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _np.nan
+
+
+class ElementView:
+    """
+    Read-only view of the parameters of an element stored in a `SequenceTable`.
+
+    Examples:
+        >>> view = mi.table.view(mi.mapper["Q1"])  # doctest: +SKIP
+        >>> view.K1, view["L"]  # doctest: +SKIP
+        (2.0, 0.3)
+    """
+
+    __slots__ = ("name", "_data", "_row")
+
+    def __init__(self, name: str, data: _np.ndarray, row: int):
+        self.name = name
+        self._data = data
+        self._row = row
+
+    def __getitem__(self, parameter: str) -> float:
+        try:
+            return float(self._data[parameter][self._row])
+        except ValueError:
+            raise KeyError(parameter)
+
+    def __getattr__(self, parameter: str) -> float:
+        try:
+            return self[parameter]
+        except KeyError:
+            raise AttributeError(parameter)
+
+    @property
+    def parameters(self) -> List[str]:
+        """The names of the parameters of the element."""
+        return [k for k in self._data.dtype.names if k != "INDEX"]
+
+    def to_dict(self) -> Dict[str, float]:
+        return {k: self[k] for k in self.parameters}
+
+    def __repr__(self) -> str:
+        return f"ElementView({self.name}: {self.to_dict()})"
+
+
+class SequenceTable:
+    """
+    Struct-of-arrays storage of the numerical parameters of a sequence of Manzoni elements.
+
+    Attributes:
+        names: the names of the elements
+        classes: the class names of the elements
+        rows: the row of each element in the table of its class
+        data: the structured array of each element class (with an INDEX field giving the position in the sequence)
+        units: the units of the parameters of each element class (None for the dimensionless parameters)
+        versions: the version of each element when its row was read
+    """
+
+    def __init__(self, sequence: List):
+        """
+
+        Args:
+            sequence: the Manzoni elements
+        """
+        self.sequence = sequence
+        self.versions = _np.array([e.version for e in sequence], dtype=int)
+        self.names = _np.array([e.NAME for e in sequence], dtype=object)
+        self.classes = _np.array([e.__class__.__name__ for e in sequence], dtype=object)
+        self.rows = _np.zeros(len(sequence), dtype=int)
+        self.data: Dict[str, _np.ndarray] = {}
+        self.units: Dict[str, Dict[str, Any]] = {}
+        for class_name, indices in _pd.Series(self.classes).groupby(self.classes, sort=False).indices.items():
+            units = _numeric_parameters(sequence[indices[0]].__class__)
+            data = _np.zeros(len(indices), dtype=[("INDEX", int)] + [(k, float) for k in units])
+            data["INDEX"] = indices
+            for k, u in units.items():
+                data[k] = [_magnitude(sequence[i].attributes.get(k), u) for i in indices]
+            self.rows[indices] = _np.arange(len(indices))
+            self.data[class_name] = data
+            self.units[class_name] = units
+
+    def __len__(self) -> int:
+        return self.names.shape[0]
+
+    def sync(self, indices: Optional[Union[int, _np.ndarray]] = None):
+        """
+        Read again the rows of the elements whose parameters were set since their row was read.
+
+        Args:
+            indices: the indices of the elements to check (all the elements if None)
+        """
+        indices = _np.arange(len(self)) if indices is None else _np.atleast_1d(indices)
+        versions = _np.fromiter((self.sequence[i].version for i in indices), dtype=int, count=indices.shape[0])
+        for i in indices[versions != self.versions[indices]]:
+            self.refresh(i, self.sequence[i])
+
+    def view(self, index: int) -> ElementView:
+        """
+        A view of the parameters of an element.
+
+        Args:
+            index: the index of the element in the sequence
+
+        Returns:
+            the view of the element
+        """
+        self.sync(index)
+        return ElementView(self.names[index], self.data[self.classes[index]], self.rows[index])
+
+    def get(self, index: int, parameter: str) -> float:
+        """
+        The value of a parameter of an element (in the units of the default value of the parameter).
+
+        Args:
+            index: the index of the element in the sequence
+            parameter: the parameter
+
+        Returns:
+            the value of the parameter
+        """
+        self.sync(index)
+        return float(self.data[self.classes[index]][parameter][self.rows[index]])
+
+    def values(self, parameter: str) -> _np.ndarray:
+        """
+        The values of a parameter for all the elements of the sequence (NaN for the elements without this parameter).
+
+        Args:
+            parameter: the parameter
+
+        Returns:
+            an array with one value per element
+        """
+        self.sync()
+        values = _np.full(len(self), _np.nan)
+        for data in self.data.values():
+            if parameter in data.dtype.names:
+                values[data["INDEX"]] = data[parameter]
+        return values
+
+    def set(self, indices: Union[int, _np.ndarray], parameter: str, values: Union[float, _np.ndarray]):
+        """
+        Set a parameter of one or several elements (in the units of the default value of the parameter). The values
+        are set on the elements (see `Element.set_parameters`), so that they are tracked, and their rows are read again.
+
+        Args:
+            indices: the indices of the elements in the sequence
+            parameter: the parameter
+            values: the new values
+        """
+        indices = _np.atleast_1d(indices)
+        values = _np.broadcast_to(_np.asarray(values, dtype=float), indices.shape)
+        for i, v in zip(indices, values):
+            units = self.units[self.classes[i]]
+            if parameter not in units:
+                raise KeyError(parameter)
+            u = units[parameter]
+            self.sequence[i].set_parameters({parameter: float(v) if u is None else _ureg.Quantity(float(v), u)})
+        self.sync(indices)
+
+    def refresh(self, index: int, element):
+        """
+        Read again all the parameters of an element.
+
+        Args:
+            index: the index of the element in the sequence
+            element: the element
+        """
+        data = self.data[self.classes[index]]
+        for k, u in self.units[self.classes[index]].items():
+            data[k][self.rows[index]] = _magnitude(element.attributes.get(k), u)
+        self.versions[index] = element.version
+
+    def to_df(self) -> _pd.DataFrame:
+        """
+        The parameters of all the elements, without units.
+
+        Returns:
+            a pandas DataFrame indexed by the element names, with the class of the elements and one column per parameter
+        """
+        if len(self) == 0:
+            return _pd.DataFrame(columns=["CLASS"], index=_pd.Index([], name="NAME"))
+        self.sync()
+        df = _pd.concat([_pd.DataFrame(data).set_index("INDEX") for data in self.data.values()]).sort_index()
+        df.insert(0, "CLASS", self.classes[df.index.values])
+        df.index = _pd.Index(self.names[df.index.values], name="NAME")
+        return df
@@ -829,15 +829,8 @@ class ManzoniMatplotlibArtist(_MatplotlibArtist):
         if not isinstance(observer, _BeamObserver):
             raise BeamPlottingException("The observer must be a BeamObserver.")
 
-        df_observer = observer.to_df()
-        if element is None:
-            element = df_observer.iloc[0].name
-
-        data_element = df_observer.loc[element, f"BEAM_{location}"]
-        if location == "IN":
-            s_position = df_observer.loc[element, "AT_ENTRY"]
-        else:
-            s_position = df_observer.loc[element, "AT_EXIT"]
+        # Only the beam of the element is loaded (lazily for a PersistentBeamObserver)
+        s_position, data_element = observer.snapshot(element, location)
 
         if dim[0] == "X" or dim[0] == "Y":
             unit_col_0 = "[mm]"
@@ -0,0 +1,81 @@
+"""
+Micro-benchmarks of the Manzoni kernels. They are not collected by pytest, run them with
+
+    python tests/manzoni/benchmarks.py
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+from georges_core.sequences import Sequence
+from georges_core.units import ureg as _ureg
+
+import georges
+from georges.manzoni import Input
+from georges.manzoni.integrators import TransportSecondOrderTaylorIntegrator
+from georges.manzoni.kernels import (
+    batched_vector_matrix_dense_tensor,
+    batched_vector_matrix_sparse_tensor,
+    sparse_tensor,
+)
+
+
+def _best_of(f, number: int = 10, repeat: int = 5) -> float:
+    f()  # Compilation
+    return min(timeit.repeat(f, number=number, repeat=repeat)) / number
+
+
+def benchmark_second_order_kernels(n_particles: int = 100000):
+    sbend = georges.Element.SBend(
+        NAME="B1",
+        L=1.492 * _ureg.m,
+        ANGLE=-30 * _ureg.degrees,
+    )
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(sbend, at_entry=0 * _ureg.m)
+    mi = Input.from_sequence(sequence=sequence)
+    mi.set_integrator(integrator=TransportSecondOrderTaylorIntegrator)
+    mi.freeze()
+    element = mi.sequence[0]
+    matrix = TransportSecondOrderTaylorIntegrator.MATRICES["SBEND"](element.cache)
+    tensor = TransportSecondOrderTaylorIntegrator.TENSORS["SBEND"](element.cache)
+    indices, values = sparse_tensor(tensor)
+
+    b1 = np.random.default_rng(0).normal(scale=1e-3, size=(n_particles, 6))
+    b2 = np.zeros(b1.shape)
+    dense = _best_of(lambda: batched_vector_matrix_dense_tensor(b1, b2, matrix, tensor))
+    sparse = _best_of(lambda: batched_vector_matrix_sparse_tensor(b1, b2, matrix, indices, values))
+    print(f"Second order kernel, {n_particles} particles, {values.shape[0]}/126 nonzero tensor entries")
+    print(f"    dense:  {1e3 * dense:.3f} ms")
+    print(f"    sparse: {1e3 * sparse:.3f} ms (x{dense / sparse:.1f})")
+
+
+def benchmark_input_from_sequence(n_elements: int = 10000):
+    cell = georges.PlacementSequence(name="Cell")
+    cell.place(georges.Element.Drift(NAME="D", L=1 * _ureg.m), at_entry=0 * _ureg.m)
+    cell.place_after_last(
+        georges.Element.Quadrupole(
+            NAME="Q",
+            L=0.3 * _ureg.m,
+            K1=1 * _ureg.m**-2,
+            APERTYPE="CIRCULAR",
+            APERTURE=[1 * _ureg.cm],
+        ),
+    )
+    cell.place_after_last(georges.Element.SBend(NAME="B", L=1 * _ureg.m, ANGLE=1 * _ureg.degrees))
+    cell.place_after_last(georges.Element.Marker(NAME="M"))
+
+    # Placing the elements one by one is slow for long sequences, the dataframe of the cell is repeated instead
+    n_cells = n_elements // len(cell.df)
+    df = pd.concat([cell.df] * n_cells)
+    df.index = [f"{name}{i}" for i in range(n_cells) for name in cell.df.index]
+    sequence = Sequence(name="Sequence", data=df)
+
+    duration = _best_of(lambda: Input.from_sequence(sequence=sequence), number=1, repeat=3)
+    print(f"Input.from_sequence, {len(df)} elements")
+    print(f"    {1e3 * duration:.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmark_second_order_kernels()
+    benchmark_input_from_sequence()
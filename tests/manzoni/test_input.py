@@ -1,11 +1,24 @@
+import numpy as np
 import numpy.testing as npt
+import pandas as _pd
+import pytest
 
 import georges
 from georges import ureg as _ureg
-from georges.manzoni import Input
+from georges.manzoni import Input, elements, kernels, maps
 from georges.manzoni.beam import MadXBeam, TransportBeam
-from georges.manzoni.integrators import TransportSecondOrderTaylorIntegratorExact
-from georges.manzoni.observers import LossesObserver, MeanObserver
+from georges.manzoni.elements.elements import ManzoniAttributeException, ManzoniException
+from georges.manzoni.integrators import (
+    Integrator,
+    Mad8FirstOrderTaylorIntegrator,
+    Mad8SecondOrderTaylorIntegrator,
+    MadXIntegrator,
+    MadXParaxialDriftIntegrator,
+    MapCache,
+    TransportSecondOrderTaylorIntegrator,
+    TransportSecondOrderTaylorIntegratorExact,
+)
+from georges.manzoni.observers import BeamObserver, LossesObserver, MeanObserver
 
 
 def test_setting_parameters():
@@ -55,6 +68,88 @@ def test_setting_parameters():
     }
 
 
+def test_setting_parameters_batch():
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2), at_entry=0 * _ureg.m)
+    sequence.place_after_last(georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m))
+    sequence.place_after_last(georges.Element.Quadrupole(NAME="Q2", L=0.3 * _ureg.m, K1=-2 * _ureg.m**-2))
+    sequence.place_after_last(georges.Element.SBend(NAME="B1", L=1.0 * _ureg.m, ANGLE=10 * _ureg.degrees, FINT=0.5))
+
+    mi = Input.from_sequence(sequence=sequence)
+    mi.freeze()
+    drift_cache = mi.sequence[1].cache
+    mi.set_parameters_batch(
+        [
+            ("Q1", "K1", 3.0),
+            ("Q2", "K1", -300 * _ureg.cm**-2),
+            ("B1", "FINT", 0.7),
+            ("B1", "K1", 0.1),
+        ],
+    )
+    assert mi.get_parameters("Q1", "K1") == 3.0 * _ureg.m**-2
+    assert mi.get_parameters("Q2", "K1") == -3e6 * _ureg.m**-2
+    assert mi.get_parameters("B1", "FINT") == 0.7
+    npt.assert_allclose(mi.sequence[0].parameter_vector, [0.3, 3.0, 0.0])  # The frozen caches are updated
+    npt.assert_allclose(mi.sequence[3].parameter_vector[2], 0.1)
+    assert mi.sequence[1].cache is drift_cache
+
+    mi.set_parameters_batch(_pd.DataFrame({"ELEMENT": ["Q1"], "PARAMETER": ["K1"], "VALUE": [1.0]}))
+    reference = Input.from_sequence(sequence=sequence)
+    reference.set_parameters("Q1", {"K1": 1.0 * _ureg.m**-2})
+    assert mi.get_parameters("Q1", "K1") == reference.get_parameters("Q1", "K1")
+
+    with pytest.raises(ManzoniException):
+        mi.set_parameters_batch([("Q3", "K1", 1.0)])
+    with pytest.raises(ManzoniAttributeException):
+        mi.set_parameters_batch([("Q1", "K2", 1.0)])
+    with pytest.raises(ManzoniAttributeException):
+        mi.set_parameters_batch([("Q1", "K1", 1.0 * _ureg.m)])
+
+
+def test_sequence_table():
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2), at_entry=0 * _ureg.m)
+    sequence.place_after_last(georges.Element.Drift(NAME="D1", L=100 * _ureg.cm))
+    sequence.place_after_last(georges.Element.SBend(NAME="B1", L=1.0 * _ureg.m, ANGLE=90 * _ureg.degrees, FINT=0.5))
+    sequence.place_after_last(georges.Element.Quadrupole(NAME="Q2", L=0.3 * _ureg.m, K1=-2 * _ureg.m**-2))
+
+    mi = Input.from_sequence(sequence=sequence)
+    table = mi.table
+    assert set(table.data) == {"Quadrupole", "Drift", "SBend"}
+    npt.assert_array_equal(table.data["Quadrupole"]["INDEX"], [0, 3])
+    npt.assert_allclose(table.values("L"), [0.3, 1.0, 1.0, 0.3])
+    npt.assert_allclose(table.values("K1"), [2.0, np.nan, 0.0, -2.0])
+
+    df = mi.to_df(strip_units=True)
+    assert list(df.index) == ["Q1", "D1", "B1", "Q2"]
+    assert list(df["CLASS"]) == ["Quadrupole", "Drift", "SBend", "Quadrupole"]
+    npt.assert_allclose(df.loc["B1", "ANGLE"], np.pi / 2)
+
+    assert mi.get_parameters("B1", "FINT", strip_units=True) == 0.5
+    assert mi.get_parameters("Q1", ["L", "K1"], strip_units=True) == {"L": 0.3, "K1": 2.0}
+    assert table.view(0).K1 == 2.0
+
+    mi.set_parameters("Q1", {"K1": 300 * _ureg.cm**-2})
+    mi.set_parameters_batch([("Q2", "K1", -3.0), ("B1", "ANGLE", 0.5)])
+    assert mi.table is table
+    npt.assert_allclose(table.values("K1"), [3e6, np.nan, 0.0, -3.0])
+    assert mi.get_parameters("B1", "ANGLE", strip_units=True) == 0.5
+
+    # The attributes set directly on the elements are seen by the table
+    mi.sequence[0].K1 = 3 * _ureg.m**-2
+    assert mi.get_parameters("Q1", "K1", strip_units=True) == 3.0
+    mi.sequence[3].set_parameter("K1", -4 * _ureg.m**-2)
+    mi.sequence[1].L = 2 * _ureg.m
+    assert mi.to_df(strip_units=True).loc["Q2", "K1"] == -4.0
+    npt.assert_allclose(table.values("L"), [0.3, 2.0, 1.0, 0.3])
+
+    # The values set through the table are set on the elements
+    table.set([0, 3], "K1", [1.5, -1.5])
+    assert mi.sequence[0].K1.m_as("m**-2") == 1.5
+    assert mi.get_parameters("Q2", "K1", strip_units=True) == -1.5
+    npt.assert_allclose(table.values("K1"), [1.5, np.nan, 0.0, -1.5])
+
+
 def test_integrator_setting():
     B2G2 = georges.Element.SBend(
         NAME="B2G2",
@@ -136,3 +231,165 @@ def test_degrader_efficiency():
     efficiency_observer = losses_observer.iloc[-1]["PARTICLES_OUT"] / losses_observer.iloc[0]["PARTICLES_IN"]
 
     npt.assert_allclose(efficiency_observer, efficiency, rtol=0.02)
+
+
+def test_map_cache():
+    q1 = georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2)
+    d1 = georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m)
+    b1 = georges.Element.SBend(NAME="B1", L=1.492 * _ureg.m, ANGLE=-30 * _ureg.degrees)
+
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(q1, at_entry=0 * _ureg.m)
+    sequence.place_after_last(d1)
+    sequence.place_after_last(b1)
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam = TransportBeam(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=1000,
+            x=2.5 * _ureg.mm,
+            y=2.5 * _ureg.mm,
+            emitx=7 * _ureg.mm * _ureg.mradians,
+            emity=7 * _ureg.mm * _ureg.mradians,
+            dpp=1e-3,
+        ).distribution.values,
+    )
+
+    cache = Integrator.MAP_CACHE
+    try:
+        for integrator, n_maps in [(TransportSecondOrderTaylorIntegrator, 2), (Mad8SecondOrderTaylorIntegrator, 3)]:
+            Integrator.MAP_CACHE = None
+            mi = Input.from_sequence(sequence=sequence)
+            mi.set_integrator(integrator=integrator)
+            reference = mi.track(beam=beam, observers=MeanObserver()).to_df()
+
+            Integrator.MAP_CACHE = MapCache(maxsize=8)
+            mi.freeze(kinematics=kin)
+            assert len(Integrator.MAP_CACHE) == n_maps  # The Transport drift is not tracked with a map
+            mi.track(beam=beam, observers=MeanObserver())
+            mean = mi.track(beam=beam, observers=MeanObserver()).to_df()
+            assert Integrator.MAP_CACHE.misses == n_maps
+            assert Integrator.MAP_CACHE.hits == 2 * n_maps
+            npt.assert_allclose(
+                mean[["BEAM_OUT_X", "BEAM_OUT_Y"]].values.astype(float),
+                reference[["BEAM_OUT_X", "BEAM_OUT_Y"]].values.astype(float),
+            )
+
+            mi.set_parameters("Q1", {"K1": 3 * _ureg.m**-2})
+            mi.track(beam=beam, observers=MeanObserver())
+            assert Integrator.MAP_CACHE.misses == n_maps + 1
+    finally:
+        Integrator.MAP_CACHE = cache
+
+
+def test_integrator_binding():
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m), at_entry=0 * _ureg.m)
+    sequence.place_after_last(georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2))
+    sequence.place_after_last(georges.Element.HKicker(NAME="H1", L=0.0 * _ureg.m, KICK=0.01))
+
+    mi = Input.from_sequence(sequence=sequence)
+    assert mi.sequence[0].binding.kernel is maps.track_madx_drift
+    assert mi.sequence[1].binding.kernel is maps.track_madx_quadrupole
+
+    mi.set_integrator(integrator=TransportSecondOrderTaylorIntegrator)
+    assert mi.sequence[0].binding.kernel is maps.track_madx_drift
+    assert mi.sequence[1].binding.kernel is kernels.batched_vector_matrix_tensor
+    assert mi.sequence[2].binding.kernel is maps.track_madx_kicker
+    assert mi.sequence[1].binding is TransportSecondOrderTaylorIntegrator.bind(mi.sequence[1])
+
+    mi.set_integrator(integrator=Mad8FirstOrderTaylorIntegrator)
+    assert mi.sequence[0].binding.kernel is kernels.batched_vector_matrix
+    assert mi.sequence[1].binding.kernel is kernels.batched_vector_matrix
+
+
+def test_parameter_vector(monkeypatch):
+    q1 = georges.manzoni.elements.Quadrupole("Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2)
+    vector = q1.parameter_vector
+    assert vector.dtype == np.float64 and vector.flags.c_contiguous
+    npt.assert_allclose(vector, [0.3, 2.0, 0.0])
+    assert q1.parameter_vector is vector  # Not recomputed while the parameters are unchanged
+    assert q1.cache is q1.cache
+
+    q1.K1 = 300 * _ureg.cm**-2
+    npt.assert_allclose(q1.parameter_vector, [0.3, 3e6, 0.0])
+    q1.AT_ENTRY = 1 * _ureg.m
+    assert q1.parameter_vector is q1.parameter_vector
+    with pytest.raises(ManzoniAttributeException):
+        q1.K1 = 1 * _ureg.m
+
+    q1.freeze()
+    q1.K1 = 1 * _ureg.m**-2
+    npt.assert_allclose(q1.parameter_vector, [0.3, 3e6, 0.0])  # Frozen
+    q1.unfreeze()
+    npt.assert_allclose(q1.parameter_vector, [0.3, 1.0, 0.0])
+
+    q1.freeze()
+    q1.set_parameters({"K1": 4 * _ureg.m**-2, "L": 0.5 * _ureg.m})
+    assert q1.frozen
+    npt.assert_allclose(q1.parameter_vector, [0.5, 4.0, 0.0])  # Frozen elements are refreshed
+
+    # Only the parameters set since the previous computation are converted
+    conversions = []
+    quantity = type(q1.L)
+    m_as = quantity.m_as
+    monkeypatch.setattr(quantity, "m_as", lambda self, units: conversions.append(units) or m_as(self, units))
+    q1.set_parameter("K1", 5 * _ureg.m**-2)
+    npt.assert_allclose(q1.parameter_vector, [0.5, 5.0, 0.0])
+    assert conversions == ["m**-2"]
+
+
+def test_merge_drifts():
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Drift(NAME="D0", L=0.5 * _ureg.m), at_entry=0 * _ureg.m)
+    for e in [
+        georges.Element.Marker(NAME="M0"),
+        georges.Element.Drift(NAME="D1", L=0.7 * _ureg.m),
+        georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=1 * _ureg.m**-2),
+        georges.Element.Drift(NAME="D2", L=0.5 * _ureg.m),
+        georges.Element.Drift(NAME="D3", L=0.5 * _ureg.m, APERTYPE="CIRCULAR", APERTURE=[1 * _ureg.cm]),
+        georges.Element.Drift(NAME="D4", L=0.5 * _ureg.m),
+        georges.Element.Drift(NAME="D5", L=0.5 * _ureg.m),
+        georges.Element.Drift(NAME="D6", L=0.5 * _ureg.m),
+    ]:
+        sequence.place_after_last(e)
+
+    mi = Input.from_sequence(sequence=sequence)
+    merged = mi.merge_drifts(keep=["D4"])
+
+    assert [e.NAME for e in merged.sequence] == ["D1", "Q1", "D2", "D3", "D4", "D6"]
+    assert merged.merged == {"D1": ["D0", "M0", "D1"], "D6": ["D5", "D6"]}
+    assert merged.mapper["M0"] == 0 and merged.mapper["D4"] == 4 and merged.mapper["D5"] == 5
+    assert merged.sequence[0].L == 1.2 * _ureg.m
+    assert merged.sequence[5].AT_ENTRY == 3.0 * _ureg.m and merged.sequence[5].AT_EXIT == 4.0 * _ureg.m
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam = MadXBeam(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=1000,
+            x=2.5 * _ureg.mm,
+            y=2.5 * _ureg.mm,
+            emitx=7 * _ureg.mm * _ureg.mradians,
+            emity=7 * _ureg.mm * _ureg.mradians,
+        ).distribution.values,
+    )
+    reference = mi.track(beam=beam, observers=BeamObserver(elements=["D1", "D4", "D6"])).to_df()
+    beam_observer = merged.track(beam=beam, observers=BeamObserver(elements=["D1", "D4", "D6"])).to_df()
+    for name in ["D1", "D4", "D6"]:
+        np.testing.assert_allclose(beam_observer.at[name, "BEAM_OUT"], reference.at[name, "BEAM_OUT"], atol=1e-15)
+
+    # The gaps are merged only if they are tracked as drifts
+    def gaps(integrator):
+        return Input(
+            sequence=[
+                elements.Drift("D1", integrator=integrator, L=0.5 * _ureg.m),
+                elements.Gap("G1", integrator=integrator, L=0.5 * _ureg.m),
+                elements.Drift("D2", integrator=integrator, L=0.5 * _ureg.m),
+            ],
+            mapper={"D1": 0, "G1": 1, "D2": 2},
+        ).merge_drifts()
+
+    assert [e.NAME for e in gaps(MadXIntegrator).sequence] == ["D2"]
+    assert [e.NAME for e in gaps(MadXParaxialDriftIntegrator).sequence] == ["D1", "G1", "D2"]
@@ -1,10 +1,37 @@
+import os
+
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as _pd
+import pytest
+from numba.typed import List as nList
 
 import georges
 from georges import ureg as _ureg
 from georges import vis
-from georges.manzoni import Input, observers
-from georges.manzoni.beam import MadXBeam
+from georges.manzoni import Input, LossRecord, observers
+from georges.manzoni.beam import MadXBeam, TransportBeam
+from georges.manzoni.elements.elements import ManzoniException
+from georges.manzoni.elements.scatterers import MaterialElement
+from georges.manzoni.integrators import (
+    Mad8FirstOrderTaylorIntegrator,
+    MadXIntegrator,
+    TransportFirstOrderTaylorIntegrator,
+    TransportFirstOrderTaylorIntegratorExact,
+    TransportFirstOrderTaylorIntegratorInterpolated,
+    TransportSecondOrderTaylorIntegrator,
+    TransportSecondOrderTaylorIntegratorExact,
+    TransportSecondOrderTaylorIntegratorInterpolated,
+)
+from georges.manzoni.kernels import (
+    batched_vector_matrix_dense_tensor,
+    batched_vector_matrix_sparse_tensor,
+    batched_vector_matrix_tensor,
+    degrader,
+    random_stream_key,
+    scattering,
+    sparse_tensor,
+)
 
 
 def test_manzoni_tracking():
@@ -97,3 +124,767 @@ def test_manzoni_tracking():
     assert beam_observer_std is not None
     assert beam_observer_beam is not None
     assert beam_observer_losses is not None
+
+
+@pytest.mark.parametrize(
+    "integrator",
+    [
+        MadXIntegrator,
+        TransportSecondOrderTaylorIntegrator,
+        Mad8FirstOrderTaylorIntegrator,
+    ],
+)
+def test_compiled_tracking(integrator):
+    d1 = georges.Element.Drift(
+        NAME="D1",
+        L=1.5 * _ureg.m,
+        APERTYPE="CIRCULAR",
+        APERTURE=[1.5 * _ureg.cm],
+    )
+    q1 = georges.Element.Quadrupole(
+        NAME="Q1",
+        L=0.3 * _ureg.m,
+        K1=2 * _ureg.m**-2,
+        APERTYPE="RECTANGULAR",
+        APERTURE=[2 * _ureg.cm, 1 * _ureg.cm],
+    )
+    b1 = georges.Element.SBend(
+        NAME="B1",
+        L=1.492 * _ureg.m,
+        ANGLE=-30 * _ureg.degrees,
+        K1=0.1 * _ureg.m**-2,
+        E1=-0.2 * _ureg.radians,
+        HGAP=0.0315 * _ureg.m,
+        FINT=0.5,
+    )
+    d2 = georges.Element.Drift(
+        NAME="D2",
+        L=2.0 * _ureg.m,
+        APERTYPE="CIRCULAR",
+        APERTURE=[3 * _ureg.cm],
+    )
+
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(d1, at_entry=0 * _ureg.m)
+    sequence.place_after_last(q1)
+    sequence.place_after_last(b1)
+    sequence.place_after_last(d2)
+
+    kin = georges.Kinematics(250 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam_class = TransportBeam if integrator is TransportSecondOrderTaylorIntegrator else MadXBeam
+    beam = beam_class(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=1000,
+            x=5 * _ureg.mm,
+            y=5 * _ureg.mm,
+            emitx=20 * _ureg.mm * _ureg.mradians,
+            emity=20 * _ureg.mm * _ureg.mradians,
+            dpp=1e-3,
+        ).distribution.values,
+    )
+
+    mi = Input.from_sequence(sequence=sequence)
+    mi.freeze()
+    mi.set_integrator(integrator=integrator)
+    beam_observer = mi.track(beam=beam, observers=observers.BeamObserver(elements=["D2"]))
+    compiled = mi.compile()
+
+    np.testing.assert_allclose(compiled.track(beam), beam_observer.to_df().at["D2", "BEAM_OUT"], atol=1e-12)
+    np.testing.assert_allclose(
+        compiled.track(beam, particle_major=True, chunk_size=64),
+        beam_observer.to_df().at["D2", "BEAM_OUT"],
+        atol=1e-12,
+    )
+
+    reference = LossRecord()
+    mi.track(beam=beam, losses=reference)
+    order = np.argsort(reference.ids)
+    for particle_major in [False, True]:
+        losses = LossRecord()
+        compiled.track(beam, particle_major=particle_major, chunk_size=64, losses=losses)
+        np.testing.assert_equal(losses.lost_at, reference.lost_at)
+        np.testing.assert_equal(losses.ids, reference.ids[order])
+        np.testing.assert_allclose(losses.s, reference.s[order])
+        np.testing.assert_allclose(losses.coordinates, reference.coordinates[order], atol=1e-12)
+
+
+def test_tracking_with_losses():
+    d1 = georges.Element.Drift(
+        NAME="D1",
+        L=1.5 * _ureg.m,
+        APERTYPE="CIRCULAR",
+        APERTURE=[1.5 * _ureg.cm],
+    )
+    deg = georges.Element.Degrader(
+        NAME="DEG",
+        MATERIAL=georges.fermi.materials.Beryllium,
+        L=5 * _ureg.cm,
+        WITH_LOSSES=True,
+    )
+    q1 = georges.Element.Quadrupole(
+        NAME="Q1",
+        L=0.3 * _ureg.m,
+        K1=2 * _ureg.m**-2,
+        APERTYPE="RECTANGULAR",
+        APERTURE=[2 * _ureg.cm, 1 * _ureg.cm],
+    )
+    d2 = georges.Element.Drift(
+        NAME="D2",
+        L=2.0 * _ureg.m,
+        APERTYPE="CIRCULAR",
+        APERTURE=[2 * _ureg.cm],
+    )
+    d3 = georges.Element.Drift(
+        NAME="D3",
+        L=1.0 * _ureg.m,
+        APERTYPE="CIRCULAR",
+        APERTURE=[2 * _ureg.cm],
+    )
+
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(d1, at_entry=0 * _ureg.m)
+    sequence.place_after_last(q1)
+    sequence.place_after_last(d2)
+    sequence.place_after_last(deg)
+    sequence.place_after_last(d3)
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam = MadXBeam(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=10000,
+            x=5 * _ureg.mm,
+            y=5 * _ureg.mm,
+            emitx=20 * _ureg.mm * _ureg.mradians,
+            emity=20 * _ureg.mm * _ureg.mradians,
+        ).distribution.values,
+    )
+
+    mi = Input.from_sequence(sequence=sequence)
+    mi.adjust_energy(input_energy=kin.ekin)
+    mi.freeze()
+
+    losses = LossRecord(compaction_threshold=0.9)
+    losses_observer = mi.track(beam=beam, observers=observers.LossesObserver(), losses=losses).to_df()
+    reference = mi.track(beam=beam, observers=observers.LossesObserver(), check_apertures=True).to_df()
+    counts = losses.counts()
+
+    np.testing.assert_equal(
+        losses_observer.loc["D1":"D2", "PARTICLES_OUT"].values,
+        reference.loc["D1":"D2", "PARTICLES_OUT"].values,
+    )
+    np.testing.assert_equal(
+        (losses_observer["PARTICLES_IN"] - losses_observer["PARTICLES_OUT"]).values,
+        counts.values,
+    )
+    assert losses.n_lost == counts.sum()
+    assert len(losses.lost_particles("Q1")) == counts["Q1"]
+    assert (losses.lost_at[losses.lost_particles("D1")] == 0).all()
+
+    lost = losses.to_df()
+    lost_d1 = lost[lost["ELEMENT"] == "D1"]
+    assert len(lost) == counts.sum() - sum(losses.unidentified.values())
+    assert (lost_d1["S"] == 1.5).all()
+    assert (np.hypot(lost_d1["X"], lost_d1["Y"]) > 1.5e-2).all()
+    # The particles going through the degrader keep their identifier
+    lost_d3 = lost.loc[lost["ELEMENT"] == "D3", "ID"].values
+    assert len(lost_d3) > 0 and (lost_d3 >= 0).all()
+    assert (losses.lost_at[lost_d3] == 4).all()
+    histogram, edges = losses.histogram(bins=[0.0, 1.6, 1.9, 4.0])
+    np.testing.assert_equal(histogram, [counts["D1"], counts["Q1"], counts["D2"]])
+
+
+def test_sparse_second_order_kernel():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(6, 6))
+    tensor = np.triu(rng.normal(size=(6, 6, 6)) * (rng.random(size=(6, 6, 6)) < 0.2))
+    b1 = rng.normal(scale=1e-2, size=(1000, 6))
+    indices, values = sparse_tensor(tensor)
+
+    assert values.shape[0] == np.count_nonzero(tensor)
+    np.testing.assert_equal(tensor[indices[:, 0], indices[:, 1], indices[:, 2]], values)
+
+    dense = batched_vector_matrix_dense_tensor(b1, np.zeros(b1.shape), matrix, tensor)[1]
+    np.testing.assert_allclose(
+        batched_vector_matrix_sparse_tensor(b1, np.zeros(b1.shape), matrix, indices, values)[1],
+        dense,
+        atol=1e-15,
+    )
+    np.testing.assert_allclose(
+        batched_vector_matrix_tensor(b1, np.zeros(b1.shape), matrix, tensor)[1],
+        dense,
+        atol=1e-15,
+    )
+
+
+@pytest.mark.parametrize(
+    "integrator, column",
+    [
+        (TransportFirstOrderTaylorIntegratorExact, 4),
+        (TransportSecondOrderTaylorIntegratorExact, 5),
+    ],
+)
+def test_exact_transport_integrators(integrator, column):
+    q1 = georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2)
+    b1 = georges.Element.SBend(NAME="B1", L=1.492 * _ureg.m, ANGLE=-30 * _ureg.degrees)
+    s1 = georges.Element.Sextupole(NAME="S1", L=0.2 * _ureg.m, K2=5 * _ureg.m**-3)
+
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(q1, at_entry=0 * _ureg.m)
+    sequence.place_after_last(b1)
+    sequence.place_after_last(s1)
+    mi = Input.from_sequence(sequence=sequence)
+    mi.set_integrator(integrator=integrator)
+    mi.freeze()
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam = np.random.default_rng(0).normal(scale=1e-2, size=(500, 6))
+    global_parameters = nList([kin.beta])
+    for e in mi.sequence:
+        name = e.__class__.__name__.upper()
+        expected = np.zeros(beam.shape)
+        for i in range(beam.shape[0]):
+            parameters = e.cache.copy()
+            parameters.append(beam[i, column])
+            expected[i] = integrator.MATRICES[name](parameters) @ beam[i]
+            if hasattr(integrator, "TENSORS"):
+                expected[i] += np.einsum("ijk,j,k->i", np.triu(integrator.TENSORS[name](parameters)), beam[i], beam[i])
+        np.testing.assert_allclose(e.propagate(beam, np.zeros(beam.shape), global_parameters)[1], expected, atol=1e-15)
+
+
+@pytest.mark.parametrize(
+    "integrator",
+    [
+        TransportFirstOrderTaylorIntegratorInterpolated,
+        TransportSecondOrderTaylorIntegratorInterpolated,
+    ],
+)
+def test_interpolated_transport_integrators(integrator):
+    q1 = georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2)
+    d1 = georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m)
+    b1 = georges.Element.SBend(NAME="B1", L=1.492 * _ureg.m, ANGLE=-30 * _ureg.degrees)
+
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(q1, at_entry=0 * _ureg.m)
+    sequence.place_after_last(d1)
+    sequence.place_after_last(b1)
+    mi = Input.from_sequence(sequence=sequence)
+    mi.freeze()
+
+    beam = np.random.default_rng(0).normal(scale=1e-2, size=(1000, 6))
+    coarse = integrator.with_grid(-0.05, 0.05, 5)
+    fine = integrator.with_grid(-0.05, 0.05, 401)
+    assert coarse.GRID_POINTS == 5 and issubclass(coarse, integrator)
+
+    coarse_errors = coarse.interpolation_error(mi.sequence, beam)
+    fine_errors = fine.interpolation_error(mi.sequence, beam)
+    assert list(fine_errors.index) == ["Q1", "B1"]
+    assert (fine_errors.values < 1e-8).all()
+    assert (fine_errors.values <= coarse_errors.values).all()
+
+    b_exact = integrator.EXACT.propagate(mi.sequence[0], beam, np.zeros(beam.shape), None)[1]
+    np.testing.assert_allclose(fine.propagate(mi.sequence[0], beam, np.zeros(beam.shape), None)[1], b_exact, atol=1e-8)
+
+
+@pytest.mark.parametrize(
+    "integrator",
+    [
+        MadXIntegrator,
+        TransportFirstOrderTaylorIntegrator,
+        TransportSecondOrderTaylorIntegrator,
+    ],
+)
+def test_composed_maps(integrator):
+    d1 = georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m)
+    q1 = georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2)
+    d2 = georges.Element.Drift(NAME="D2", L=0.5 * _ureg.m)
+    b1 = georges.Element.SBend(NAME="B1", L=1.492 * _ureg.m, ANGLE=-30 * _ureg.degrees)
+    k1 = georges.Element.HKicker(NAME="K1", L=0.1 * _ureg.m, KICK=1e-4 * _ureg.radians)
+    q2 = georges.Element.Quadrupole(
+        NAME="Q2",
+        L=0.3 * _ureg.m,
+        K1=-2 * _ureg.m**-2,
+        APERTYPE="CIRCULAR",
+        APERTURE=[5 * _ureg.cm],
+    )
+    d3 = georges.Element.Drift(NAME="D3", L=1.0 * _ureg.m)
+
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(d1, at_entry=0 * _ureg.m)
+    for e in [q1, d2, b1, k1, q2, d3]:
+        sequence.place_after_last(e)
+    mi = Input.from_sequence(sequence=sequence)
+    mi.set_integrator(integrator=integrator)
+    mi.freeze()
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam_class = MadXBeam if integrator is MadXIntegrator else TransportBeam
+    beam = beam_class(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=1000,
+            x=0.05 * _ureg.mm,
+            y=0.05 * _ureg.mm,
+            emitx=0.025 * _ureg.mm * _ureg.mradians,
+            emity=0.025 * _ureg.mm * _ureg.mradians,
+            dpp=1e-4,
+        ).distribution.values,
+    )
+
+    offset, matrix, tensor = mi.compose(kin, "D1", "D2")
+    np.testing.assert_allclose(offset, 0.0, atol=1e-12)
+    if integrator is TransportFirstOrderTaylorIntegrator:
+        d1_matrix, d2_matrix = np.eye(4), np.eye(4)
+        d1_matrix[0, 1] = d1_matrix[2, 3] = 1.0
+        d2_matrix[0, 1] = d2_matrix[2, 3] = 0.5
+        q1_matrix = integrator.maps(mi.sequence[1], nList([kin.beta]))[0][:4, :4]
+        np.testing.assert_allclose(matrix[:4, :4], d2_matrix @ q1_matrix @ d1_matrix, atol=1e-9)
+    offset, _, _ = mi.compose(kin, "K1", "K1")
+    assert offset[1] == pytest.approx(1e-4, rel=1e-3)
+
+    reference = mi.track(
+        beam=beam,
+        observers=observers.BeamObserver(elements=["Q2", "D3"], with_input_beams=True),
+    ).to_df()
+    composed = mi.track(
+        beam=beam,
+        observers=observers.BeamObserver(elements=["Q2", "D3"], with_input_beams=True),
+        composed=True,
+    ).to_df()
+    for element in ["Q2", "D3"]:
+        np.testing.assert_allclose(composed.at[element, "BEAM_IN"], reference.at[element, "BEAM_IN"], atol=1e-9)
+        np.testing.assert_allclose(composed.at[element, "BEAM_OUT"], reference.at[element, "BEAM_OUT"], atol=1e-9)
+
+
+def test_streaming_observers():
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m), at_entry=0 * _ureg.m)
+    sequence.place_after_last(georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2))
+    sequence.place_after_last(georges.Element.Drift(NAME="D2", L=1.0 * _ureg.m))
+    mi = Input.from_sequence(sequence=sequence)
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam = MadXBeam(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=10000,
+            x=2.5 * _ureg.mm,
+            y=2.5 * _ureg.mm,
+            emitx=7 * _ureg.mm * _ureg.mradians,
+            emity=7 * _ureg.mm * _ureg.mradians,
+            dpp=1e-3,
+        ).distribution.values,
+    )
+    beam_observer = observers.BeamObserver(with_input_beams=True)
+    moments = observers.MomentsObserver()
+    histogram = observers.HistogramObserver(elements=["D2"], coordinates="X", bins=50, ranges=(-0.01, 0.01))
+    histogram2d = observers.HistogramObserver(coordinates=("X", "Y"), bins=(20, 30), ranges=((-0.01, 0.01),) * 2)
+    quantiles = observers.QuantileObserver(elements=["Q1", "D2"], coordinates=("X",), quantiles=(0.1, 0.5, 0.9))
+    sample = observers.SampleObserver(budget=100, seed=0)
+    mi.track(beam=beam, observers=[beam_observer, moments, histogram, histogram2d, quantiles, sample])
+
+    beams = beam_observer.to_df()
+    df = moments.to_df()
+    for name in ["D1", "Q1", "D2"]:
+        b1, b2 = beams.at[name, "BEAM_IN"], beams.at[name, "BEAM_OUT"]
+        np.testing.assert_allclose(df.at[name, "MEAN_IN"], b1.mean(axis=0), atol=1e-15)
+        np.testing.assert_allclose(df.at[name, "MEAN_OUT"], b2.mean(axis=0), atol=1e-15)
+        np.testing.assert_allclose(df.at[name, "COVARIANCE_OUT"], np.cov(b2.T, ddof=0), atol=1e-15)
+        assert df.at[name, "PARTICLES_OUT"] == b2.shape[0]
+
+    b2 = beams.at["D2", "BEAM_OUT"]
+    assert list(histogram.to_df().index) == ["D2"]
+    np.testing.assert_array_equal(
+        histogram.to_df().at["D2", "HISTOGRAM"],
+        np.histogram(b2[:, 0], bins=50, range=(-0.01, 0.01))[0],
+    )
+    np.testing.assert_array_equal(
+        histogram2d.to_df().at["D2", "HISTOGRAM"],
+        np.histogram2d(b2[:, 0], b2[:, 2], bins=(20, 30), range=((-0.01, 0.01),) * 2)[0],
+    )
+    assert len(histogram2d.edges[1]) == 31
+
+    width = (b2[:, 0].max() - b2[:, 0].min()) / 4096
+    np.testing.assert_allclose(
+        quantiles.to_df().loc["D2", ["BEAM_OUT_X_Q10", "BEAM_OUT_X_Q50", "BEAM_OUT_X_Q90"]].values.astype(float),
+        np.quantile(b2[:, 0], [0.1, 0.5, 0.9]),
+        atol=width,
+    )
+
+    samples = sample.to_df()
+    assert samples.at["D2", "BEAM_OUT"].shape == (100, b2.shape[1])
+    assert samples.at["D2", "PARTICLES_OUT"] == b2.shape[0]
+    assert np.isin(samples.at["D2", "BEAM_OUT"][:, 0], b2[:, 0]).all()
+
+
+def test_shared_moments_observers():
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m), at_entry=0 * _ureg.m)
+    sequence.place_after_last(georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2))
+    sequence.place_after_last(georges.Element.SBend(NAME="B1", L=1.0 * _ureg.m, ANGLE=10 * _ureg.degree))
+    mi = Input.from_sequence(sequence=sequence)
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam = MadXBeam(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=10000,
+            x=2.5 * _ureg.mm,
+            y=2 * _ureg.mm,
+            emitx=7 * _ureg.mm * _ureg.mradians,
+            emity=5 * _ureg.mm * _ureg.mradians,
+            dpprms=1e-3,
+        ).distribution.values,
+    )
+    beam_observer = observers.BeamObserver(with_input_beams=True)
+    mean = observers.MeanObserver()
+    sigma = observers.SigmaObserver()
+    twiss = observers.TwissObserver()
+    symmetry = observers.SymmetryObserver()
+    mi.track(beam=beam, observers=[beam_observer, mean, sigma, twiss, symmetry])
+
+    beams = beam_observer.to_df()
+    columns = {"X": 0, "XP": 1, "Y": 2, "YP": 3, "DPP": 4}
+    for name in ["D1", "Q1", "B1"]:
+        for io in ["IN", "OUT"]:
+            b = beams.at[name, f"BEAM_{io}"]
+            for c, i in columns.items():
+                np.testing.assert_allclose(mean.to_df().at[name, f"BEAM_{io}_{c}"], b[:, i].mean(), atol=1e-15)
+                np.testing.assert_allclose(
+                    sigma.to_df().at[name, f"BEAM_{io}_{c}"],
+                    b[:, i].std(),
+                    rtol=1e-10,
+                    atol=1e-15,
+                )
+            np.testing.assert_allclose(
+                twiss.to_df().loc[name, [f"{p}_{io}_{c}" for c in "XY" for p in ["EMIT", "BETA", "ALPHA", "DISP"]]]
+                .values.astype(float),
+                georges.Distribution.compute_twiss(b)[[0, 1, 2, 3, 5, 6, 7, 8]],
+                rtol=1e-8,
+            )
+            np.testing.assert_allclose(
+                symmetry.to_df().at[name, f"SYM_{io}"],
+                abs(b[:, 0].std() - b[:, 2].std()) / (b[:, 0].std() + b[:, 2].std()),
+                rtol=1e-8,
+            )
+
+    # Observers called directly with reused buffers compute the moments of the current contents
+    element = mi.sequence[0]
+    b1, b2 = np.copy(beam.distribution), np.copy(beam.distribution)
+    direct = observers.MeanObserver()
+    direct(element, b1, b2)
+    b2[:, 0] += 1.0
+    direct(element, b1, b2)
+    np.testing.assert_allclose(direct.data[1][5] - direct.data[0][5], 1.0)
+
+    # Any callable can still be given as an observer
+    names = []
+    mi.track(beam=beam, observers=[mean, lambda e, b1, b2: names.append(e.NAME)])
+    assert names == ["D1", "Q1", "B1"]
+
+
+def test_persistent_beam_observer(tmp_path):
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m), at_entry=0 * _ureg.m)
+    sequence.place_after_last(georges.Element.Quadrupole(NAME="Q1", L=0.3 * _ureg.m, K1=2 * _ureg.m**-2))
+    sequence.place_after_last(georges.Element.Drift(NAME="D2", L=1.0 * _ureg.m))
+    mi = Input.from_sequence(sequence=sequence)
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam = MadXBeam(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=1000,
+            x=2.5 * _ureg.mm,
+            y=2.5 * _ureg.mm,
+            emitx=7 * _ureg.mm * _ureg.mradians,
+            emity=7 * _ureg.mm * _ureg.mradians,
+        ).distribution.values,
+    )
+    reference = observers.BeamObserver(with_input_beams=True)
+    path = str(tmp_path / "beams")
+    persistent = observers.PersistentBeamObserver(path, with_input_beams=True)
+    persistent_out = observers.PersistentBeamObserver(str(tmp_path / "out"), elements=["Q1"])
+    mi.track(beam=beam, observers=[reference, persistent, persistent_out])
+    assert persistent._store._file is None
+
+    loaded = observers.PersistentBeamObserver.load(path)
+    df, df_reference = loaded.to_df(), reference.to_df()
+    assert list(df.index) == ["D1", "Q1", "D2"]
+    np.testing.assert_allclose(df["AT_EXIT"].apply(lambda x: x.m_as("m")), [1.0, 1.3, 2.3])
+    for name in df.index:
+        np.testing.assert_array_equal(df.at[name, "BEAM_IN"], df_reference.at[name, "BEAM_IN"])
+        np.testing.assert_array_equal(df.at[name, "BEAM_OUT"], df_reference.at[name, "BEAM_OUT"])
+
+    position, b = loaded.snapshot("Q1", "IN")
+    assert position.m_as("m") == pytest.approx(1.0)
+    assert isinstance(b, np.memmap)
+    np.testing.assert_array_equal(b, df_reference.at["Q1", "BEAM_IN"])
+
+    position, b = observers.PersistentBeamObserver.load(str(tmp_path / "out")).snapshot()
+    assert position.m_as("m") == pytest.approx(1.3)
+    np.testing.assert_array_equal(b, df_reference.at["Q1", "BEAM_OUT"])
+    assert persistent_out.to_df().at["Q1", "BEAM_IN"] is None
+
+    # A new store in the same directory replaces the previous one only if asked
+    with pytest.raises(FileExistsError):
+        observers.PersistentBeamObserver(path)
+    observers.PersistentBeamObserver(path, overwrite=True)
+    assert sorted(os.listdir(path)) == ["index.csv"]
+    assert observers.PersistentBeamObserver.load(path).to_df().empty
+
+    # The rows of the other observers are streamed to the store instead of being kept in memory
+    sigma, moments = observers.SigmaObserver(), observers.MomentsObserver()
+    persistent_sigma = observers.PersistentObserver(str(tmp_path / "sigma"), observers.SigmaObserver())
+    persistent_moments = observers.PersistentObserver(str(tmp_path / "moments"), observers.MomentsObserver(["Q1"]))
+    mi.track(beam=beam, observers=[sigma, moments, persistent_sigma, persistent_moments])
+    assert persistent_sigma.observer.data == []
+    assert persistent_sigma._store._file is None  # The index is closed at the end of the tracking
+
+    df = observers.PersistentObserver.load(str(tmp_path / "sigma")).to_df()
+    df_reference = sigma.to_df()
+    assert list(df.index) == ["D1", "Q1", "D2"]
+    np.testing.assert_allclose(df["AT_CENTER"].apply(lambda x: x.m_as("m")), [0.5, 1.15, 1.8])
+    np.testing.assert_allclose(df.iloc[:, 3:].values.astype(float), df_reference.iloc[:, 3:].values.astype(float))
+
+    df = persistent_moments.to_df()
+    assert list(df.index) == ["Q1"]
+    assert df.at["Q1", "PARTICLES_OUT"] == moments.to_df().at["Q1", "PARTICLES_OUT"]
+    np.testing.assert_array_equal(df.at["Q1", "COVARIANCE_OUT"], moments.to_df().at["Q1", "COVARIANCE_OUT"])
+
+    # The rows of a following tracking are appended to the store
+    mi.track(beam=beam, observers=persistent_sigma)
+    assert list(persistent_sigma.to_df().index) == ["D1", "Q1", "D2"] * 2
+
+
+@pytest.mark.parametrize("integrator", [MadXIntegrator, TransportSecondOrderTaylorIntegrator])
+def test_track_configurations(integrator):
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(georges.Element.Drift(NAME="D1", L=1.0 * _ureg.m), at_entry=0 * _ureg.m)
+    sequence.place_after_last(
+        georges.Element.Quadrupole(
+            NAME="Q1",
+            L=0.3 * _ureg.m,
+            K1=2 * _ureg.m**-2,
+            APERTYPE="CIRCULAR",
+            APERTURE=[1 * _ureg.cm],
+        ),
+    )
+    sequence.place_after_last(georges.Element.Drift(NAME="D2", L=1.0 * _ureg.m))
+    sequence.place_after_last(georges.Element.SBend(NAME="B1", L=1.0 * _ureg.m, ANGLE=10 * _ureg.degree))
+    mi = Input.from_sequence(sequence=sequence)
+    mi.freeze()
+    mi.set_integrator(integrator=integrator)
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    beam_class = TransportBeam if integrator is TransportSecondOrderTaylorIntegrator else MadXBeam
+    beam = beam_class(
+        kinematics=kin,
+        distribution=georges.Distribution.from_twiss_parameters(
+            n=1000,
+            x=5 * _ureg.mm,
+            y=5 * _ureg.mm,
+            emitx=20 * _ureg.mm * _ureg.mradians,
+            emity=20 * _ureg.mm * _ureg.mradians,
+            dpp=1e-3,
+        ).distribution.values,
+    )
+    configurations = _pd.DataFrame(
+        {("Q1", "K1"): [1.0, -3.0, 5.0 * _ureg.m**-2], ("B1", "ANGLE"): [5 * _ureg.degree, 0.2, 0.1]},
+        index=_pd.Index(["A", "B", "C"], name="CONFIGURATION"),
+    )
+    beams = mi.track_configurations(beam, configurations)
+    assert list(beams) == ["A", "B", "C"]
+    assert mi.get_parameters("Q1", "K1") == 2 * _ureg.m**-2  # The elements are restored
+
+    for label, (k1, angle) in zip(["A", "B", "C"], [(1.0, 5 * _ureg.degree), (-3.0, 0.2), (5.0, 0.1)]):
+        mi.set_parameters("Q1", {"K1": k1 * _ureg.m**-2})
+        mi.set_parameters("B1", {"ANGLE": angle if isinstance(angle, _ureg.Quantity) else angle * _ureg.radian})
+        reference = mi.compile().track(beam)
+        assert beams[label].shape == reference.shape
+        np.testing.assert_allclose(beams[label], reference, atol=1e-12)
+
+    with pytest.raises(ManzoniException):
+        mi.track_configurations(beam, _pd.DataFrame({("Q9", "K1"): [1.0]}))
+
+
+def test_material_elements_seed():
+    sequence = georges.PlacementSequence(name="Sequence")
+    sequence.place(
+        georges.Element.Scatterer(NAME="S1", MATERIAL=georges.fermi.materials.Beryllium, L=1 * _ureg.mm),
+        at_entry=0 * _ureg.m,
+    )
+    sequence.place_after_last(georges.Element.Drift(NAME="D1", L=0.5 * _ureg.m))
+    sequence.place_after_last(
+        georges.Element.Degrader(
+            NAME="DEG",
+            MATERIAL=georges.fermi.materials.Beryllium,
+            L=5 * _ureg.cm,
+            WITH_LOSSES=True,
+        ),
+    )
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    mi = Input.from_sequence(sequence=sequence)
+    mi.adjust_energy(input_energy=kin.ekin)
+    mi.freeze()
+    beam = MadXBeam(kinematics=kin, distribution=np.zeros((20000, 5)))
+
+    def track(seed, turn=0):
+        return mi.track(beam, observers.BeamObserver(), seed=seed, turn=turn).snapshot("DEG")[1]
+
+    reference = track(1)
+    threads = georges.manzoni.kernels._nb.get_num_threads()
+    georges.manzoni.kernels._nb.set_num_threads(1)
+    try:
+        np.testing.assert_array_equal(track(1), reference)
+    finally:
+        georges.manzoni.kernels._nb.set_num_threads(threads)
+    assert not np.array_equal(track(2), reference)
+
+    # Successive turns with the same seed draw different (but reproducible) samples
+    np.testing.assert_array_equal(track(1, turn=0), reference)
+    turn = track(1, turn=1)
+    assert not np.array_equal(turn, reference)
+    np.testing.assert_array_equal(track(1, turn=1), turn)
+
+    # The scattering of the degrader follows its Fermi-Eyges parameters
+    mi.sequence[0].MATERIAL = georges.fermi.materials.Vacuum
+    mi.sequence[2].WITH_LOSSES = False
+    mi.sequence[0].unfreeze().freeze()
+    mi.sequence[2].unfreeze().freeze()
+    length, a0, a1, a2, *_ = mi.sequence[2].cache
+    distribution = track(3)
+    covariance = np.cov(distribution[:, :2].T)
+    np.testing.assert_allclose(covariance[1, 1], a0, rtol=0.05)
+    np.testing.assert_allclose(covariance[0, 0], a2, rtol=0.05)
+    np.testing.assert_allclose(covariance[0, 1], a1, rtol=0.05)
+
+
+def test_degrader_kernel():
+    rng = np.random.default_rng(0)
+    b1 = rng.normal(scale=[1e-3, 1e-3, 1e-3, 1e-3, 1e-2, 0.0], size=(10000, 6))
+    b1[:10, 1] = 1.5  # Outside of the pseudo-aperture
+    cholesky = MaterialElement.fermi_eyges_cholesky(1e-4, 2e-6, 5e-8)
+    key = np.uint64(random_stream_key(1, 0))
+    beta = 0.6
+
+    expected = np.copy(b1)
+    expected[:, 0] += 0.05 * b1[:, 1]
+    expected[:, 2] += 0.05 * b1[:, 3]
+    scattering(expected, np.array(cholesky), 2e-3, 4, key)
+    expected[:, 5] = MadXBeam.compute_pt(expected[:, 4], beta)
+    expected = MaterialElement.pseudo_aperture_check(expected, beta)
+
+    b2 = np.zeros(b1.shape)
+    n = degrader(b1, b2, np.arange(b1.shape[0]), np.array([[0.05, *cholesky, 2e-3]]), True, 4, beta, True, key)
+    assert n == expected.shape[0] == b1.shape[0] - 10
+    np.testing.assert_allclose(b2[:n], expected, rtol=1e-12, atol=1e-15)
+
+    # Drift only, on a resampling of the beam
+    indices = np.array([3, 3, 20, 11])
+    n = degrader(b1, b2, indices, np.array([[0.05, 0.0, 0.0, 0.0, 0.0]]), False, 5, 1.0, False, key)
+    assert n == 4
+    expected = b1[indices] + 0.05 * b1[indices][:, [1, 0, 3, 0, 0, 0]] * [1, 0, 1, 0, 0, 0]
+    np.testing.assert_allclose(b2[:n], expected)
+
+
+def test_sliced_degrader():
+    def degrader_input(slices):
+        sequence = georges.PlacementSequence(name="Sequence")
+        sequence.place(
+            georges.Element.Degrader(
+                NAME="DEG",
+                MATERIAL=georges.fermi.materials.Beryllium,
+                L=5 * _ureg.cm,
+                WITH_LOSSES=True,
+                SLICES=slices,
+            ),
+            at_entry=0 * _ureg.m,
+        )
+        mi = Input.from_sequence(sequence=sequence)
+        mi.adjust_energy(input_energy=kin.ekin)
+        mi.freeze()
+        return mi
+
+    kin = georges.Kinematics(150 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    single, sliced = degrader_input(1), degrader_input(5)
+    assert sliced.sequence[0].cache[-1].shape == (5, 5)
+    np.testing.assert_allclose(sliced.sequence[0].cache[1:6], single.sequence[0].cache[1:6], rtol=1e-3)
+
+    beam = MadXBeam(kinematics=kin, distribution=np.zeros((20000, 5)))
+    distribution = sliced.track(beam, observers.BeamObserver(), seed=1).snapshot("DEG")[1]
+    np.testing.assert_array_equal(
+        distribution,
+        sliced.track(beam, observers.BeamObserver(), seed=1).snapshot("DEG")[1],
+    )
+    length, a0, a1, a2, dpp, losses, *_ = sliced.sequence[0].cache
+    assert distribution.shape[0] == int(losses * 20000)
+    covariance = np.cov(distribution[:, :2].T)
+    np.testing.assert_allclose(covariance[1, 1], a0, rtol=0.05)
+    np.testing.assert_allclose(covariance[0, 0], a2, rtol=0.05)
+    np.testing.assert_allclose(covariance[0, 1], a1, rtol=0.05)
+    np.testing.assert_allclose(np.std(distribution[:, 4]), dpp, rtol=0.05)
+
+
+def test_tilted_bend():
+    def bend_input(tilt, rotation):
+        sequence = georges.PlacementSequence(name="Sequence")
+        sequence.place(georges.Element.SRotation(NAME="R1", ANGLE=rotation), at_entry=0 * _ureg.m)
+        sequence.place_after_last(
+            georges.Element.SBend(
+                NAME="B1",
+                L=1.5 * _ureg.m,
+                ANGLE=20 * _ureg.degrees,
+                K1=0.5 * _ureg.m**-2,
+                TILT=tilt,
+            ),
+        )
+        sequence.place_after_last(georges.Element.SRotation(NAME="R2", ANGLE=-rotation))
+        mi = Input.from_sequence(sequence=sequence)
+        mi.freeze()
+        return mi
+
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    distribution = np.random.default_rng(0).normal(scale=1e-3, size=(100, 5))
+    beam = MadXBeam(kinematics=kin, distribution=distribution)
+    tilted = bend_input(0.3 * _ureg.radian, 0.0 * _ureg.radian)
+    rotated = bend_input(0.0 * _ureg.radian, 0.3 * _ureg.radian).track(beam, observers.BeamObserver()).snapshot("R2")[1]
+    np.testing.assert_allclose(tilted.track(beam, observers.BeamObserver()).snapshot("R2")[1], rotated, atol=1e-12)
+    np.testing.assert_allclose(tilted.compile().track(beam), rotated, atol=1e-12)
+
+    # Negative rotation angles are applied by the compiled tracking as well
+    negative = bend_input(0.0 * _ureg.radian, -0.3 * _ureg.radian)
+    np.testing.assert_allclose(
+        negative.compile().track(beam),
+        negative.track(beam, observers.BeamObserver()).snapshot("R2")[1],
+        atol=1e-12,
+    )
+
+
+def test_tracking_with_losses_beam_stop():
+    mi = Input(
+        sequence=[
+            georges.manzoni.elements.BeamStop(
+                "BS",
+                MATERIAL=georges.fermi.materials.Beryllium,
+                L=1 * _ureg.cm,
+                RADIUS=1 * _ureg.mm,
+                KINETIC_ENERGY=230 * _ureg.MeV,
+            ),
+            georges.manzoni.elements.Drift("D1", L=1.0 * _ureg.m, APERTYPE="CIRCULAR", APERTURE=[4 * _ureg.mm]),
+        ],
+        mapper={"BS": 0, "D1": 1},
+    )
+    mi.freeze()
+    kin = georges.Kinematics(230 * _ureg.MeV, particle=georges.particles.Proton, kinetic=True)
+    distribution = np.random.default_rng(0).normal(scale=[2e-3, 1e-3, 2e-3, 1e-3, 0.0], size=(5000, 5))
+    beam = MadXBeam(kinematics=kin, distribution=distribution)
+
+    losses = LossRecord()
+    mi.track(beam=beam, losses=losses)
+    stopped = np.hypot(distribution[:, 0], distribution[:, 2]) <= 1e-3
+    np.testing.assert_array_equal(losses.lost_particles("BS"), np.flatnonzero(stopped))
+    assert losses.unidentified == {}
+    lost_d1 = losses.lost_particles("D1")
+    assert len(lost_d1) > 0 and not stopped[lost_d1].any()
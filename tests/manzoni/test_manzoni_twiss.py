@@ -2,12 +2,15 @@ import os
 
 import cpymad.madx
 import numpy as np
+import pandas as _pd
+import pytest
 
 import georges
 from georges import ureg as _ureg
 from georges import vis
 from georges.manzoni import Input, observers
 from georges.manzoni.beam import MadXBeam
+from georges.manzoni.elements.elements import ManzoniException
 
 
 def get_madx_twiss():
@@ -119,3 +122,141 @@ def test_from_distribution():
     manzoni_plot.twiss(tw_observer, with_beta=True, with_alpha=True, with_dispersion=True, tfs_data=twiss_madx)
 
     os.remove("twiss.tfs")
+
+
+def test_from_maps():
+    twiss_madx = get_madx_twiss()
+    madx_line = get_sequence()
+    mi = Input.from_sequence(sequence=madx_line)
+    mi.freeze()
+    tw_maps = mi.twiss_from_maps(kinematics=madx_line.kinematics)
+    tw_tracking = mi.twiss(kinematics=madx_line.kinematics)
+    assert list(tw_maps.columns) == list(tw_tracking.columns)
+
+    np.testing.assert_allclose(tw_maps["BETA11"], twiss_madx["BETX"], rtol=1e-6)
+    np.testing.assert_allclose(tw_maps["BETA22"], twiss_madx["BETY"], rtol=1e-6)
+    np.testing.assert_allclose(tw_maps["ALPHA11"], twiss_madx["ALFX"], atol=1e-6)
+    np.testing.assert_allclose(tw_maps["ALPHA22"], twiss_madx["ALFY"], atol=1e-6)
+    np.testing.assert_allclose(tw_maps["DISP1"], twiss_madx["DX"] * madx_line.metadata.kinematics.beta, atol=1e-6)
+    np.testing.assert_allclose(tw_maps["DISP2"], twiss_madx["DPX"] * madx_line.metadata.kinematics.beta, atol=1e-6)
+    np.testing.assert_allclose(tw_maps["MU1U"], twiss_madx["MUX"] * 2 * np.pi, atol=1e-6)
+    np.testing.assert_allclose(tw_maps["MU2U"], twiss_madx["MUY"] * 2 * np.pi, atol=1e-6)
+    np.testing.assert_allclose(tw_maps[["BETA11", "BETA22"]], tw_tracking[["BETA11", "BETA22"]], rtol=1e-3)
+
+    names = list(tw_maps.index[[1, 4]])
+    tw_selected = mi.twiss_from_maps(kinematics=madx_line.kinematics, elements=names)
+    assert list(tw_selected.index) == names
+    np.testing.assert_allclose(tw_selected[["BETA11", "DISP1", "R16"]], tw_maps.loc[names, ["BETA11", "DISP1", "R16"]])
+
+    os.remove("twiss.tfs")
+
+
+def test_twiss_configurations():
+    get_madx_twiss()
+    madx_line = get_sequence()
+    mi = Input.from_sequence(sequence=madx_line)
+    mi.freeze()
+    kinematics = madx_line.kinematics
+    k1 = np.linspace(0.6, 1.0, 5)
+    configurations = _pd.DataFrame({("MQF1", "K1"): -k1, ("MQD", "K1"): k1 * _ureg.m**-2})
+    tw = mi.twiss_configurations(kinematics=kinematics, configurations=configurations)
+    assert tw.index.names == ["CONFIGURATION", "NAME"]
+    assert list(tw.columns) == list(mi.twiss_from_maps(kinematics=kinematics).columns)
+
+    twiss_init = georges.BetaBlock(BETA11=2 * _ureg.m, BETA22=3 * _ureg.m, ALPHA11=0.5, ALPHA22=-0.5)
+    tw_init = mi.twiss_configurations(kinematics, configurations, twiss_init=twiss_init, elements=["MQD", "BD"])
+    assert list(tw_init.index.get_level_values("NAME")) == ["MQD", "BD"] * 5
+
+    for c in [0, 3]:
+        mi.set_parameters_batch([("MQF1", "K1", -k1[c]), ("MQD", "K1", k1[c])])
+        np.testing.assert_allclose(tw.loc[c].values, mi.twiss_from_maps(kinematics=kinematics).values, atol=1e-10)
+        np.testing.assert_allclose(
+            tw_init.loc[c].values,
+            mi.twiss_from_maps(kinematics=kinematics, twiss_init=twiss_init, elements=["MQD", "BD"]).values,
+            atol=1e-10,
+        )
+
+    os.remove("twiss.tfs")
+
+
+def test_match():
+    get_madx_twiss()
+    madx_line = get_sequence()
+    mi = Input.from_sequence(sequence=madx_line)
+    mi.freeze()
+    kinematics = madx_line.kinematics
+    k1 = {e: mi.table.get(mi.mapper[e], "K1") for e in ["MQF1", "MQD"]}
+    reference = mi.twiss_from_maps(kinematics=kinematics, elements=["BD"])
+
+    mi.set_parameters_batch([(e, "K1", 1.05 * v) for e, v in k1.items()])
+    result = mi.match(
+        kinematics,
+        variables=[("MQF1", "K1"), ("MQD", "K1")],
+        constraints=[("BD", q, reference.at["BD", q]) for q in ["BETA11", "BETA22"]],
+    )
+    assert result.success
+    assert len(result.history) > 0 and (result.history["TIME"] >= 0).all()
+    np.testing.assert_allclose(result.variables["VALUE"].values, list(k1.values()), rtol=1e-6)
+    np.testing.assert_allclose(result.constraints["VALUE"].values, result.constraints["TARGET"].values, rtol=1e-8)
+    for e, v in k1.items():
+        np.testing.assert_allclose(mi.table.get(mi.mapper[e], "K1"), v, rtol=1e-6)
+
+    # The initial values are those of the elements, even if set directly on them
+    for e, v in k1.items():
+        setattr(mi.sequence[mi.mapper[e]], "K1", 0.95 * v * _ureg.m**-2)
+    result = mi.match(
+        kinematics,
+        variables=[("MQF1", "K1"), ("MQD", "K1")],
+        constraints=[("BD", q, reference.at["BD", q]) for q in ["BETA11", "BETA22"]],
+        derivatives="analytic",
+    )
+    assert result.success
+    np.testing.assert_allclose(result.variables["INITIAL"].values, 0.95 * np.array(list(k1.values())), rtol=1e-12)
+    np.testing.assert_allclose(result.variables["VALUE"].values, list(k1.values()), rtol=1e-6)
+
+    beam = MadXBeam(kinematics=kinematics, distribution=np.random.default_rng(0).normal(0, 1e-3, (10000, 5)))
+    with pytest.raises(ManzoniException):
+        mi.match(kinematics, variables=[("MQF1", "K1")], constraints=[("BD", "SIGMA_X", 1e-3)])
+    result = mi.match(
+        kinematics,
+        variables=[("MQF1", "K1", (-5.0, 0.0))],
+        constraints=[("BD", "SIGMA_X", 2.76e-3 * _ureg.m, 1e3)],
+        beam=beam,
+        apply=False,
+    )
+    assert result.success
+    np.testing.assert_allclose(result.constraints.at[0, "VALUE"], 2.76e-3, rtol=1e-6)
+    np.testing.assert_allclose(mi.table.get(mi.mapper["MQF1"], "K1"), k1["MQF1"], rtol=1e-6)
+
+    os.remove("twiss.tfs")
+
+
+def test_jacobian():
+    get_madx_twiss()
+    madx_line = get_sequence()
+    kinematics = madx_line.kinematics
+    targets = ["BD", "D4", "MQD"]
+    variables = [("MQF1", "K1"), ("MQD", "L"), ("BD", "ANGLE"), ("BD", "K1")]
+    for integrator in [georges.manzoni.Mad8FirstOrderTaylorIntegrator, georges.manzoni.MadXIntegrator]:
+        mi = Input.from_sequence(sequence=madx_line)
+        mi.set_integrator(integrator=integrator)
+        mi.freeze(kinematics)
+        jacobian = mi.jacobian(kinematics, targets=targets, variables=variables)
+        assert jacobian.shape == (36 * len(targets), len(variables))
+        for e, p in variables:
+            value = mi.table.get(mi.mapper[e], p)
+            matrices = []
+            for shifted in [value + 1e-6, value - 1e-6]:
+                mi.set_parameters_batch([(e, p, shifted)])
+                matrices.append(mi.twiss_from_maps(kinematics, elements=targets, twiss_parametrization=False))
+            mi.set_parameters_batch([(e, p, value)])
+            expected = ((matrices[0] - matrices[1]) / 2e-6).drop(columns="S")
+            np.testing.assert_allclose(
+                jacobian[(e, p)].unstack().loc[targets, expected.columns].values,
+                expected.values,
+                atol=1e-7,
+            )
+        with pytest.raises(ManzoniException):
+            mi.jacobian(kinematics, targets=["BD"], variables=[("MQF1", "APERTYPE")])
+
+    os.remove("twiss.tfs")